@@ -1,38 +1,340 @@
 from __future__ import print_function, division, absolute_import
 
+__version__ = "0.1"
+
+import copy
+import os
+import re
+
+from ufo2ft.boundingBoxes import BoundingBoxMismatch, verifyBoundingBoxes
+from ufo2ft.featureParseCache import FeatureParseCache
+from ufo2ft.fingerprint import compileFingerprint, isUpToDate
+from ufo2ft.glyphCostReport import GlyphCostReport
+from ufo2ft.glyphSubset import SubsetFont, computeGlyphClosure
+from ufo2ft.incrementalCompile import recompileFont
 from ufo2ft.kernFeatureWriter import KernFeatureWriter
-from ufo2ft.makeotfParts import FeatureOTFCompiler
+from ufo2ft.layoutCache import LayoutTableCache
+from ufo2ft.makeotfParts import FeatureOTFCompiler, includedFeatureFiles
 from ufo2ft.markFeatureWriter import MarkFeatureWriter
+from ufo2ft.memoryAccounting import MemoryAccountant, MemoryBudgetExceeded
 from ufo2ft.outlineOTF import OutlineOTFCompiler, OutlineTTFCompiler
+from ufo2ft.stageScheduler import Stage, runStages
+
+
+# the tables made by the feature compiler
+_layoutTableTags = ("GDEF", "GPOS", "GSUB")
+
+
+def _noStageCallback(stage):
+    pass
+
+
+def _costReportOptions(costReport):
+    # outline compiler subclasses predating cost reports still work
+    if costReport is None:
+        return {}
+    return dict(costReport=costReport)
+
+
+def _featureCompilerOptions(layoutCache, featureCache):
+    options = {}
+    if layoutCache is not None:
+        options["layoutCache"] = layoutCache
+    if featureCache is not None:
+        options["featureCache"] = featureCache
+    return options
+
+
+def _isUpToDate(compileFunction, arguments):
+    arguments = dict(arguments)
+    font = arguments.pop("font")
+    previousFingerprint = arguments.pop("previousFingerprint")
+    return isUpToDate(font, compileFunction, previousFingerprint, **arguments)
 
 
 def _compile(font, glyphOrder, outlineCompilerClass, featureCompilerClass,
-             mtiFeaFiles, kernWriter, markWriter):
+             mtiFeaFiles, kernWriter, markWriter, memoryAccountant=None,
+             glyphSubset=None, outlineOptions=None, verifyBounds=False,
+             stageCallback=None, tables=None, lazy=False, stageWorkers=1,
+             layoutCache=None, featureCache=None):
     """Create FontTools TTFonts from a UFO."""
 
-    outlineCompiler = outlineCompilerClass(font, glyphOrder=glyphOrder)
-    outline = outlineCompiler.compile()
+    if stageCallback is None:
+        stageCallback = _noStageCallback
+
+    if glyphSubset is not None:
+        stageCallback("subset")
+        font = SubsetFont(font, computeGlyphClosure(font, glyphSubset))
 
-    featureCompiler = featureCompilerClass(
-        font, outline, kernWriter, markWriter, mtiFeaFiles=mtiFeaFiles)
-    featureCompiler.compile()
+    try:
+        stageCallback("outlines")
+        outlineCompiler = outlineCompilerClass(
+            font, glyphOrder=glyphOrder, memoryAccountant=memoryAccountant,
+            **(outlineOptions or {}))
+        outlineTables = None
+        if tables is not None:
+            outlineTables = [tag for tag in tables if tag not in _layoutTableTags]
+        outline = outlineCompiler.setupFont(tables=outlineTables, lazy=lazy)
+        stages = outlineCompiler.makeStages()
 
-    return outline
+        if tables is None or any(tag in _layoutTableTags for tag in tables):
+            featureCompiler = featureCompilerClass(
+                font, outline, kernWriter, markWriter, mtiFeaFiles=mtiFeaFiles,
+                memoryAccountant=memoryAccountant,
+                **_featureCompilerOptions(layoutCache, featureCache))
+            featureCompiler.precompile()
+            stages += featureCompiler.makeStages(
+                outlineStages=[stage.name for stage in stages])
+
+        if memoryAccountant is not None:
+            # stages are accounted one at a time
+            stageWorkers = 1
+        runStages(stages, workers=stageWorkers, callback=stageCallback)
+
+        if verifyBounds:
+            stageCallback("verify bounds")
+            problems = verifyBoundingBoxes(outline)
+            if problems:
+                raise BoundingBoxMismatch(problems)
+
+        return outline
+    finally:
+        if memoryAccountant is not None:
+            # don't leave tracemalloc slowing the process down
+            memoryAccountant.stop()
 
 
 def compileOTF(font, glyphOrder=None, outlineCompilerClass=OutlineOTFCompiler,
                featureCompilerClass=FeatureOTFCompiler, mtiFeaFiles=None,
-               kernWriter=KernFeatureWriter, markWriter=MarkFeatureWriter):
-    """Create FontTools CFF font from a UFO."""
+               kernWriter=KernFeatureWriter, markWriter=MarkFeatureWriter,
+               memoryAccountant=None, glyphSubset=None, verifyBounds=False,
+               stageCallback=None, previousFingerprint=None, tables=None,
+               lazy=False, stageWorkers=1, costReport=None, layoutCache=None,
+               featureCache=None):
+    """Create FontTools CFF font from a UFO.
+
+    If memoryAccountant (a MemoryAccountant) is passed, allocations are
+    tracked per compile stage and the compile fails with MemoryBudgetExceeded
+    as soon as the accountant's budget is exceeded.
+
+    If glyphSubset (a collection of glyph names) is passed, only those glyphs
+    and the glyphs reachable from them through components and GSUB rules are
+    loaded and compiled. All other glyphs are left empty and unencoded.
+
+    Glyph bounds and the values derived from them are computed exactly
+    while compiling, so the returned font skips recalculating them when
+    saved. If verifyBounds is True, they are checked against a full
+    recalculation and BoundingBoxMismatch is raised on any difference.
+
+    The outline tables and the features are built by stages with declared
+    inputs (see ufo2ft.stageScheduler). If stageWorkers is more than one,
+    stages which don't depend on each other run concurrently in that many
+    threads, unless a memoryAccountant is passed.
+
+    If stageCallback is passed, it is called with the name of each compile
+    stage ("subset", "outlines", the stages of the outline and feature
+    compilers, "verify bounds") before the stage starts. An exception raised by it
+    aborts the compile.
+
+    If previousFingerprint is passed and equals the fingerprint of this
+    compile (see ufo2ft.fingerprint.compileFingerprint), the font is up to
+    date and None is returned without compiling.
+
+    If tables (a collection of table tags) is passed, only those tables are
+    compiled; the features are only compiled if GDEF, GPOS or GSUB is among
+    them. If lazy is True, the outline compiler's tables are built when they
+    are first accessed on the returned font (the features are compiled right
+    away). Either way the metrics come from the glyph bounds alone, without
+    building the CFF or glyf table.
+
+    If costReport (a GlyphCostReport) is passed, the outline compiler
+    records the draw time, outline statistics and compiled size of every
+    glyph in it.
+
+    If layoutCache (a ufo2ft.layoutCache.LayoutTableCache) is passed, the
+    layout tables compiled from the features are cached in it and reused
+    by later compiles of the same features and glyph order.
+
+    If featureCache (a ufo2ft.featureParseCache.FeatureParseCache) is
+    passed, the font's feature text is parsed once for all compiles sharing
+    the cache, such as those of the masters of a family. Only the generated
+    kern, mark and mkmk features are parsed for each compile.
+    """
+
+    if _isUpToDate(compileOTF, locals()):
+        return None
 
     return _compile(font, glyphOrder, outlineCompilerClass,
-                    featureCompilerClass, mtiFeaFiles, kernWriter, markWriter)
+                    featureCompilerClass, mtiFeaFiles, kernWriter, markWriter,
+                    memoryAccountant, glyphSubset,
+                    outlineOptions=_costReportOptions(costReport),
+                    verifyBounds=verifyBounds,
+                    stageCallback=stageCallback, tables=tables, lazy=lazy,
+                    stageWorkers=stageWorkers, layoutCache=layoutCache,
+                    featureCache=featureCache)
 
 
 def compileTTF(font, glyphOrder=None, outlineCompilerClass=OutlineTTFCompiler,
                featureCompilerClass=FeatureOTFCompiler, mtiFeaFiles=None,
-               kernWriter=KernFeatureWriter, markWriter=MarkFeatureWriter):
-    """Create FontTools TrueType font from a UFO."""
+               kernWriter=KernFeatureWriter, markWriter=MarkFeatureWriter,
+               memoryAccountant=None, glyphSubset=None, convertCubics=True,
+               maxConversionError=None, compatibleMasters=None,
+               conversionWorkers=1, verifyBounds=False, stageCallback=None,
+               previousFingerprint=None, tables=None, lazy=False,
+               stageWorkers=1, costReport=None, layoutCache=None,
+               featureCache=None):
+    """Create FontTools TrueType font from a UFO.
+
+    Cubic curves are converted to quadratic ones within maxConversionError
+    font units (default: unitsPerEm / 1000). Pass all masters of a family
+    as compatibleMasters, to each master's compile, to keep the converted
+    outlines interpolation compatible. conversionWorkers sets the number of
+    processes used for the conversion. The other options are the same as
+    for compileOTF.
+    """
+
+    if _isUpToDate(compileTTF, locals()):
+        return None
 
+    outlineOptions = dict(
+        convertCubics=convertCubics, maxConversionError=maxConversionError,
+        compatibleMasters=compatibleMasters,
+        conversionWorkers=conversionWorkers)
+    outlineOptions.update(_costReportOptions(costReport))
     return _compile(font, glyphOrder, outlineCompilerClass,
-                    featureCompilerClass, mtiFeaFiles, kernWriter, markWriter)
+                    featureCompilerClass, mtiFeaFiles, kernWriter, markWriter,
+                    memoryAccountant, glyphSubset, outlineOptions,
+                    verifyBounds, stageCallback, tables, lazy, stageWorkers,
+                    layoutCache, featureCache)
+
+
+# the tables of a TrueType flavour which depend on its converted outlines
+_ttfOutlineTables = ("head", "hhea", "hmtx", "maxp", "post", "glyf", "loca")
+
+# OpenType flavour tables which are not copied to the TrueType flavour
+_otfOutlineTables = ("CFF ", "VORG")
+
+# feature syntax overriding values of the tables built per flavour, and
+# the OS/2 values falling back to each flavour's bounds
+_flavourTableOverrideRE = re.compile(
+    r"\btable\s+(head|hhea|vhea)\b|\bWin(Ascent|Descent)\b")
+
+
+def _overridesFlavourTables(font):
+    text = font.features.text or ""
+    texts = [text]
+    for path in includedFeatureFiles(text, getattr(font, "path", None)):
+        if os.path.isfile(path):
+            with open(path, "rb") as f:
+                texts.append(f.read().decode("utf-8"))
+    return any(_flavourTableOverrideRE.search(re.sub(r"#[^\n]*", "", text))
+               for text in texts)
+
+
+def _prefixStages(stages, prefix):
+    return [Stage(prefix + stage.name, stage.function,
+                  [prefix + name for name in stage.inputs])
+            for stage in stages]
+
+
+def compileOTFAndTTF(font, glyphOrder=None,
+                     otfCompilerClass=OutlineOTFCompiler,
+                     ttfCompilerClass=OutlineTTFCompiler,
+                     featureCompilerClass=FeatureOTFCompiler, mtiFeaFiles=None,
+                     kernWriter=KernFeatureWriter, markWriter=MarkFeatureWriter,
+                     memoryAccountant=None, glyphSubset=None,
+                     convertCubics=True, maxConversionError=None,
+                     compatibleMasters=None, conversionWorkers=1,
+                     verifyBounds=False, stageCallback=None, stageWorkers=1,
+                     layoutCache=None, featureCache=None):
+    """Create FontTools CFF and TrueType fonts from a UFO in one go.
+
+    Returns an (otf, ttf) tuple, the same fonts compileOTF and compileTTF
+    make with the same options. The features are written and compiled
+    once, and the layout tables, name, OS/2 and cmap are copied to the
+    TrueType font. Only the tables depending on the outlines (CFF; glyf,
+    loca, maxp, post and the metrics derived from the quadratic outlines'
+    bounds, and the OS/2 win metrics) are built for each font. Features
+    which override head, hhea or vhea values, or the win metrics, make this
+    fall back to two separate compiles.
+
+    Stage names passed to stageCallback are prefixed with "otf " or "ttf "
+    for the outline compilers' stages. The other options are the same as
+    for compileOTF and compileTTF.
+    """
+
+    if stageCallback is None:
+        stageCallback = _noStageCallback
+    ttfOptions = dict(
+        convertCubics=convertCubics, maxConversionError=maxConversionError,
+        compatibleMasters=compatibleMasters,
+        conversionWorkers=conversionWorkers)
+
+    if glyphSubset is not None:
+        stageCallback("subset")
+        font = SubsetFont(font, computeGlyphClosure(font, glyphSubset))
+
+    if _overridesFlavourTables(font):
+        options = dict(
+            featureCompilerClass=featureCompilerClass, mtiFeaFiles=mtiFeaFiles,
+            kernWriter=kernWriter, markWriter=markWriter,
+            memoryAccountant=memoryAccountant, verifyBounds=verifyBounds,
+            stageCallback=stageCallback, stageWorkers=stageWorkers,
+            layoutCache=layoutCache, featureCache=featureCache)
+        otf = _compile(font, glyphOrder, otfCompilerClass, **options)
+        ttf = _compile(font, glyphOrder, ttfCompilerClass,
+                       outlineOptions=ttfOptions, **options)
+        return otf, ttf
+
+    try:
+        stageCallback("outlines")
+        otfCompiler = otfCompilerClass(
+            font, glyphOrder=glyphOrder, memoryAccountant=memoryAccountant)
+        ttfCompiler = ttfCompilerClass(
+            font, glyphOrder=glyphOrder, memoryAccountant=memoryAccountant,
+            **ttfOptions)
+        otf = otfCompiler.setupFont()
+        ttf = ttfCompiler.setupFont(tables=_ttfOutlineTables)
+        otfStages = _prefixStages(otfCompiler.makeStages(), "otf ")
+        ttfStages = _prefixStages(ttfCompiler.makeStages(), "ttf ")
+
+        featureCompiler = featureCompilerClass(
+            font, otf, kernWriter, markWriter, mtiFeaFiles=mtiFeaFiles,
+            memoryAccountant=memoryAccountant,
+            **_featureCompilerOptions(layoutCache, featureCache))
+        featureCompiler.precompile()
+        featureStages = featureCompiler.makeStages(
+            outlineStages=[stage.name for stage in otfStages])
+
+        def shareTables():
+            if otf.getGlyphOrder() != ttf.getGlyphOrder():
+                raise ValueError(
+                    "the OpenType and TrueType compilers made different glyph "
+                    "orders, compile the fonts separately")
+            for tag in otf.keys():
+                if tag == "GlyphOrder" or tag in _otfOutlineTables or tag in ttf:
+                    continue
+                ttf[tag] = copy.deepcopy(otf[tag])
+            if "OS/2" in ttf:
+                os2 = ttf["OS/2"]
+                os2.usWinAscent, os2.usWinDescent = ttfCompiler.makeWinMetrics()
+
+        stages = otfStages + ttfStages + featureStages
+        stages.append(Stage("share tables", shareTables,
+                            [stage.name for stage in stages]))
+        if memoryAccountant is not None:
+            # stages are accounted one at a time
+            stageWorkers = 1
+        runStages(stages, workers=stageWorkers, callback=stageCallback)
+
+        if verifyBounds:
+            stageCallback("verify bounds")
+            problems = verifyBoundingBoxes(otf) + verifyBoundingBoxes(ttf)
+            if problems:
+                raise BoundingBoxMismatch(problems)
+
+        return otf, ttf
+    finally:
+        if memoryAccountant is not None:
+            # don't leave tracemalloc slowing the process down
+            memoryAccountant.stop()
@@ -0,0 +1,7 @@
+from __future__ import print_function, division, absolute_import
+
+import sys
+
+from ufo2ft.commandLine import main
+
+sys.exit(main())
@@ -0,0 +1,113 @@
+"""
+asyncio versions of the compile functions, for services compiling fonts
+on request (Python 3.5 or newer).
+
+The compile runs in an executor, so the event loop is never blocked, and
+the compiled font comes back as binary sfnt data rather than as a TTFont::
+
+    executor = ProcessPoolExecutor(4)
+    limit = asyncio.Semaphore(8)
+
+    async def handle(ufoPath):
+        return await compileOTFAsync(ufoPath, executor=executor, limit=limit)
+
+*limit* is an asyncio.Semaphore shared by all requests which caps the
+number of concurrent compiles. Fonts may be given as font objects or as
+UFO paths; with a process executor, pass paths so the UFO is opened in the
+worker and only the path and the resulting bytes cross process boundaries.
+
+Cancelling the awaiting task stops the compile at the next stage boundary
+when running in a thread executor (the default). A process executor only
+drops compiles which have not started yet; a running one completes in its
+worker and its result is discarded. Either way the compile keeps its slot
+of *limit* until its worker is free again.
+"""
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from ufo2ft import compileOTF, compileTTF
+from ufo2ft.fontLoader import openFont
+from ufo2ft.webFonts import serializeFont
+
+
+class CompileCancelled(Exception):
+    """Raised in the worker to stop a compile whose task was cancelled."""
+
+
+def _compileToBytes(compileFunction, font, fastReader, options, cancelled=None):
+    def checkCancelled(stage):
+        if cancelled is not None and cancelled.is_set():
+            raise CompileCancelled("cancelled before %s" % stage)
+
+    if isinstance(font, str):
+        checkCancelled("loading")
+        font = openFont(font, fast=fastReader)
+    otf = compileFunction(font, stageCallback=checkCancelled, **options)
+    checkCancelled("serializing")
+    return serializeFont(otf)
+
+
+async def _compileAsync(compileFunction, font, executor, limit, fastReader,
+                        options):
+    loop = asyncio.get_event_loop()
+    if isinstance(executor, ProcessPoolExecutor):
+        cancelled = None
+    else:
+        cancelled = threading.Event()
+    job = functools.partial(_compileToBytes, compileFunction, font,
+                            fastReader, options, cancelled)
+    if limit is None:
+        limit = _NoLimit()
+    async with limit:
+        if cancelled is None:
+            # the executor's own future, which only cancels compiles that
+            # haven't started
+            concurrentFuture = executor.submit(job)
+            future = asyncio.wrap_future(concurrentFuture)
+        else:
+            future = loop.run_in_executor(executor, job)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if cancelled is None:
+                concurrentFuture.cancel()
+            else:
+                cancelled.set()
+            # keep the slot until the worker has actually stopped
+            await asyncio.wait([future])
+            if not future.cancelled():
+                # the compile was abandoned, its outcome is of no interest
+                future.exception()
+            raise
+
+
+class _NoLimit(object):
+
+    async def __aenter__(self):
+        pass
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+
+async def compileOTFAsync(font, executor=None, limit=None, fastReader=False,
+                          **options):
+    """
+    Compile *font* (a font object or UFO path) with compileOTF in
+    *executor* (by default the event loop's default thread executor) and
+    return the binary font data. *limit* is an optional asyncio.Semaphore
+    shared between compiles; *fastReader* opens UFO paths with
+    :mod:`ufo2ft.ufoReader`. Other keyword arguments go to compileOTF.
+    """
+    return await _compileAsync(compileOTF, font, executor, limit, fastReader,
+                               options)
+
+
+async def compileTTFAsync(font, executor=None, limit=None, fastReader=False,
+                          **options):
+    """Like compileOTFAsync, compiling with compileTTF."""
+    return await _compileAsync(compileTTF, font, executor, limit, fastReader,
+                               options)
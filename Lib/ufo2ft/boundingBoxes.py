@@ -0,0 +1,179 @@
+"""
+Exact glyph bounds for the outline compilers, and a check of the
+precomputed bounds against the ones fontTools recalculates on save.
+
+The compilers work out every glyph's bounds once, before any table is
+built, and use them for hmtx, hhea, head, the CFF FontBBox and the glyf
+glyph headers. The font is then compiled with ``recalcBBoxes`` turned
+off, so saving it doesn't walk all outlines again. :func:`verifyBoundingBoxes`
+recalculates everything the way fontTools would and reports differences.
+"""
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import math
+
+from fontTools.pens.boundsPen import BoundsPen, ControlBoundsPen
+
+
+def _otRound(v):
+    return int(math.floor(v + 0.5))
+
+
+def _roundPoint(pt):
+    return (_otRound(pt[0]), _otRound(pt[1]))
+
+
+class _RoundingMixin(object):
+    """Round every point (after component transformations) to integers."""
+
+    def _moveTo(self, pt):
+        super(_RoundingMixin, self)._moveTo(_roundPoint(pt))
+
+    def _lineTo(self, pt):
+        super(_RoundingMixin, self)._lineTo(_roundPoint(pt))
+
+    def _curveToOne(self, bcp1, bcp2, pt):
+        super(_RoundingMixin, self)._curveToOne(
+            _roundPoint(bcp1), _roundPoint(bcp2), _roundPoint(pt))
+
+    def _qCurveToOne(self, bcp, pt):
+        super(_RoundingMixin, self)._qCurveToOne(_roundPoint(bcp), _roundPoint(pt))
+
+
+class RoundingBoundsPen(_RoundingMixin, BoundsPen):
+    """
+    A BoundsPen which rounds every point (after component transformations)
+    to integers first, the way T2CharStringPen does, so the bounds are
+    those of the compiled charstring.
+    """
+
+
+class RoundingControlBoundsPen(_RoundingMixin, ControlBoundsPen):
+    """
+    A ControlBoundsPen which rounds every point first, giving the bounds
+    the glyf table stores for the points of a quadratic outline.
+    """
+
+
+def intBounds(bounds):
+    """Round a bounds rectangle outwards to integers, or return None."""
+    if bounds is None:
+        return None
+    xMin, yMin, xMax, yMax = bounds
+    return (int(math.floor(xMin)), int(math.floor(yMin)),
+            int(math.ceil(xMax)), int(math.ceil(yMax)))
+
+
+def unionBounds(boundsList):
+    """Return the union of the non-None rectangles in *boundsList*."""
+    rect = None
+    for bounds in boundsList:
+        if bounds is None:
+            continue
+        if rect is None:
+            rect = bounds
+        else:
+            rect = (min(rect[0], bounds[0]), min(rect[1], bounds[1]),
+                    max(rect[2], bounds[2]), max(rect[3], bounds[3]))
+    return rect
+
+
+class BoundingBoxMismatch(Exception):
+    """Raised when precomputed bounds differ from recalculated ones."""
+
+    def __init__(self, problems):
+        super(BoundingBoxMismatch, self).__init__(
+            "%d precomputed bounds differ from the recalculated values:\n%s"
+            % (len(problems), "\n".join(problems)))
+        self.problems = problems
+
+
+def verifyBoundingBoxes(otf):
+    """
+    Recalculate the glyph bounds and everything derived from them in
+    *otf* the way fontTools does when saving with ``recalcBBoxes``, and
+    return a list of descriptions of the values which differ from those
+    stored in the font. The font is left unchanged.
+    """
+    problems = []
+    glyphBounds = {}
+    glyphOrder = otf.getGlyphOrder()
+
+    if "glyf" in otf:
+        glyf = otf["glyf"]
+        for glyphName in glyphOrder:
+            glyph = glyf[glyphName]
+            if glyph.numberOfContours == 0:
+                continue
+            stored = tuple(getattr(glyph, attr, None)
+                           for attr in ("xMin", "yMin", "xMax", "yMax"))
+            glyph.recalcBounds(glyf)
+            bounds = (glyph.xMin, glyph.yMin, glyph.xMax, glyph.yMax)
+            glyph.xMin, glyph.yMin, glyph.xMax, glyph.yMax = stored
+            if stored != bounds:
+                problems.append("glyf %s: %r != %r" % (glyphName, stored, bounds))
+            glyphBounds[glyphName] = bounds
+    elif "CFF " in otf:
+        topDict = otf["CFF "].cff.topDictIndex[0]
+        charStrings = topDict.CharStrings
+        for glyphName in glyphOrder:
+            pen = BoundsPen(charStrings)
+            charStrings[glyphName].draw(pen)
+            if pen.bounds is not None:
+                glyphBounds[glyphName] = pen.bounds
+        fontBBox = intBounds(unionBounds(glyphBounds.values())) or (0, 0, 0, 0)
+        if tuple(topDict.FontBBox) != fontBBox:
+            problems.append("CFF FontBBox: %r != %r" % (
+                tuple(topDict.FontBBox), fontBBox))
+
+    head = otf["head"]
+    fontBounds = intBounds(unionBounds(glyphBounds.values())) or (0, 0, 0, 0)
+    headBounds = (head.xMin, head.yMin, head.xMax, head.yMax)
+    if headBounds != fontBounds:
+        problems.append("head bounds: %r != %r" % (headBounds, fontBounds))
+
+    if "hhea" in otf and "hmtx" in otf:
+        hhea = otf["hhea"]
+        hmtx = otf["hmtx"]
+        expected = _hheaValues(glyphOrder, hmtx, glyphBounds)
+        for attr, value in sorted(expected.items()):
+            if getattr(hhea, attr) != value:
+                problems.append("hhea %s: %r != %r" % (
+                    attr, getattr(hhea, attr), value))
+
+    if "maxp" in otf and "glyf" in otf:
+        maxp = otf["maxp"]
+        attrs = ("maxPoints", "maxContours", "maxCompositePoints",
+                 "maxCompositeContours", "maxComponentDepth",
+                 "maxComponentElements")
+        stored = dict((attr, getattr(maxp, attr)) for attr in attrs)
+        maxp.recalc(otf)
+        for attr in attrs:
+            if getattr(maxp, attr) != stored[attr]:
+                problems.append("maxp %s: %r != %r" % (
+                    attr, stored[attr], getattr(maxp, attr)))
+            setattr(maxp, attr, stored[attr])
+    return problems
+
+
+def _hheaValues(glyphOrder, hmtx, glyphBounds):
+    advanceWidthMax = 0
+    lefts = []
+    rights = []
+    extents = []
+    for glyphName in glyphOrder:
+        advanceWidth, lsb = hmtx[glyphName]
+        advanceWidthMax = max(advanceWidthMax, advanceWidth)
+        bounds = glyphBounds.get(glyphName)
+        if bounds is None:
+            continue
+        boundsWidth = int(math.ceil(bounds[2])) - int(math.floor(bounds[0]))
+        lefts.append(lsb)
+        rights.append(advanceWidth - lsb - boundsWidth)
+        extents.append(lsb + boundsWidth)
+    return dict(
+        advanceWidthMax=advanceWidthMax,
+        minLeftSideBearing=min(lefts) if lefts else 0,
+        minRightSideBearing=min(rights) if rights else 0,
+        xMaxExtent=max(extents) if extents else 0)
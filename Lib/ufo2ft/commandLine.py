@@ -0,0 +1,322 @@
+"""
+Command line batch compiler.
+
+Compiles any number of UFOs (paths or glob patterns) to OTF and/or TTF,
+running the compiles in parallel worker processes::
+
+    ufo2ft --otf --ttf -j 4 -o build masters/*.ufo
+
+``--woff`` and ``--woff2`` also write web fonts next to each output.
+Outputs which are newer than every file in their UFO (and every extra
+input such as MTI feature files or the glyph order file) are skipped
+unless ``--force`` is given. With ``--fingerprint``, outputs are skipped
+instead when the fingerprint of their inputs (see :mod:`ufo2ft.fingerprint`)
+stored next to them is unchanged, which also works on fresh checkouts.
+Progress and timing are printed per job; the exit status is non-zero if
+any job failed. ``--fast-reader`` reads the UFOs with
+:mod:`ufo2ft.ufoReader` rather than defcon.
+"""
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import argparse
+import glob
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+
+from ufo2ft import compileOTF, compileTTF
+from ufo2ft.fingerprint import compileFingerprint
+from ufo2ft.fontLoader import openFont
+from ufo2ft.webFonts import compileWebFonts
+
+_compileFunctions = dict(otf=compileOTF, ttf=compileTTF)
+
+
+class CompileJob(object):
+    """One UFO to be compiled to one output format."""
+
+    def __init__(self, ufoPath, fontFormat, output, mtiFeaFiles=None,
+                 glyphOrderPath=None, glyphOrderFromLib=False, webFlavors=(),
+                 fastReader=False, useFingerprint=False):
+        self.ufoPath = ufoPath
+        self.fontFormat = fontFormat
+        self.output = output
+        self.mtiFeaFiles = mtiFeaFiles
+        self.glyphOrderPath = glyphOrderPath
+        self.glyphOrderFromLib = glyphOrderFromLib
+        self.webFlavors = list(webFlavors)
+        self.fastReader = fastReader
+        self.useFingerprint = useFingerprint
+
+    @property
+    def outputs(self):
+        """Map of flavor to output path: the font and its web fonts."""
+        outputs = dict(sfnt=self.output)
+        base = os.path.splitext(self.output)[0]
+        for flavor in self.webFlavors:
+            outputs[flavor] = "%s.%s" % (base, flavor)
+        return outputs
+
+    @property
+    def inputPaths(self):
+        """Files other than the UFO's own which affect the output."""
+        paths = []
+        if self.mtiFeaFiles:
+            paths.extend(self.mtiFeaFiles.values())
+        if self.glyphOrderPath:
+            paths.append(self.glyphOrderPath)
+        return paths
+
+    @property
+    def fingerprintPath(self):
+        return self.output + ".fingerprint"
+
+    def fingerprint(self):
+        """The fingerprint of the inputs and options of this job."""
+        options = dict(mtiFeaFiles=self.mtiFeaFiles,
+                       glyphOrderFromLib=self.glyphOrderFromLib)
+        if self.glyphOrderPath:
+            options["glyphOrder"] = readGlyphOrder(self.glyphOrderPath)
+        return compileFingerprint(
+            self.ufoPath, _compileFunctions[self.fontFormat], **options)
+
+    def isUpToDate(self):
+        """
+        Return True if the output is newer than all of its inputs, or with
+        useFingerprint, if it was compiled from the same inputs.
+        """
+        outputs = self.outputs.values()
+        if not all(os.path.exists(path) for path in outputs):
+            return False
+        if self.useFingerprint:
+            if not os.path.exists(self.fingerprintPath):
+                return False
+            with open(self.fingerprintPath) as f:
+                return f.read().strip() == self.fingerprint()
+        outputTime = min(os.path.getmtime(path) for path in outputs)
+        return _newestModificationTime(self.ufoPath, self.inputPaths) <= outputTime
+
+    def run(self):
+        fingerprint = self.fingerprint() if self.useFingerprint else None
+        font = openFont(self.ufoPath, fast=self.fastReader)
+        glyphOrder = None
+        if self.glyphOrderPath:
+            glyphOrder = readGlyphOrder(self.glyphOrderPath)
+        elif self.glyphOrderFromLib:
+            glyphOrder = font.lib.get("public.glyphOrder")
+        otf = _compileFunctions[self.fontFormat](
+            font, glyphOrder=glyphOrder, mtiFeaFiles=self.mtiFeaFiles)
+        outputDir = os.path.dirname(self.output)
+        if outputDir and not os.path.isdir(outputDir):
+            try:
+                os.makedirs(outputDir)
+            except OSError:
+                # another worker may have created it in the meantime
+                if not os.path.isdir(outputDir):
+                    raise
+        outputs = self.outputs
+        data = compileWebFonts(otf, flavors=list(outputs))
+        for flavor, path in outputs.items():
+            with open(path, "wb") as f:
+                f.write(data[flavor])
+        if fingerprint is not None:
+            with open(self.fingerprintPath, "w") as f:
+                f.write(fingerprint + "\n")
+
+
+def _newestModificationTime(ufoPath, otherPaths=()):
+    newest = os.path.getmtime(ufoPath)
+    for directory, _, fileNames in os.walk(ufoPath):
+        for fileName in fileNames:
+            newest = max(newest, os.path.getmtime(os.path.join(directory, fileName)))
+    for path in otherPaths:
+        newest = max(newest, os.path.getmtime(path))
+    return newest
+
+
+def _runJob(job):
+    """Run a job, returning it with its duration and error message if any."""
+    start = time.time()
+    try:
+        job.run()
+    except Exception:
+        return job, time.time() - start, traceback.format_exc()
+    return job, time.time() - start, None
+
+
+def readGlyphOrder(path):
+    """Read a glyph order file: one glyph name per line, # for comments."""
+    glyphOrder = []
+    with open(path) as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if line:
+                glyphOrder.append(line)
+    return glyphOrder
+
+
+def expandUFOPaths(patterns):
+    """Expand glob patterns into a sorted list of unique UFO paths."""
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern))
+        if not matches:
+            raise ValueError("no UFO matches %s" % pattern)
+        for path in matches:
+            path = os.path.normpath(path)
+            if path not in paths:
+                paths.append(path)
+    return paths
+
+
+def parseMTIFeaFiles(specs, ufoPath):
+    """
+    Turn ``TAG=PATH`` option values into an mtiFeaFiles dict. ``{ufo}``
+    in PATH is replaced with the UFO's file name without extension, so
+    that one option can serve a batch of UFOs.
+    """
+    if not specs:
+        return None
+    ufoName = os.path.splitext(os.path.basename(ufoPath))[0]
+    mtiFeaFiles = {}
+    for spec in specs:
+        tag, _, path = spec.partition("=")
+        if not path:
+            raise ValueError("expected TAG=PATH, got %s" % spec)
+        mtiFeaFiles[tag] = path.replace("{ufo}", ufoName)
+    return mtiFeaFiles
+
+
+def makeJobs(ufoPaths, formats, outputDir=None, mtiFeaSpecs=None,
+             glyphOrderPath=None, glyphOrderFromLib=False, webFlavors=(),
+             fastReader=False, useFingerprint=False):
+    """
+    Make a CompileJob per UFO and format. Raises ValueError if two jobs
+    would write the same output, such as UFOs with the same file name in
+    different directories compiled to one *outputDir*.
+    """
+    jobs = []
+    outputs = {}
+    for ufoPath in ufoPaths:
+        baseName = os.path.splitext(os.path.basename(ufoPath))[0]
+        directory = outputDir if outputDir is not None else os.path.dirname(ufoPath)
+        for fontFormat in formats:
+            output = os.path.join(directory, "%s.%s" % (baseName, fontFormat))
+            key = os.path.normcase(os.path.abspath(output))
+            if key in outputs:
+                raise ValueError("%s and %s would both be compiled to %s" % (
+                    outputs[key], ufoPath, output))
+            outputs[key] = ufoPath
+            jobs.append(CompileJob(
+                ufoPath, fontFormat, output,
+                mtiFeaFiles=parseMTIFeaFiles(mtiFeaSpecs, ufoPath),
+                glyphOrderPath=glyphOrderPath,
+                glyphOrderFromLib=glyphOrderFromLib,
+                webFlavors=webFlavors, fastReader=fastReader,
+                useFingerprint=useFingerprint))
+    return jobs
+
+
+def runJobs(jobs, processes=1, force=False, stream=sys.stdout):
+    """
+    Run *jobs* with *processes* parallel workers, printing progress to
+    *stream*. Returns a list of ``(job, error)`` tuples for failed jobs.
+    """
+    if not force:
+        skipped = [job for job in jobs if job.isUpToDate()]
+        for job in skipped:
+            print("up to date: %s" % job.output, file=stream)
+        jobs = [job for job in jobs if job not in skipped]
+    if not jobs:
+        return []
+
+    if processes > 1 and len(jobs) > 1:
+        pool = multiprocessing.Pool(min(processes, len(jobs)))
+        results = pool.imap_unordered(_runJob, jobs)
+    else:
+        pool = None
+        results = (_runJob(job) for job in jobs)
+
+    failures = []
+    try:
+        for i, (job, seconds, error) in enumerate(results):
+            status = "failed" if error else "done"
+            print("[%d/%d] %s %s (%.2fs)" % (
+                i + 1, len(jobs), status, job.output, seconds), file=stream)
+            if error:
+                failures.append((job, error))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return failures
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog="ufo2ft", description="Compile UFOs to OpenType fonts.")
+    parser.add_argument("ufos", nargs="+", metavar="UFO",
+                        help="UFO paths or glob patterns")
+    parser.add_argument("--otf", action="append_const", dest="formats",
+                        const="otf", help="compile CFF-flavored OpenType")
+    parser.add_argument("--ttf", action="append_const", dest="formats",
+                        const="ttf", help="compile TrueType-flavored OpenType")
+    parser.add_argument("--woff", action="append_const", dest="webFlavors",
+                        const="woff", help="also write WOFF files")
+    parser.add_argument("--woff2", action="append_const", dest="webFlavors",
+                        const="woff2", help="also write WOFF2 files "
+                                            "(requires brotli)")
+    parser.add_argument("-o", "--output-dir", default=None,
+                        help="output directory (default: next to each UFO)")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="number of parallel workers (0: one per CPU)")
+    parser.add_argument("--mti", action="append", dest="mtiFeaFiles",
+                        metavar="TAG=PATH",
+                        help="compile table TAG from the MTI feature file PATH "
+                             "({ufo} is replaced with the UFO name)")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--glyph-order", dest="glyphOrder", metavar="FILE",
+                       help="file with one glyph name per line")
+    group.add_argument("--glyph-order-from-lib", action="store_true",
+                       dest="glyphOrderFromLib",
+                       help="use public.glyphOrder from each UFO's lib")
+    parser.add_argument("--fast-reader", action="store_true",
+                        dest="fastReader",
+                        help="read the UFOs with ufo2ft's own lightweight reader "
+                             "instead of defcon")
+    parser.add_argument("--fingerprint", action="store_true",
+                        dest="useFingerprint",
+                        help="decide whether outputs are up to date by "
+                             "fingerprints of their inputs (stored next to "
+                             "the outputs) rather than modification times")
+    parser.add_argument("-f", "--force", action="store_true",
+                        help="compile even if the output is up to date")
+    options = parser.parse_args(args)
+
+    try:
+        ufoPaths = expandUFOPaths(options.ufos)
+        jobs = makeJobs(ufoPaths, options.formats or ["otf"],
+                        options.output_dir, options.mtiFeaFiles,
+                        options.glyphOrder, options.glyphOrderFromLib,
+                        options.webFlavors or (), options.fastReader,
+                        options.useFingerprint)
+    except ValueError as e:
+        parser.error(str(e))
+
+    processes = options.jobs or multiprocessing.cpu_count()
+    failures = runJobs(jobs, processes=processes, force=options.force)
+    if failures:
+        print("\n%d of %d jobs failed:" % (len(failures), len(jobs)),
+              file=sys.stderr)
+        for job, error in failures:
+            print("\n%s -> %s" % (job.ufoPath, job.output), file=sys.stderr)
+            print(error.rstrip(), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
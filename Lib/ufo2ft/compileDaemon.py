@@ -0,0 +1,388 @@
+"""
+A long-running compile server keeping UFOs and compiled fonts in memory.
+
+Every build otherwise pays for starting Python, importing fontTools and
+loading the UFO before the compile even starts. The daemon keeps each
+UFO it has seen loaded, together with the fonts compiled from it and
+indexes of its info, kerning and anchors. On every request it checks the
+UFO directory for modified files, reloads only those, and patches the
+previously compiled font with :func:`~ufo2ft.incrementalCompile.recompileFont`
+before writing the binary.
+
+Start the server with::
+
+    python -m ufo2ft.compileDaemon --socket /tmp/ufo2ft.sock
+
+and send requests with :func:`requestCompile`. The protocol is one JSON
+object per line in each direction over a local Unix socket:
+
+==========  ==========================================================
+command     ``"compile"``, ``"status"`` or ``"shutdown"``
+ufo         path of the UFO to compile
+format      ``"otf"`` or ``"ttf"``
+output      path of the binary to write
+glyphOrder  optional list of glyph names
+mtiFeaFiles optional ``tag : path`` dict
+==========  ==========================================================
+
+The reply contains ``"status"`` (``"ok"`` or ``"error"``), and for
+compiles the ``"mode"`` (``"full"``, ``"incremental"`` or
+``"unchanged"``) and the time taken in ``"seconds"``.
+"""
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import argparse
+import json
+import os
+import plistlib
+import socket
+import stat
+import threading
+import time
+import traceback
+
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+
+from ufo2ft import compileOTF, compileTTF
+from ufo2ft.fontInfoData import ufoLib
+from ufo2ft.fontLoader import openFont
+from ufo2ft.incrementalCompile import recompileFont
+
+_compileFunctions = dict(otf=compileOTF, ttf=compileTTF)
+
+# files whose change means the glyph set or glyph order may have changed
+_reloadAllFiles = set([
+    "metainfo.plist", "lib.plist", "layercontents.plist",
+    "glyphs/contents.plist"])
+
+
+def _readPlist(path):
+    with open(path, "rb") as f:
+        if hasattr(plistlib, "load"):
+            return plistlib.load(f)
+        return plistlib.readPlist(f)
+
+
+def _snapshotDirectory(path):
+    """Return a ``relative path : (mtime, size)`` dict for a UFO."""
+    snapshot = {}
+    for directory, _, fileNames in os.walk(path):
+        for fileName in fileNames:
+            filePath = os.path.join(directory, fileName)
+            try:
+                fileStat = os.stat(filePath)
+            except OSError:
+                continue
+            relativePath = os.path.relpath(filePath, path).replace(os.sep, "/")
+            snapshot[relativePath] = (fileStat.st_mtime, fileStat.st_size)
+    return snapshot
+
+
+def _infoIndex(font):
+    return dict((attr, getattr(font.info, attr, None))
+                for attr in ufoLib.fontInfoAttributesVersion2)
+
+
+def _anchorIndex(glyph):
+    return tuple((anchor.name, anchor.x, anchor.y) for anchor in glyph.anchors)
+
+
+class UFOState(object):
+    """
+    A loaded UFO with the data the daemon derives from it: a snapshot of
+    its files, indexes of its info, kerning and anchors, and the fonts
+    compiled from it keyed by format, each with the compile options used
+    and the changes not yet applied to it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        self.font = openFont(self.path)
+        self.snapshot = _snapshotDirectory(self.path)
+        self.infoIndex = _infoIndex(self.font)
+        self.kerningIndex = dict(self.font.kerning.items())
+        self.anchorIndex = dict(
+            (glyph.name, _anchorIndex(glyph)) for glyph in self.font)
+        self.compiled = {}
+        self._fileToGlyphName = self._readGlyphContents()
+
+    def _readGlyphContents(self):
+        contentsPath = os.path.join(self.path, "glyphs", "contents.plist")
+        if not os.path.exists(contentsPath):
+            return {}
+        contents = _readPlist(contentsPath)
+        return dict(("glyphs/" + fileName, glyphName)
+                    for glyphName, fileName in contents.items())
+
+    def update(self):
+        """
+        Reload whatever changed on disk since the last update and return
+        a dict of pending changes, in the form of recompileFont keyword
+        arguments, or None if the font was reloaded from scratch.
+        """
+        snapshot = _snapshotDirectory(self.path)
+        changedFiles = set(
+            name for name in set(snapshot) | set(self.snapshot)
+            if snapshot.get(name) != self.snapshot.get(name))
+        if not changedFiles:
+            return {}
+
+        glyphFiles = set(name for name in changedFiles
+                         if name.startswith("glyphs/") and name.endswith(".glif"))
+        if (changedFiles & _reloadAllFiles or
+                not hasattr(self.font, "reloadGlyphs") or
+                any(name not in self._fileToGlyphName for name in glyphFiles) or
+                any(name not in snapshot for name in glyphFiles)):
+            self.load()
+            return None
+        self.snapshot = snapshot
+
+        changes = dict(glyphs=set(), kerning=set(), anchors=set(), info=set(),
+                       features=False)
+        if glyphFiles:
+            glyphNames = [self._fileToGlyphName[name] for name in glyphFiles]
+            self.font.reloadGlyphs(glyphNames)
+            changes["glyphs"].update(glyphNames)
+            for glyphName in glyphNames:
+                anchors = _anchorIndex(self.font[glyphName])
+                if anchors != self.anchorIndex.get(glyphName):
+                    self.anchorIndex[glyphName] = anchors
+                    changes["anchors"].add(glyphName)
+        if "groups.plist" in changedFiles:
+            self.font.reloadGroups()
+            # group kerning may now apply to different glyphs
+            changes["kerning"].update(self.kerningIndex)
+        if "kerning.plist" in changedFiles:
+            self.font.reloadKerning()
+            kerning = dict(self.font.kerning.items())
+            changes["kerning"].update(
+                pair for pair in set(kerning) | set(self.kerningIndex)
+                if kerning.get(pair) != self.kerningIndex.get(pair))
+            self.kerningIndex = kerning
+        if "fontinfo.plist" in changedFiles:
+            self.font.reloadInfo()
+            infoIndex = _infoIndex(self.font)
+            changes["info"].update(
+                attr for attr, value in infoIndex.items()
+                if value != self.infoIndex.get(attr))
+            self.infoIndex = infoIndex
+        # features.fea and any feature files included from inside the UFO
+        if any(name.endswith(".fea") for name in changedFiles):
+            self.font.reloadFeatures()
+            changes["features"] = True
+        return changes
+
+    def refresh(self):
+        """
+        Apply the changes on disk and record them as pending for every
+        font compiled so far.
+        """
+        changes = self.update()
+        if changes is None:
+            # reloaded from scratch, every compiled font is stale
+            self.compiled = {}
+        elif changes:
+            for compiled in self.compiled.values():
+                compiled["pending"] = _mergeChanges(compiled["pending"], changes)
+
+    def compile(self, fontFormat, glyphOrder=None, mtiFeaFiles=None):
+        """
+        Bring the compiled font for *fontFormat* up to date and return it
+        with the mode used: "full", "incremental" or "unchanged".
+        """
+        options = dict(glyphOrder=glyphOrder, mtiFeaFiles=mtiFeaFiles)
+        self.refresh()
+        compiled = self.compiled.get(fontFormat)
+        if compiled is None or compiled["options"] != options:
+            otf = _compileFunctions[fontFormat](self.font, **options)
+            mode = "full"
+        elif not any(compiled["pending"].values()):
+            return compiled["font"], "unchanged"
+        else:
+            kwargs = dict(compiled["pending"])
+            kwargs.update(options)
+            otf = recompileFont(compiled["font"], self.font, **kwargs)
+            mode = "incremental"
+        self.compiled[fontFormat] = dict(font=otf, options=options, pending={})
+        return otf, mode
+
+
+def _mergeChanges(pending, changes):
+    merged = dict(glyphs=set(), kerning=set(), anchors=set(), info=set(),
+                  features=False)
+    for changeSet in (pending, changes):
+        for key, value in changeSet.items():
+            if key == "features":
+                merged[key] = merged[key] or value
+            else:
+                merged[key].update(value)
+    return merged
+
+
+def _isListening(socketPath):
+    """Return whether a server accepts connections on *socketPath*."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socketPath)
+    except socket.error:
+        return False
+    finally:
+        sock.close()
+    return True
+
+
+class CompileDaemon(socketserver.UnixStreamServer):
+    """
+    Serves compile requests on the Unix socket *socketPath*, keeping a
+    UFOState for every UFO path it is asked to compile.
+
+    If *pollInterval* is given, a background thread checks the loaded
+    UFOs for changes every *pollInterval* seconds and reloads them ahead
+    of the next request.
+
+    A socket left at *socketPath* by a daemon which exited is replaced,
+    but starting fails if a daemon is still serving on it.
+    """
+
+    def __init__(self, socketPath, pollInterval=None):
+        if os.path.lexists(socketPath):
+            if not stat.S_ISSOCK(os.lstat(socketPath).st_mode):
+                raise ValueError(
+                    "%s exists and is not a socket, refusing to replace it"
+                    % socketPath)
+            if _isListening(socketPath):
+                raise ValueError(
+                    "a daemon is already serving on %s" % socketPath)
+            # left over from a previous daemon
+            os.remove(socketPath)
+        socketserver.UnixStreamServer.__init__(self, socketPath, _RequestHandler)
+        self.socketPath = socketPath
+        self.states = {}
+        self.statesLock = threading.Lock()
+        self.pollInterval = pollInterval
+        if pollInterval:
+            watcher = threading.Thread(target=self._watch)
+            watcher.daemon = True
+            watcher.start()
+
+    def getState(self, path):
+        path = os.path.abspath(path)
+        with self.statesLock:
+            state = self.states.get(path)
+            if state is None:
+                state = self.states[path] = UFOState(path)
+        return state
+
+    def handleCommand(self, request):
+        command = request.get("command", "compile")
+        if command == "status":
+            return dict(status="ok", ufos=sorted(self.states))
+        if command == "shutdown":
+            threading.Thread(target=self.shutdown).start()
+            return dict(status="ok")
+        if command != "compile":
+            return dict(status="error", message="unknown command: %s" % command)
+
+        start = time.time()
+        state = self.getState(request["ufo"])
+        fontFormat = request.get("format", "otf")
+        if fontFormat not in _compileFunctions:
+            return dict(status="error", message="unknown format: %s" % fontFormat)
+        output = request["output"]
+        with state.lock:
+            otf, mode = state.compile(
+                fontFormat, glyphOrder=request.get("glyphOrder"),
+                mtiFeaFiles=request.get("mtiFeaFiles"))
+            if mode != "unchanged" or not os.path.exists(output):
+                otf.save(output)
+        return dict(status="ok", mode=mode, output=output,
+                    seconds=time.time() - start)
+
+    def _watch(self):
+        while True:
+            time.sleep(self.pollInterval)
+            with self.statesLock:
+                states = list(self.states.values())
+            for state in states:
+                with state.lock:
+                    try:
+                        state.refresh()
+                    except Exception:
+                        traceback.print_exc()
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        if os.path.exists(self.socketPath):
+            os.remove(self.socketPath)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for line in self.rfile:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                reply = self.server.handleCommand(json.loads(line.decode("utf-8")))
+            except Exception as e:
+                reply = dict(status="error", message="%s: %s" % (type(e).__name__, e),
+                             traceback=traceback.format_exc())
+            self.wfile.write(json.dumps(reply).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+def requestCompile(socketPath, ufoPath, output, fontFormat="otf",
+                   glyphOrder=None, mtiFeaFiles=None):
+    """
+    Ask the daemon listening on *socketPath* to compile the UFO at
+    *ufoPath* to *output* and return its reply as a dict.
+    """
+    request = dict(command="compile", ufo=os.path.abspath(ufoPath),
+                   output=os.path.abspath(output), format=fontFormat)
+    if glyphOrder is not None:
+        request["glyphOrder"] = list(glyphOrder)
+    if mtiFeaFiles is not None:
+        request["mtiFeaFiles"] = dict(
+            (tag, os.path.abspath(path)) for tag, path in mtiFeaFiles.items())
+    return _sendRequest(socketPath, request)
+
+
+def _sendRequest(socketPath, request):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socketPath)
+        stream = sock.makefile("rwb")
+        stream.write(json.dumps(request).encode("utf-8") + b"\n")
+        stream.flush()
+        return json.loads(stream.readline().decode("utf-8"))
+    finally:
+        sock.close()
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Serve ufo2ft compile requests over a Unix socket.")
+    parser.add_argument("--socket", required=True, help="path of the socket")
+    parser.add_argument("--poll", type=float, default=None, metavar="SECONDS",
+                        help="check loaded UFOs for changes in the background")
+    options = parser.parse_args(args)
+    server = CompileDaemon(options.socket, pollInterval=options.poll)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""
+Conversion of cubic curves to quadratic curves for TrueType outlines.
+
+All cubic segments of a glyph are converted in one batch. For each
+segment, the number of quadratic pieces needed to stay within the maximum
+error follows directly from the cubic's third difference: a cubic split
+into *n* equal parameter intervals, each replaced by the quadratic through
+its end points with the control point ``(3 * (P1 + P2) - (P0 + P3)) / 4``,
+deviates at most ``sqrt(3) / 36 * |P3 - 3 P2 + 3 P1 - P0| / n ** 3`` from
+the cubic (before the points are rounded to integers). The split points
+are kept as explicit on-curve points.
+
+With NumPy installed the whole glyph (or batch of glyphs) is computed with
+array operations; without it the same formulas run per segment.
+
+To keep TrueType masters interpolation compatible, :func:`convertGlyphs`
+takes the glyphs of all masters and splits each segment into the largest
+number of pieces any master needs.
+"""
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import math
+
+from fontTools.pens.basePen import decomposeSuperBezierSegment
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# maximum deviation of the midpoint quadratic, per unit of third difference
+_ERROR_FACTOR = math.sqrt(3) / 36
+
+# the most quadratic pieces a single cubic segment is split into
+MAX_SEGMENTS = 32
+
+
+class OutlineRecorder(object):
+    """
+    A pen recording the calls made to it as ``(method name, arguments)``
+    tuples, which can be replayed into another pen.
+    """
+
+    def __init__(self):
+        self.operations = []
+
+    def moveTo(self, pt):
+        self.operations.append(("moveTo", (pt,)))
+
+    def lineTo(self, pt):
+        self.operations.append(("lineTo", (pt,)))
+
+    def curveTo(self, *points):
+        self.operations.append(("curveTo", points))
+
+    def qCurveTo(self, *points):
+        self.operations.append(("qCurveTo", points))
+
+    def closePath(self):
+        self.operations.append(("closePath", ()))
+
+    def endPath(self):
+        self.operations.append(("endPath", ()))
+
+    def addComponent(self, baseGlyphName, transformation):
+        self.operations.append(("addComponent", (baseGlyphName, transformation)))
+
+    def replay(self, pen):
+        for method, args in self.operations:
+            getattr(pen, method)(*args)
+
+
+def recordGlyph(glyph):
+    """Return the list of pen operations drawing *glyph*."""
+    recorder = OutlineRecorder()
+    glyph.draw(recorder)
+    return recorder.operations
+
+
+def _splitCurves(operations):
+    """
+    Decompose curveTo calls with more than three points and return the
+    list of operations (with every curveTo having exactly three points)
+    together with the list of ``(p0, p1, p2, p3)`` cubic segments.
+    """
+    result = []
+    segments = []
+    current = None
+    for method, args in operations:
+        if method == "curveTo":
+            pieces = [args] if len(args) == 3 else decomposeSuperBezierSegment(args)
+            for piece in pieces:
+                segments.append((current,) + tuple(piece))
+                result.append(("curveTo", tuple(piece)))
+                current = piece[-1]
+            continue
+        if method in ("moveTo", "lineTo", "qCurveTo"):
+            current = args[-1]
+        result.append((method, args))
+    return result, segments
+
+
+def segmentCounts(segments, maxError):
+    """
+    Return, for every cubic segment, the number of quadratic pieces
+    needed to stay within *maxError*.
+    """
+    if np is not None:
+        points = np.asarray(segments, dtype=float).reshape(-1, 4, 2)
+        third = points[:, 3] - 3 * points[:, 2] + 3 * points[:, 1] - points[:, 0]
+        error = _ERROR_FACTOR * np.hypot(third[:, 0], third[:, 1])
+        counts = np.ceil(np.cbrt(error / maxError))
+        return np.clip(counts, 1, MAX_SEGMENTS).astype(int).tolist()
+    counts = []
+    for p0, p1, p2, p3 in segments:
+        x = p3[0] - 3 * p2[0] + 3 * p1[0] - p0[0]
+        y = p3[1] - 3 * p2[1] + 3 * p1[1] - p0[1]
+        error = _ERROR_FACTOR * math.hypot(x, y)
+        count = int(math.ceil((error / maxError) ** (1 / 3) - 1e-9))
+        counts.append(min(max(count, 1), MAX_SEGMENTS))
+    return counts
+
+
+def _bezierPoint(p0, p1, p2, p3, t):
+    mt = 1 - t
+    a, b, c, d = mt * mt * mt, 3 * mt * mt * t, 3 * mt * t * t, t * t * t
+    return (a * p0[0] + b * p1[0] + c * p2[0] + d * p3[0],
+            a * p0[1] + b * p1[1] + c * p2[1] + d * p3[1])
+
+
+def _bezierDerivative(p0, p1, p2, p3, t):
+    mt = 1 - t
+    a, b, c = 3 * mt * mt, 6 * mt * t, 3 * t * t
+    return (a * (p1[0] - p0[0]) + b * (p2[0] - p1[0]) + c * (p3[0] - p2[0]),
+            a * (p1[1] - p0[1]) + b * (p2[1] - p1[1]) + c * (p3[1] - p2[1]))
+
+
+def quadraticPieces(segments, counts):
+    """
+    Split every cubic segment into its number of pieces from *counts*
+    and return, per segment, the list of ``(off-curve, on-curve)``
+    points of its quadratic pieces. Coordinates are rounded to integers.
+    """
+    if not segments:
+        return []
+    if np is not None:
+        return _quadraticPiecesArray(segments, counts)
+    result = []
+    for (p0, p1, p2, p3), count in zip(segments, counts):
+        pieces = []
+        h = 1 / count
+        for k in range(count):
+            t0, t1 = k * h, (k + 1) * h
+            a = _bezierPoint(p0, p1, p2, p3, t0)
+            d = p3 if k == count - 1 else _bezierPoint(p0, p1, p2, p3, t1)
+            da = _bezierDerivative(p0, p1, p2, p3, t0)
+            dd = _bezierDerivative(p0, p1, p2, p3, t1)
+            q = ((a[0] + d[0]) / 2 + h * (da[0] - dd[0]) / 4,
+                 (a[1] + d[1]) / 2 + h * (da[1] - dd[1]) / 4)
+            pieces.append((_roundPoint(q), _roundPoint(d)))
+        result.append(pieces)
+    return result
+
+
+def _quadraticPiecesArray(segments, counts):
+    points = np.asarray(segments, dtype=float).reshape(-1, 4, 2)
+    counts = np.asarray(counts, dtype=int)
+    segmentIndex = np.repeat(np.arange(len(counts)), counts)
+    starts = np.cumsum(counts) - counts
+    k = np.arange(counts.sum()) - np.repeat(starts, counts)
+    n = counts[segmentIndex].astype(float)
+    t0 = (k / n)[:, None]
+    t1 = ((k + 1) / n)[:, None]
+    h = 1 / n[:, None]
+    p0, p1, p2, p3 = [points[segmentIndex, i] for i in range(4)]
+
+    def point(t):
+        mt = 1 - t
+        return (mt ** 3 * p0 + 3 * mt * mt * t * p1 +
+                3 * mt * t * t * p2 + t ** 3 * p3)
+
+    def derivative(t):
+        mt = 1 - t
+        return 3 * (mt * mt * (p1 - p0) + 2 * mt * t * (p2 - p1) +
+                    t * t * (p3 - p2))
+
+    a = point(t0)
+    d = point(t1)
+    # the last piece ends exactly on the original end point
+    last = k == counts[segmentIndex] - 1
+    d[last] = p3[last]
+    q = (a + d) / 2 + h * (derivative(t0) - derivative(t1)) / 4
+    q = np.round(q).astype(int).tolist()
+    d = np.round(d).astype(int).tolist()
+
+    result = []
+    for start, count in zip(starts.tolist(), counts.tolist()):
+        result.append([(tuple(q[i]), tuple(d[i]))
+                       for i in range(start, start + count)])
+    return result
+
+
+def _roundPoint(pt):
+    return (int(round(pt[0])), int(round(pt[1])))
+
+
+def convertOperations(operations, maxError, counts=None):
+    """
+    Return a copy of the pen *operations* with every curveTo replaced
+    by qCurveTo calls. *counts* optionally gives the number of pieces
+    for each cubic segment, overriding what *maxError* requires.
+    """
+    operations, segments = _splitCurves(operations)
+    if not segments:
+        return operations
+    if counts is None:
+        counts = segmentCounts(segments, maxError)
+    pieces = iter(quadraticPieces(segments, counts))
+    converted = []
+    for method, args in operations:
+        if method == "curveTo":
+            for offCurve, onCurve in next(pieces):
+                converted.append(("qCurveTo", (offCurve, onCurve)))
+        else:
+            converted.append((method, args))
+    return converted
+
+
+def _convertOperationsStar(args):
+    return convertOperations(*args)
+
+
+def convertGlyphs(glyphs, maxError, masters=None, workers=1):
+    """
+    Convert the outlines of *glyphs* (a ``name : glyph`` dict) and return
+    a ``name : operations`` dict of their quadratic pen operations. Glyphs
+    without cubic curves are left out of the result.
+
+    *masters* is an optional list of other fonts (or ``name : glyph``
+    dicts) the glyphs must stay interpolation compatible with: each cubic
+    segment is then split into as many pieces as the master needing the
+    most requires. Glyphs whose segments don't match across the masters
+    are converted on their own.
+
+    With *workers* greater than one, glyphs are converted in that many
+    processes.
+    """
+    recorded = {}
+    for name, glyph in glyphs.items():
+        operations = recordGlyph(glyph)
+        if any(method == "curveTo" for method, _ in operations):
+            recorded[name] = operations
+    jobs = []
+    for name, operations in sorted(recorded.items()):
+        counts = None
+        if masters:
+            counts = _compatibleCounts(name, operations, masters, maxError)
+        jobs.append((operations, maxError, counts))
+
+    if workers > 1 and len(jobs) > 1:
+        import multiprocessing
+        pool = multiprocessing.Pool(workers)
+        try:
+            results = pool.map(_convertOperationsStar, jobs,
+                               chunksize=max(1, len(jobs) // (workers * 4)))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [convertOperations(*job) for job in jobs]
+    return dict(zip(sorted(recorded), results))
+
+
+def _compatibleCounts(glyphName, operations, masters, maxError):
+    _, segments = _splitCurves(operations)
+    if not segments:
+        return None
+    counts = segmentCounts(segments, maxError)
+    for master in masters:
+        if glyphName not in master:
+            continue
+        _, masterSegments = _splitCurves(recordGlyph(master[glyphName]))
+        if len(masterSegments) != len(segments):
+            return None
+        counts = [max(a, b) for a, b in
+                  zip(counts, segmentCounts(masterSegments, maxError))]
+    return counts
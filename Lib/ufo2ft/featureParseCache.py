@@ -0,0 +1,122 @@
+"""
+A family-scoped cache of parsed feature files.
+
+The masters of a family usually share their feature source (often a main
+file including common files) and only differ in the kern, mark and mkmk
+features ufo2ft writes for each of them. A :class:`FeatureParseCache`
+passed to the compiles of all masters parses the shared part once::
+
+    cache = FeatureParseCache()
+    otfs = [compileOTF(ufo, featureCache=cache) for ufo in masters]
+
+Each master then only parses its generated features, in the scope of the
+shared part's glyph classes, and feaLib builds the layout tables from the
+combined syntax tree. The cache lives in memory and is safe to share
+between threads.
+"""
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import hashlib
+import os
+import struct
+import threading
+
+from fontTools.feaLib.ast import FeatureFile, GlyphClassDefinition
+from fontTools.feaLib.builder import addOpenTypeFeatures
+from fontTools.feaLib.parser import Parser
+from fontTools.misc.py23 import UnicodeIO, tobytes
+
+from ufo2ft.makeotfParts import includedFeatureFiles
+
+
+class FeatureParseCache(object):
+    """
+    Cache the syntax trees of feature texts by their content, the contents
+    of the files they include and the glyph names that change how they are
+    parsed.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def makeKey(self, features, glyphOrder, directory=None):
+        """
+        Return the cache key for parsing the feature text *features* (with
+        includes resolved against *directory*) for *glyphOrder*.
+        """
+        digest = hashlib.sha256()
+        # feaLib only looks glyph names up to tell names containing
+        # hyphens from glyph ranges
+        hyphenated = sorted(name for name in glyphOrder if "-" in name)
+        for value in (features, "\n".join(hyphenated)):
+            _updateDigest(digest, tobytes(value, encoding="utf-8"))
+        for path in includedFeatureFiles(features, directory):
+            _updateDigest(digest, tobytes(path, encoding="utf-8"))
+            if not os.path.isfile(path):
+                _updateDigest(digest, b"missing")
+                continue
+            with open(path, "rb") as f:
+                _updateDigest(digest, f.read())
+        return digest.hexdigest()
+
+    def parse(self, features, glyphOrder, directory=None):
+        """
+        Return the parsed FeatureFile of *features* for *glyphOrder*. The
+        tree is shared by all compiles using the cache and must not be
+        modified.
+        """
+        return self._entry(features, glyphOrder, directory)[0]
+
+    def build(self, font, features, generatedFeatures=(), directory=None):
+        """
+        Add the layout tables compiled from the shared feature text
+        *features* and the per-font *generatedFeatures* texts to the TTFont
+        *font*. Only the generated texts are parsed if *features* was
+        parsed for a compile before. They may refer to the glyph classes
+        defined at the top level of *features*.
+        """
+        glyphOrder = font.getGlyphOrder()
+        tree, preamble, preambleSize = self._entry(
+            features, glyphOrder, directory)
+        statements = list(tree.statements)
+        generated = "\n\n".join(generatedFeatures)
+        if generated.strip():
+            generatedTree = _parse(preamble + "\n" + generated, glyphOrder)
+            statements.extend(generatedTree.statements[preambleSize:])
+        combined = FeatureFile()
+        combined.statements = statements
+        addOpenTypeFeatures(font, combined)
+
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            self._entries.clear()
+
+    def _entry(self, features, glyphOrder, directory):
+        key = self.makeKey(features, glyphOrder, directory)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                return entry
+            self.misses += 1
+        tree = _parse(features, glyphOrder)
+        # the glyph classes the generated features may refer to
+        classes = [statement for statement in tree.statements
+                   if isinstance(statement, GlyphClassDefinition)]
+        preamble = "\n".join(statement.asFea() for statement in classes)
+        entry = (tree, preamble, len(classes))
+        with self._lock:
+            return self._entries.setdefault(key, entry)
+
+
+def _parse(features, glyphOrder):
+    return Parser(UnicodeIO(features), glyphNames=glyphOrder).parse()
+
+
+def _updateDigest(digest, data):
+    digest.update(struct.pack(">I", len(data)) + data)
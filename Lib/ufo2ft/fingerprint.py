@@ -0,0 +1,185 @@
+"""
+Fingerprints of everything which affects a compiled font, to skip
+compiles whose output would not change.
+
+A fingerprint is a SHA-256 digest over the UFO's files as stored on disk
+(the .glif files of the default layer are hashed as raw bytes, nothing is
+parsed), the font info after fallback resolution, the feature files
+included from the features, the MTI feature files, the compile options
+including the compiler classes, and the ufo2ft and fontTools versions::
+
+    fingerprint = compileFingerprint(ufo, compileOTF)
+    ...
+    otf = compileOTF(ufo, previousFingerprint=fingerprint)
+    if otf is None:
+        print("up to date")
+
+Fingerprints describe the UFO on disk: fonts with unsaved changes are
+always compiled.
+"""
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import hashlib
+import inspect
+import json
+import os
+
+from fontTools import version as fontToolsVersion
+from fontTools.misc.py23 import basestring
+
+from ufo2ft import __version__
+from ufo2ft.fontInfoData import getAttrWithFallback, specialFallbacks, staticFallbackData
+from ufo2ft.fontObjects import Info
+from ufo2ft.makeotfParts import includedFeatureFiles
+from ufo2ft.ufoReader import _defaultLayerDirectory, _readPlist
+
+# compile arguments which don't change the compiled font
+_ignoredArguments = set([
+    "font", "memoryAccountant", "stageCallback", "conversionWorkers",
+    "verifyBounds", "previousFingerprint", "stageWorkers", "costReport",
+    "layoutCache", "featureCache"])
+
+# info fallbacks depending on the current time or on the glyph outlines,
+# for which the raw value is used (the outlines are fingerprinted anyway)
+_rawInfoAttributes = set([
+    "openTypeHeadCreated", "openTypeOS2WinAscent", "openTypeOS2WinDescent"])
+
+_ufoFiles = ("metainfo.plist", "groups.plist", "kerning.plist", "lib.plist",
+             "features.fea", "layercontents.plist")
+
+
+class _Digest(object):
+
+    def __init__(self):
+        self._hash = hashlib.sha256()
+
+    def update(self, label, data):
+        if not isinstance(data, bytes):
+            data = data.encode("utf-8")
+        label = label.encode("utf-8")
+        for value in (label, data):
+            self._hash.update(("%d:" % len(value)).encode("ascii") + value)
+
+    def updateFile(self, label, path):
+        if os.path.isfile(path):
+            with open(path, "rb") as f:
+                self.update(label, f.read())
+        else:
+            self.update(label + " missing", b"")
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+
+def _resolvedInfo(path):
+    """The info values the compilers see, as far as the outlines allow."""
+    raw = _readPlist(os.path.join(path, "fontinfo.plist"), {})
+    info = Info()
+    for attr, value in raw.items():
+        setattr(info, attr, value)
+    values = {}
+    for attr in set(raw) | set(staticFallbackData) | set(specialFallbacks):
+        if attr in _rawInfoAttributes:
+            values[attr] = raw.get(attr)
+            continue
+        try:
+            values[attr] = getAttrWithFallback(info, attr)
+        except Exception:
+            # the compile fails on this too; the raw value is enough
+            values[attr] = raw.get(attr)
+    return values
+
+
+def _jsonDefault(value):
+    if inspect.isclass(value) or inspect.isfunction(value):
+        return "%s.%s" % (value.__module__, value.__name__)
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    path = getattr(value, "path", None)
+    if path is not None and os.path.isdir(path):
+        # a font, e.g. one of compatibleMasters
+        return ufoFingerprint(path)
+    return repr(value)
+
+
+def _dumps(value):
+    return json.dumps(value, sort_keys=True, default=_jsonDefault)
+
+
+def ufoFingerprint(path):
+    """
+    Return the fingerprint of the UFO at *path*: its info, kerning,
+    groups, lib, features with their included files and the glyphs of
+    the default layer.
+    """
+    digest = _Digest()
+    for fileName in _ufoFiles:
+        digest.updateFile(fileName, os.path.join(path, fileName))
+    digest.update("fontinfo", _dumps(_resolvedInfo(path)))
+
+    featuresPath = os.path.join(path, "features.fea")
+    if os.path.isfile(featuresPath):
+        with open(featuresPath, "rb") as f:
+            features = f.read().decode("utf-8")
+        for includePath in includedFeatureFiles(features, path):
+            digest.updateFile("include " + includePath, includePath)
+
+    layerDirectory = _defaultLayerDirectory(path)
+    glyphsDir = os.path.join(path, layerDirectory)
+    contentsPath = os.path.join(glyphsDir, "contents.plist")
+    digest.updateFile(layerDirectory + "/contents.plist", contentsPath)
+    contents = _readPlist(contentsPath, {})
+    for glyphName, fileName in sorted(contents.items()):
+        digest.updateFile(glyphName, os.path.join(glyphsDir, fileName))
+    return digest.hexdigest()
+
+
+def _argumentDefaults(function):
+    if hasattr(inspect, "signature"):
+        return dict(
+            (name, parameter.default)
+            for name, parameter in inspect.signature(function).parameters.items()
+            if parameter.default is not inspect.Parameter.empty)
+    spec = inspect.getargspec(function)
+    defaults = spec.defaults or ()
+    return dict(zip(spec.args[len(spec.args) - len(defaults):], defaults))
+
+
+def compileFingerprint(font, compileFunction, **options):
+    """
+    Return the fingerprint of compiling *font* (a font object or a UFO
+    path) with ``compileFunction(font, **options)``, or None if *font* has
+    no path. Options left out are fingerprinted with their default values.
+    """
+    if isinstance(font, basestring):
+        path = font
+    else:
+        path = getattr(font, "path", None)
+    if path is None:
+        return None
+    arguments = _argumentDefaults(compileFunction)
+    arguments.update(options)
+    for name in _ignoredArguments:
+        arguments.pop(name, None)
+
+    digest = _Digest()
+    digest.update("versions", _dumps([__version__, fontToolsVersion]))
+    digest.update("function", _dumps(compileFunction))
+    digest.update("ufo", ufoFingerprint(path))
+    mtiFeaFiles = arguments.pop("mtiFeaFiles", None) or {}
+    for tag, mtiPath in sorted(mtiFeaFiles.items()):
+        digest.updateFile("mti " + tag, mtiPath)
+    digest.update("options", _dumps(arguments))
+    return digest.hexdigest()
+
+
+def isUpToDate(font, compileFunction, previousFingerprint, **options):
+    """
+    Return True if compiling *font* would give the same font as the
+    compile *previousFingerprint* was computed for. Fonts with unsaved
+    changes are never up to date.
+    """
+    if previousFingerprint is None or getattr(font, "dirty", False):
+        return False
+    return compileFingerprint(font, compileFunction, **options) == previousFingerprint
@@ -0,0 +1,23 @@
+"""
+Opening UFOs from paths, for the entry points which take paths rather
+than font objects (the compile daemon and the command line tools).
+"""
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+
+def openFont(path, fast=False):
+    """
+    Open the UFO at *path* with defcon, or with robofab if defcon is not
+    installed. If *fast* is True, the UFO is read with the lightweight
+    reader of :mod:`ufo2ft.ufoReader` instead (format 2 and 3 UFOs only).
+    """
+    if fast:
+        from ufo2ft.ufoReader import readFont
+        return readFont(path)
+    try:
+        from defcon import Font
+    except ImportError:
+        from robofab.world import OpenFont
+        return OpenFont(path)
+    return Font(path)
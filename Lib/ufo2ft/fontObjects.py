@@ -0,0 +1,291 @@
+"""
+Lightweight in-memory font objects with the subset of the defcon/robofab
+API the compilers use.
+
+The outline compilers convert every UFO glyph to a compact :class:`Glyph`
+once and draw from those afterwards. :class:`Font` holds such glyphs for
+fonts which never exist as UFOs on disk, such as interpolated instances.
+"""
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+from array import array
+
+from fontTools.pens.boundsPen import BoundsPen
+
+
+class Info(object):
+    """Font info; attributes which were never set are None."""
+
+    def __init__(self, font=None):
+        self._font = font
+
+    def getParent(self):
+        return self._font
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return None
+
+
+class Features(object):
+
+    def __init__(self, text=None):
+        self.text = text
+
+
+class Anchor(object):
+
+    __slots__ = ("name", "x", "y")
+
+    def __init__(self, name, x, y):
+        self.name = name
+        self.x = x
+        self.y = y
+
+    def __getstate__(self):
+        return (self.name, self.x, self.y)
+
+    def __setstate__(self, state):
+        self.name, self.x, self.y = state
+
+
+class Component(object):
+
+    __slots__ = ("baseGlyph", "transformation")
+
+    def __init__(self, baseGlyph, transformation):
+        self.baseGlyph = baseGlyph
+        self.transformation = tuple(transformation)
+
+    def __getstate__(self):
+        return (self.baseGlyph, self.transformation)
+
+    def __setstate__(self, state):
+        self.baseGlyph, self.transformation = state
+
+
+# segment types of the compact outline representation
+_MOVE, _LINE, _CURVE, _QCURVE, _QCURVE_CLOSED, _CLOSE, _END = range(7)
+
+class _OutlineBuilder(object):
+    """A segment pen collecting an outline into flat lists."""
+
+    def __init__(self):
+        self.coordinates = []
+        self.segmentTypes = []
+        self.segmentSizes = []
+        self.components = []
+
+    def _addSegment(self, segmentType, points):
+        self.segmentTypes.append(segmentType)
+        self.segmentSizes.append(len(points))
+        for x, y in points:
+            self.coordinates.append(x)
+            self.coordinates.append(y)
+
+    def moveTo(self, pt):
+        self._addSegment(_MOVE, (pt,))
+
+    def lineTo(self, pt):
+        self._addSegment(_LINE, (pt,))
+
+    def curveTo(self, *points):
+        self._addSegment(_CURVE, points)
+
+    def qCurveTo(self, *points):
+        if points[-1] is None:
+            # a contour of off-curve points only
+            self._addSegment(_QCURVE_CLOSED, points[:-1])
+        else:
+            self._addSegment(_QCURVE, points)
+
+    def closePath(self):
+        self._addSegment(_CLOSE, ())
+
+    def endPath(self):
+        self._addSegment(_END, ())
+
+    def addComponent(self, baseGlyphName, transformation):
+        self.components.append(Component(baseGlyphName, transformation))
+
+
+def _coordinateArray(values):
+    """Store integer coordinates as 32 bit integers, others as doubles."""
+    try:
+        if all(value == int(value) for value in values):
+            return array("i", [int(value) for value in values])
+    except OverflowError:
+        pass
+    return array("d", values)
+
+
+class Glyph(object):
+    """
+    A compact glyph. The outline is held in flat arrays: the coordinates
+    of all points, the type of each segment pen call and its number of
+    points. Components and anchors are tuples of slotted objects.
+
+    *operations* is the list of segment pen calls drawing the outline, as
+    ``(method name, arguments)`` tuples. *glyphSet* is used to resolve
+    components when computing bounds.
+    """
+
+    __slots__ = ("name", "width", "unicodes", "coordinates", "segmentTypes",
+                 "segmentSizes", "components", "anchors", "glyphSet")
+
+    def __init__(self, name, width=0, unicodes=None, operations=None,
+                 anchors=None, glyphSet=None):
+        self.name = name
+        self.width = width
+        self.unicodes = list(unicodes or [])
+        self.anchors = tuple(anchors or ())
+        self.glyphSet = glyphSet
+        builder = _OutlineBuilder()
+        for method, args in operations or ():
+            getattr(builder, method)(*args)
+        self._setOutline(builder)
+
+    def _setOutline(self, builder):
+        self.coordinates = _coordinateArray(builder.coordinates)
+        self.segmentTypes = array("B", builder.segmentTypes)
+        self.segmentSizes = array("H", builder.segmentSizes)
+        self.components = tuple(builder.components)
+
+    @classmethod
+    def fromGlyph(cls, glyph, glyphSet=None):
+        """
+        Convert a defcon or robofab glyph, or return *glyph* itself if
+        it already is a compact glyph.
+        """
+        if isinstance(glyph, Glyph):
+            return glyph
+        self = cls.__new__(cls)
+        self.name = glyph.name
+        self.width = glyph.width
+        self.unicodes = list(glyph.unicodes)
+        self.anchors = tuple(Anchor(anchor.name, anchor.x, anchor.y)
+                             for anchor in getattr(glyph, "anchors", ()))
+        self.glyphSet = glyphSet
+        builder = _OutlineBuilder()
+        glyph.draw(builder)
+        self._setOutline(builder)
+        return self
+
+    def __getstate__(self):
+        # the glyph set is not pickled along
+        return dict((attr, getattr(self, attr)) for attr in self.__slots__
+                    if attr != "glyphSet")
+
+    def __setstate__(self, state):
+        for attr, value in state.items():
+            setattr(self, attr, value)
+        self.glyphSet = None
+
+    def _get_unicode(self):
+        if self.unicodes:
+            return self.unicodes[0]
+        return None
+
+    unicode = property(_get_unicode)
+
+    def __len__(self):
+        return sum(1 for segmentType in self.segmentTypes
+                   if segmentType in (_CLOSE, _END))
+
+    def draw(self, pen):
+        # pair the coordinates up once, then hand out slices per segment
+        coordinates = iter(self.coordinates)
+        points = list(zip(coordinates, coordinates))
+        qCurveTo = pen.qCurveTo
+        methods = (pen.moveTo, pen.lineTo, pen.curveTo, qCurveTo,
+                   None, pen.closePath, pen.endPath)
+        index = 0
+        for segmentType, size in zip(self.segmentTypes, self.segmentSizes):
+            segment = points[index:index + size]
+            index += size
+            if segmentType == _QCURVE_CLOSED:
+                segment.append(None)
+                qCurveTo(*segment)
+            else:
+                methods[segmentType](*segment)
+        for component in self.components:
+            pen.addComponent(component.baseGlyph, component.transformation)
+
+    def _get_bounds(self):
+        pen = BoundsPen(self.glyphSet)
+        self.draw(pen)
+        return pen.bounds
+
+    bounds = property(_get_bounds)
+
+    def _get_leftMargin(self):
+        bounds = self.bounds
+        if bounds is None:
+            return None
+        return bounds[0]
+
+    leftMargin = property(_get_leftMargin)
+
+    def _get_rightMargin(self):
+        bounds = self.bounds
+        if bounds is None:
+            return None
+        return self.width - bounds[2]
+
+    rightMargin = property(_get_rightMargin)
+
+
+class Font(object):
+    """
+    A font holding Glyph objects. *path* is only used to resolve relative
+    include statements in the features.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.info = Info(self)
+        self.features = Features()
+        self.kerning = {}
+        self.groups = {}
+        self.lib = {}
+        self._glyphs = {}
+        self._order = []
+
+    def addGlyph(self, glyph):
+        if glyph.name not in self._glyphs:
+            self._order.append(glyph.name)
+        self._glyphs[glyph.name] = glyph
+        glyph.glyphSet = self
+
+    def keys(self):
+        return list(self._order)
+
+    def __len__(self):
+        return len(self._order)
+
+    def __contains__(self, name):
+        return name in self._glyphs
+
+    def __getitem__(self, name):
+        return self._glyphs[name]
+
+    def __iter__(self):
+        for name in self._order:
+            yield self._glyphs[name]
+
+    def _get_bounds(self):
+        rect = None
+        for glyph in self:
+            bounds = glyph.bounds
+            if bounds is None:
+                continue
+            if rect is None:
+                rect = bounds
+            else:
+                rect = (min(rect[0], bounds[0]), min(rect[1], bounds[1]),
+                        max(rect[2], bounds[2]), max(rect[3], bounds[3]))
+        return rect
+
+    bounds = property(_get_bounds)
@@ -0,0 +1,171 @@
+"""
+Per-glyph cost and complexity report for the outline compilers.
+
+A :class:`GlyphCostReport` can be passed to ``compileOTF``/``compileTTF``
+(and to the outline compilers directly). For every glyph it then records
+the time spent drawing it into its charstring or glyf glyph, its point and
+contour counts, its component depth and its compiled size::
+
+    report = GlyphCostReport()
+    otf = compileOTF(ufo, costReport=report)
+    print(report.report())
+    report.writeCSV("glyphCosts.csv")
+
+The report lists the most expensive glyphs and the glyphs close to a
+limit of the outline format, so that pathological outlines can be found
+and fixed. Use one report per compile.
+"""
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import csv
+import io
+import json
+import sys
+import time
+
+from fontTools.misc.py23 import tounicode
+
+_timer = getattr(time, "perf_counter", time.time)
+
+# hard limits of the outline formats, per recorded field
+_limits = {
+    "CFF": {
+        # Type 2 charstring length implementation limit
+        "bytes": 0xFFFF,
+    },
+    "glyf": {
+        # endPtsOfContours entries are uint16, numberOfContours is int16
+        "points": 0xFFFF,
+        "contours": 0x7FFF,
+    },
+}
+
+_fields = ("glyphName", "drawSeconds", "points", "contours", "components",
+           "componentDepth", "bytes")
+
+
+class GlyphCostReport(object):
+    """
+    Collects the cost of each glyph of a compile. *nearLimit* is the
+    fraction of a format limit above which a glyph is flagged.
+    """
+
+    enabled = True
+
+    def __init__(self, nearLimit=0.8):
+        self.nearLimit = nearLimit
+        self.outlineFormat = None
+        self.glyphs = {}
+
+    def measure(self, glyph, glyphSet, function, *args):
+        """
+        Call ``function(*args)``, which draws the compact *glyph*, and
+        record the time it took along with the glyph's outline statistics.
+        Components are resolved through *glyphSet*. Returns the result.
+        """
+        start = _timer()
+        result = function(*args)
+        self.glyphs[glyph.name] = dict(
+            glyphName=glyph.name,
+            drawSeconds=_timer() - start,
+            points=len(glyph.coordinates) // 2,
+            contours=len(glyph),
+            components=len(glyph.components),
+            componentDepth=_componentDepth(glyph, glyphSet),
+            bytes=None)
+        return result
+
+    def recordSize(self, glyphName, size):
+        """Record the compiled size in bytes of the glyph."""
+        if glyphName in self.glyphs:
+            self.glyphs[glyphName]["bytes"] = size
+
+    def outliers(self, field="drawSeconds", count=10):
+        """Return the records of the *count* glyphs with the highest *field*."""
+        records = [record for record in self.glyphs.values()
+                   if record[field] is not None]
+        records.sort(key=lambda record: (-record[field], record["glyphName"]))
+        return records[:count]
+
+    def nearLimits(self):
+        """
+        Return ``(glyph name, field, value, limit)`` tuples for the glyphs
+        whose recorded values are above *nearLimit* of a format limit.
+        """
+        limits = _limits.get(self.outlineFormat, {})
+        flagged = []
+        for glyphName, record in sorted(self.glyphs.items()):
+            for field, limit in sorted(limits.items()):
+                value = record[field]
+                if value is not None and value >= limit * self.nearLimit:
+                    flagged.append((glyphName, field, value, limit))
+        return flagged
+
+    def _records(self):
+        return [self.glyphs[glyphName] for glyphName in sorted(self.glyphs)]
+
+    def toJSON(self):
+        """Return the report as a JSON string."""
+        return json.dumps(dict(
+            outlineFormat=self.outlineFormat,
+            glyphs=self._records(),
+            nearLimits=[dict(glyphName=glyphName, field=field, value=value,
+                             limit=limit)
+                        for glyphName, field, value, limit in self.nearLimits()],
+        ), indent=2, sort_keys=True)
+
+    def writeJSON(self, path):
+        """Write the report to the JSON file at *path*."""
+        with io.open(path, "w", encoding="utf-8") as f:
+            f.write(tounicode(self.toJSON()))
+
+    def writeCSV(self, path):
+        """Write one row per glyph to the CSV file at *path*."""
+        if sys.version_info[0] >= 3:
+            f = open(path, "w", newline="")
+        else:
+            f = open(path, "wb")
+        with f:
+            writer = csv.DictWriter(f, fieldnames=_fields)
+            writer.writeheader()
+            for record in self._records():
+                writer.writerow(record)
+
+    def report(self, count=10):
+        """Return a human readable summary of the costliest glyphs."""
+        lines = ["%-30s %10s %8s %8s %6s %8s" % (
+            "glyph", "draw", "points", "contours", "depth", "bytes")]
+        for record in self.outliers(count=count):
+            lines.append("%-30s %9.2fms %8d %8d %6d %8s" % (
+                record["glyphName"], record["drawSeconds"] * 1000,
+                record["points"], record["contours"], record["componentDepth"],
+                "-" if record["bytes"] is None else record["bytes"]))
+        for glyphName, field, value, limit in self.nearLimits():
+            lines.append("near limit: %s has %d %s (limit %d)" % (
+                glyphName, value, field, limit))
+        return "\n".join(lines)
+
+
+class NullGlyphCostReport(object):
+    """Report used when cost reporting is off. Records nothing."""
+
+    enabled = False
+    outlineFormat = None
+
+    def measure(self, glyph, glyphSet, function, *args):
+        return function(*args)
+
+    def recordSize(self, glyphName, size):
+        pass
+
+
+def _componentDepth(glyph, glyphSet, seen=()):
+    depth = 0
+    seen = seen + (glyph.name,)
+    for component in glyph.components:
+        baseGlyph = glyphSet.get(component.baseGlyph)
+        if baseGlyph is None or component.baseGlyph in seen:
+            continue
+        depth = max(depth, 1 + _componentDepth(baseGlyph, glyphSet, seen))
+    return depth
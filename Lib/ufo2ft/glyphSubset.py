@@ -0,0 +1,191 @@
+"""
+Support for compiling only a subset of a UFO's glyphs, for proofing and
+web previews.
+
+:func:`computeGlyphClosure` extends a set of requested glyphs with the
+glyphs reachable from them: component base glyphs, and the outputs of
+GSUB rules in the font's features whose inputs are all reachable.
+:class:`SubsetFont` then wraps the UFO so that the compilers only load and
+draw the glyphs in the closure. Every other glyph is replaced by an empty,
+unencoded placeholder, so the glyph order (and the glyph IDs) stay the
+same and feature code referring to any glyph still compiles. Kerning and
+groups are filtered to the closure, so the generated kern and mark
+features only contain rules whose glyphs are all in the subset.
+
+Only the work on glyph outlines is proportional to the subset: the glyph
+order, the per-glyph table entries and the compile of the font's own
+feature code still scale with the whole font. Dropping the other glyphs
+would mean rewriting hand-written features which refer to them.
+"""
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import os
+
+from feaTools import parser
+from feaTools.writers.baseWriter import AbstractFeatureWriter
+
+from ufo2ft.fontObjects import Glyph
+
+_requiredGlyphs = (".notdef", "space")
+
+
+class _SubstitutionCollector(AbstractFeatureWriter):
+    """
+    Collects the glyph classes and the substitution rules of feature
+    syntax, following include statements relative to *includeDir*.
+
+    Every rule is stored as ``(inputs, outputs)``, where *inputs* is a list
+    holding a set of glyph names for each input position and *outputs* a
+    set of glyph names. Context glyphs are ignored, which makes the
+    closure larger than necessary but never too small.
+    """
+
+    def __init__(self, includeDir=None):
+        self.includeDir = includeDir
+        self.classes = {}
+        self.rules = []
+
+    def feature(self, name):
+        return self
+
+    def lookup(self, name):
+        return self
+
+    def include(self, path):
+        if self.includeDir is not None and not os.path.isabs(path):
+            path = os.path.join(self.includeDir, path)
+        with open(os.path.normpath(path)) as f:
+            parser.parseFeatures(self, f.read())
+
+    def classDefinition(self, name, contents):
+        self.classes[name] = self._expand(contents)
+
+    def gsubType1(self, target, replacement):
+        self.rules.append(([self._expand(target)], self._expand(replacement)))
+
+    gsubType2 = gsubType1
+    gsubType3 = gsubType1
+
+    def gsubType4(self, target, replacement):
+        inputs = [self._expand(item) for item in target]
+        self.rules.append((inputs, self._expand(replacement)))
+
+    def gsubType6(self, precedingContext, target, trailingContext, replacement):
+        if replacement is None:
+            return
+        inputs = [self._expand(item) for item in target]
+        self.rules.append((inputs, self._expand(replacement)))
+
+    def _expand(self, item):
+        """Return the set of glyph names of a glyph, class or list."""
+        if item is None:
+            return set()
+        if isinstance(item, (list, tuple, set)):
+            glyphs = set()
+            for subItem in item:
+                glyphs.update(self._expand(subItem))
+            return glyphs
+        if item.startswith("@"):
+            return set(self.classes.get(item, ()))
+        return set([item])
+
+
+def computeGlyphClosure(font, glyphNames):
+    """
+    Return the set of glyph names needed to render *glyphNames* with
+    *font*: the glyphs themselves, .notdef and space, all component base
+    glyphs and all glyphs produced by reachable GSUB rules.
+    """
+    closure = set(name for name in glyphNames if name in font)
+    closure.update(name for name in _requiredGlyphs if name in font)
+
+    collector = _SubstitutionCollector(font.path)
+    features = font.features.text or ""
+    if features.strip():
+        parser.parseFeatures(collector, features)
+    rules = collector.rules
+
+    pending = list(closure)
+    while pending:
+        # components
+        while pending:
+            glyph = font[pending.pop()]
+            for component in glyph.components:
+                baseGlyph = component.baseGlyph
+                if baseGlyph not in closure and baseGlyph in font:
+                    closure.add(baseGlyph)
+                    pending.append(baseGlyph)
+        # substitutions
+        remaining = []
+        for inputs, outputs in rules:
+            if all(position & closure for position in inputs):
+                for name in outputs - closure:
+                    if name in font:
+                        closure.add(name)
+                        pending.append(name)
+            else:
+                remaining.append((inputs, outputs))
+        rules = remaining
+    return closure
+
+
+class SubsetFont(object):
+    """
+    Wraps *font* so that only the glyphs in *glyphNames* are loaded from
+    it; all its other glyphs are empty placeholders. Kerning and groups
+    are filtered to the subset. Info, features, lib and path are the
+    wrapped font's.
+    """
+
+    def __init__(self, font, glyphNames):
+        self.font = font
+        self.glyphNames = set(name for name in glyphNames if name in font)
+        self._keys = list(font.keys())
+        self._placeholders = {}
+        self.info = font.info
+        self.features = font.features
+        self.path = getattr(font, "path", None)
+        self.lib = getattr(font, "lib", {})
+        self.groups = self._filterGroups(font.groups)
+        self.kerning = self._filterKerning(font.kerning)
+
+    def _filterGroups(self, groups):
+        filtered = {}
+        for name, members in groups.items():
+            members = [member for member in members if member in self.glyphNames]
+            if members:
+                filtered[name] = members
+        return filtered
+
+    def _filterKerning(self, kerning):
+        filtered = {}
+        for (left, right), value in kerning.items():
+            if ((left in self.glyphNames or left in self.groups) and
+                    (right in self.glyphNames or right in self.groups)):
+                filtered[left, right] = value
+        return filtered
+
+    def keys(self):
+        return list(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, name):
+        return name in self.font
+
+    def __iter__(self):
+        for name in self._keys:
+            yield self[name]
+
+    def __getitem__(self, name):
+        if name in self.glyphNames:
+            return self.font[name]
+        if name not in self.font:
+            raise KeyError(name)
+        glyph = self._placeholders.get(name)
+        if glyph is None:
+            # an empty, unencoded glyph
+            glyph = self._placeholders[name] = Glyph(name)
+        return glyph
@@ -0,0 +1,255 @@
+"""
+Patch a previously compiled font after small edits to its UFO.
+
+:func:`recompileFont` takes a TTFont made by ``compileOTF``/``compileTTF``
+and the names of what changed in the UFO since, and rebuilds only the
+affected parts of the font:
+
+- changed glyphs, and the composites using them, get new CFF charstrings
+  or glyf records and hmtx rows, and the hhea, OS/2 and head aggregates
+  are updated;
+- cmap (and the OS/2 character indexes and range bits) are rebuilt only
+  when the font's unicode mapping changed;
+- GSUB/GPOS/GDEF are regenerated only when kerning, anchors or the
+  feature source changed;
+- changed info fields rebuild the tables that are derived from info,
+  keeping the OS/2 fields set from the layout tables, and the layout
+  tables too if the features (or the files they include) override
+  values of other tables.
+
+If glyphs were added, removed or reordered, the glyph order no longer
+matches and the whole font is compiled again instead.
+"""
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import os
+import re
+
+from fontTools.ttLib import TTFont
+
+from ufo2ft.kernFeatureWriter import KernFeatureWriter
+from ufo2ft.makeotfParts import FeatureOTFCompiler, includedFeatureFiles
+from ufo2ft.markFeatureWriter import MarkFeatureWriter
+from ufo2ft.outlineOTF import MaxpProfile, OutlineOTFCompiler, OutlineTTFCompiler
+
+
+# info attributes which end up in the CFF top or private dicts
+_cffInfoAttributes = set([
+    "familyName", "styleName", "versionMajor", "versionMinor",
+    "copyright", "trademark", "italicAngle", "unitsPerEm",
+    "openTypeNamePreferredFamilyName", "openTypeNamePreferredSubfamilyName"])
+
+_layoutTables = ("GDEF", "GSUB", "GPOS")
+
+# OS/2 fields set from the layout tables, not from info
+_layoutOS2Attributes = ("usMaxContext",)
+
+# feature syntax setting values of tables that are built from info
+_tableOverrideRE = re.compile(
+    r"\btable\s+(?!GDEF\b|BASE\b)\S+|\bfeatureNames\b|\bsizemenuname\b|"
+    r"\bcvParameters\b")
+
+
+def recompileFont(otf, font, glyphs=(), kerning=(), anchors=(), info=(),
+                  features=False, glyphOrder=None, outlineCompilerClass=None,
+                  featureCompilerClass=FeatureOTFCompiler, mtiFeaFiles=None,
+                  kernWriter=KernFeatureWriter, markWriter=MarkFeatureWriter):
+    """
+    Update *otf*, compiled earlier from *font*, in place and return it.
+
+    *glyphs* are the names of glyphs whose outlines, width or unicodes
+    changed, *kerning* the changed kerning pairs, *anchors* the names of
+    glyphs whose anchors changed and *info* the names of changed info
+    attributes. *features* should be True if the feature source (or any
+    file it includes) changed. The compiler classes and feature options must be the
+    ones the font was originally compiled with; by default the outline
+    compiler is picked from the font's outline format.
+
+    If the glyph set or glyph order changed, a new font is compiled from
+    scratch and returned instead.
+    """
+    isCFF = "CFF " in otf
+    if outlineCompilerClass is None:
+        outlineCompilerClass = OutlineOTFCompiler if isCFF else OutlineTTFCompiler
+    if glyphOrder is None:
+        glyphOrder = otf.getGlyphOrder()
+
+    compiler = outlineCompilerClass(font, glyphOrder=glyphOrder)
+    if (compiler.glyphOrder != otf.getGlyphOrder() or
+            set(compiler.glyphOrder) != set(compiler.allGlyphs)):
+        return _compileFromScratch(
+            compiler, font, featureCompilerClass, mtiFeaFiles, kernWriter,
+            markWriter)
+    compiler.precompile()
+    compiler.otf = otf
+    # the same bounds a compile without the outline tables uses
+    compiler.buildOutlines = False
+    compiler.setupGlyphBounds()
+
+    # composites are rebuilt with their components: CFF charstrings are
+    # flattened, and the bounds of glyf composites change with them
+    changedGlyphs = _withComposites(compiler.allGlyphs, glyphs)
+    glyphs = [name for name in compiler.glyphOrder if name in changedGlyphs]
+    info = set(info)
+
+    if glyphs:
+        if isCFF:
+            _updateCharStrings(compiler, otf, glyphs)
+        else:
+            _updateGlyf(compiler, otf, glyphs)
+        hmtx = otf["hmtx"]
+        for glyphName in glyphs:
+            hmtx[glyphName] = compiler.getHorizontalMetricsForGlyph(
+                compiler.allGlyphs[glyphName])
+        _updateAggregates(compiler, otf)
+        # the aggregates above come from the UFO, let saving recalculate
+        # the bounds of the compiled outlines
+        otf.recalcBBoxes = True
+
+    if compiler.unicodeToGlyphNameMapping != _getUnicodeMapping(otf):
+        compiler.setupTable_cmap()
+        if not info:
+            _copyAttributes(compiler, "OS/2", compiler.setupTable_OS2, otf,
+                            ("fsFirstCharIndex", "fsLastCharIndex") +
+                            _os2RangeAttributes)
+
+    rebuildLayout = bool(kerning) or bool(anchors) or features
+    if info:
+        layoutOS2 = dict(
+            (attr, getattr(otf["OS/2"], attr))
+            for attr in _layoutOS2Attributes if hasattr(otf["OS/2"], attr))
+        compiler.setupTable_head()
+        compiler.setupTable_hhea()
+        compiler.setupTable_name()
+        compiler.setupTable_OS2()
+        for attr, value in layoutOS2.items():
+            setattr(otf["OS/2"], attr, value)
+        compiler.setupTable_post()
+        if isCFF:
+            if info & _cffInfoAttributes or any(
+                    attr.startswith("postscript") for attr in info):
+                compiler.setupTable_CFF()
+        # feature files may override fields of the info derived tables
+        if _overridesTables(font):
+            rebuildLayout = True
+
+    if rebuildLayout:
+        for tag in _layoutTables:
+            if tag in otf:
+                del otf[tag]
+        featureCompiler = featureCompilerClass(
+            font, otf, kernWriter, markWriter, mtiFeaFiles=mtiFeaFiles)
+        featureCompiler.compile()
+
+    return otf
+
+
+_os2RangeAttributes = (
+    "ulUnicodeRange1", "ulUnicodeRange2", "ulUnicodeRange3",
+    "ulUnicodeRange4", "ulCodePageRange1", "ulCodePageRange2")
+
+
+def _compileFromScratch(compiler, font, featureCompilerClass, mtiFeaFiles,
+                        kernWriter, markWriter):
+    outline = compiler.compile()
+    featureCompiler = featureCompilerClass(
+        font, outline, kernWriter, markWriter, mtiFeaFiles=mtiFeaFiles)
+    featureCompiler.compile()
+    return outline
+
+
+def _overridesTables(font):
+    """
+    Return whether the features of *font*, or any file they include, set
+    values of tables other than the layout tables.
+    """
+    text = font.features.text or ""
+    texts = [text]
+    for path in includedFeatureFiles(text, getattr(font, "path", None)):
+        if os.path.isfile(path):
+            with open(path, "rb") as f:
+                texts.append(f.read().decode("utf-8"))
+    return any(_tableOverrideRE.search(re.sub(r"#[^\n]*", "", text))
+               for text in texts)
+
+
+def _withComposites(glyphSet, glyphNames):
+    """
+    Return the set of *glyphNames* and of the glyphs of *glyphSet* which
+    use any of them through components, at any depth.
+    """
+    users = {}
+    for glyphName, glyph in glyphSet.items():
+        for component in glyph.components:
+            users.setdefault(component.baseGlyph, set()).add(glyphName)
+    result = set(glyphNames)
+    pending = list(result)
+    while pending:
+        for glyphName in users.get(pending.pop(), ()):
+            if glyphName not in result:
+                result.add(glyphName)
+                pending.append(glyphName)
+    return result
+
+
+def _updateCharStrings(compiler, otf, glyphNames):
+    cff = otf["CFF "].cff
+    topDict = cff.topDictIndex[0]
+    charStrings = topDict.CharStrings
+    for glyphName in glyphNames:
+        charString = compiler.getCharStringForGlyph(
+            compiler.allGlyphs[glyphName], topDict.Private, cff.GlobalSubrs)
+        glyphID = charStrings.charStrings[glyphName]
+        charStrings.charStringsIndex.items[glyphID] = charString
+    topDict.FontBBox = compiler.fontBoundingBox
+
+
+def _updateGlyf(compiler, otf, glyphNames):
+    glyf = otf["glyf"]
+    for glyphName in glyphNames:
+        glyf[glyphName] = compiler.getTTGlyphForGlyph(
+            compiler.allGlyphs[glyphName])
+    compiler.maxpProfile = profile = MaxpProfile()
+    for glyphName in compiler.glyphOrder:
+        profile.addGlyph(glyphName, glyf[glyphName])
+    compiler.setupTable_maxp()
+
+
+def _updateAggregates(compiler, otf):
+    """
+    Recompute the hhea, OS/2 and head fields which summarize all glyphs,
+    leaving the rest of those tables (which may have been modified by
+    the features) as they are.
+    """
+    _copyAttributes(compiler, "hhea", compiler.setupTable_hhea, otf,
+                    ("advanceWidthMax", "minLeftSideBearing",
+                     "minRightSideBearing", "xMaxExtent"))
+    _copyAttributes(compiler, "OS/2", compiler.setupTable_OS2, otf,
+                    ("xAvgCharWidth",))
+    head = otf["head"]
+    head.xMin, head.yMin, head.xMax, head.yMax = compiler.fontBoundingBox
+
+
+def _copyAttributes(compiler, tag, setupTable, otf, attributes):
+    """
+    Build the table *tag* with *setupTable* into a scratch font and copy
+    *attributes* from it to the table in *otf*.
+    """
+    compiler.otf = TTFont()
+    try:
+        setupTable()
+        scratch = compiler.otf[tag]
+    finally:
+        compiler.otf = otf
+    table = otf[tag]
+    for attr in attributes:
+        setattr(table, attr, getattr(scratch, attr))
+
+
+def _getUnicodeMapping(otf):
+    mapping = {}
+    for table in otf["cmap"].tables:
+        if table.platformID == 3:
+            mapping.update(table.cmap)
+    return mapping
@@ -0,0 +1,333 @@
+"""
+Batch interpolation of static instances from compatible masters.
+
+All interpolatable values of a master (glyph widths, outline points,
+component transformations, anchors, kerning values and numeric info
+fields) are flattened into one vector. A kerning pair missing from a
+master takes that master's group kerning for it, as in fontMath. With the master vectors stacked
+into a matrix, the deltas of the variation model and the instances follow
+from two matrix products, computed with NumPy for all instances at once:
+
+    deltas = model.getDeltas(masterMatrix)
+    instanceMatrix = scalarMatrix.dot(deltas)
+
+Each row of the result is then unflattened into a lightweight
+:class:`~ufo2ft.fontObjects.Font` which goes straight into the compilers.
+Groups, features, glyph names and unicodes, and non-numeric info come
+from the default master.
+
+NumPy and fontTools.varLib are required.
+"""
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import numpy as np
+from fontTools.varLib.models import VariationModel, normalizeLocation
+
+from ufo2ft import compileOTF, compileTTF
+from ufo2ft.curveConversion import recordGlyph
+from ufo2ft.featureParseCache import FeatureParseCache
+from ufo2ft.fontObjects import Anchor, Font, Glyph
+
+_interpolatedInfoAttributes = (
+    "unitsPerEm", "ascender", "descender", "xHeight", "capHeight",
+    "italicAngle",
+    "openTypeHheaAscender", "openTypeHheaDescender", "openTypeHheaLineGap",
+    "openTypeHheaCaretSlopeRise", "openTypeHheaCaretSlopeRun",
+    "openTypeHheaCaretOffset",
+    "openTypeOS2WeightClass",
+    "openTypeOS2TypoAscender", "openTypeOS2TypoDescender",
+    "openTypeOS2TypoLineGap", "openTypeOS2WinAscent", "openTypeOS2WinDescent",
+    "openTypeOS2SubscriptXSize", "openTypeOS2SubscriptYSize",
+    "openTypeOS2SubscriptXOffset", "openTypeOS2SubscriptYOffset",
+    "openTypeOS2SuperscriptXSize", "openTypeOS2SuperscriptYSize",
+    "openTypeOS2SuperscriptXOffset", "openTypeOS2SuperscriptYOffset",
+    "openTypeOS2StrikeoutSize", "openTypeOS2StrikeoutPosition",
+    "postscriptUnderlinePosition", "postscriptUnderlineThickness",
+    "postscriptBlueValues", "postscriptOtherBlues", "postscriptFamilyBlues",
+    "postscriptFamilyOtherBlues", "postscriptStemSnapH", "postscriptStemSnapV",
+    "postscriptBlueFuzz", "postscriptBlueShift", "postscriptBlueScale",
+    "postscriptSlantAngle", "postscriptDefaultWidthX",
+    "postscriptNominalWidthX")
+
+# info fields stored in integer table fields without rounding
+_integerInfoAttributes = set([
+    "unitsPerEm", "openTypeOS2WeightClass",
+    "openTypeHheaCaretSlopeRise", "openTypeHheaCaretSlopeRun"])
+
+_copiedInfoAttributes = (
+    "familyName", "styleName", "styleMapFamilyName", "styleMapStyleName",
+    "versionMajor", "versionMinor", "copyright", "trademark", "note",
+    "openTypeHeadCreated", "openTypeHeadLowestRecPPEM", "openTypeHeadFlags",
+    "openTypeNameDesigner", "openTypeNameDesignerURL",
+    "openTypeNameManufacturer", "openTypeNameManufacturerURL",
+    "openTypeNameLicense", "openTypeNameLicenseURL", "openTypeNameVersion",
+    "openTypeNameUniqueID", "openTypeNameDescription",
+    "openTypeNamePreferredFamilyName", "openTypeNamePreferredSubfamilyName",
+    "openTypeNameCompatibleFullName", "openTypeNameSampleText",
+    "openTypeNameWWSFamilyName", "openTypeNameWWSSubfamilyName",
+    "openTypeOS2WidthClass", "openTypeOS2Selection", "openTypeOS2VendorID",
+    "openTypeOS2Panose", "openTypeOS2FamilyClass", "openTypeOS2UnicodeRanges",
+    "openTypeOS2CodePageRanges", "openTypeOS2Type",
+    "postscriptFontName", "postscriptFullName", "postscriptWeightName",
+    "postscriptIsFixedPitch", "postscriptForceBold",
+    "postscriptUniqueID", "postscriptWindowsCharacterSet",
+    "macintoshFONDFamilyID", "macintoshFONDName")
+
+
+class _Layout(object):
+    """
+    Where each value sits in the flattened master vectors, and what is
+    needed to rebuild a font from such a vector.
+    """
+
+    def __init__(self, masters, default):
+        self.default = default
+        self.infoAttributes = []
+        for attr in _interpolatedInfoAttributes:
+            values = [getattr(master.info, attr, None) for master in masters]
+            if any(value is None for value in values):
+                continue
+            if isinstance(values[0], (list, tuple)):
+                if len(set(len(value) for value in values)) != 1:
+                    continue
+            self.infoAttributes.append(attr)
+
+        self.glyphs = []
+        self.recordings = [{} for _ in masters]
+        incompatible = []
+        missing = []
+        for glyphName in default.keys():
+            if not all(glyphName in master for master in masters):
+                # kerning, groups and features may refer to it
+                missing.append(glyphName)
+                continue
+            signatures = set()
+            for i, master in enumerate(masters):
+                glyph = master[glyphName]
+                operations = recordGlyph(glyph)
+                self.recordings[i][glyphName] = operations
+                signatures.add((
+                    tuple(_operationSignature(op) for op in operations),
+                    tuple(anchor.name for anchor in glyph.anchors)))
+            if len(signatures) != 1:
+                incompatible.append(glyphName)
+                continue
+            self.glyphs.append(glyphName)
+        if missing:
+            raise ValueError("glyphs missing from some masters: %s"
+                             % " ".join(missing))
+        if incompatible:
+            raise ValueError("incompatible glyphs in masters: %s"
+                             % " ".join(incompatible))
+
+        pairs = set()
+        for master in masters:
+            pairs.update(master.kerning.keys())
+        self.kerningPairs = sorted(pairs)
+
+    def flatten(self, master, index):
+        """Return the values of *master* as a list of floats."""
+        values = []
+        for attr in self.infoAttributes:
+            value = getattr(master.info, attr)
+            if isinstance(value, (list, tuple)):
+                values.extend(value)
+            else:
+                values.append(value)
+        recordings = self.recordings[index]
+        for glyphName in self.glyphs:
+            glyph = master[glyphName]
+            values.append(glyph.width)
+            for method, args in recordings[glyphName]:
+                if method == "addComponent":
+                    values.extend(args[1])
+                else:
+                    for pt in args:
+                        # qCurveTo may end with None for all off-curve contours
+                        if pt is not None:
+                            values.extend(pt)
+            for anchor in glyph.anchors:
+                values.append(anchor.x)
+                values.append(anchor.y)
+        kerning = master.kerning
+        groupMaps = _kerningGroupMaps(master.groups)
+        for pair in self.kerningPairs:
+            values.append(_kerningValue(kerning, groupMaps, pair))
+        return values
+
+    def unflatten(self, values):
+        """Rebuild a Font from a vector of interpolated values."""
+        default = self.default
+        values = iter(values)
+        font = Font(path=getattr(default, "path", None))
+
+        for attr in _copiedInfoAttributes:
+            value = getattr(default.info, attr, None)
+            if value is not None:
+                setattr(font.info, attr, value)
+        for attr in self.infoAttributes:
+            defaultValue = getattr(default.info, attr)
+            if isinstance(defaultValue, (list, tuple)):
+                value = [next(values) for _ in defaultValue]
+            else:
+                value = next(values)
+                if attr in _integerInfoAttributes:
+                    value = int(round(value))
+            setattr(font.info, attr, value)
+
+        recordings = self.recordings[0]
+        for glyphName in self.glyphs:
+            defaultGlyph = default[glyphName]
+            width = next(values)
+            operations = []
+            for method, args in recordings[glyphName]:
+                if method == "addComponent":
+                    transformation = tuple(next(values) for _ in range(6))
+                    operations.append((method, (args[0], transformation)))
+                else:
+                    points = tuple(
+                        None if pt is None else (next(values), next(values))
+                        for pt in args)
+                    operations.append((method, points))
+            anchors = [Anchor(anchor.name, int(round(next(values))),
+                              int(round(next(values))))
+                       for anchor in defaultGlyph.anchors]
+            font.addGlyph(Glyph(glyphName, width=width,
+                                unicodes=defaultGlyph.unicodes,
+                                operations=operations, anchors=anchors))
+
+        for pair in self.kerningPairs:
+            value = int(round(next(values)))
+            if value:
+                font.kerning[pair] = value
+        font.groups = dict((name, list(members))
+                           for name, members in default.groups.items())
+        font.features.text = default.features.text
+        lib = getattr(default, "lib", None)
+        if lib is not None and "public.glyphOrder" in lib:
+            font.lib["public.glyphOrder"] = list(lib["public.glyphOrder"])
+        return font
+
+
+def _kerningGroupMaps(groups):
+    """Map the glyphs of the kerning groups to their group, for each side."""
+    groupMaps = ({}, {})
+    for name, members in sorted(groups.items()):
+        for side, prefix in enumerate(("public.kern1.", "public.kern2.")):
+            if name.startswith(prefix):
+                for glyphName in members:
+                    groupMaps[side].setdefault(glyphName, name)
+    return groupMaps
+
+
+def _kerningValue(kerning, groupMaps, pair):
+    """
+    Return the kerning of *pair* in a master: its own value, or the value
+    of the group rule covering it, like fontMath looks it up. A missing
+    pair falls back to its group rules before zero.
+    """
+    if pair in kerning:
+        return kerning[pair]
+    sides = []
+    for side, (name, prefix) in enumerate(
+            zip(pair, ("public.kern1.", "public.kern2."))):
+        if name.startswith(prefix):
+            sides.append((None, name))
+        else:
+            sides.append((name, groupMaps[side].get(name)))
+    (first, firstGroup), (second, secondGroup) = sides
+    for fallback in ((firstGroup, second), (first, secondGroup),
+                     (firstGroup, secondGroup)):
+        if None not in fallback and fallback in kerning:
+            return kerning[fallback]
+    return 0
+
+
+def _operationSignature(operation):
+    method, args = operation
+    if method == "addComponent":
+        return method, args[0]
+    return method, len(args)
+
+
+def _defaultAxes(masterLocations):
+    """Axes spanning the master locations, the first master being the default."""
+    axes = {}
+    for axis in masterLocations[0]:
+        values = [location.get(axis, masterLocations[0][axis])
+                  for location in masterLocations]
+        axes[axis] = (min(values), masterLocations[0][axis], max(values))
+    return axes
+
+
+def interpolateInstances(masters, masterLocations, instanceLocations,
+                         axes=None, instanceInfos=None):
+    """
+    Interpolate instances from compatible *masters* and return them as
+    fontObjects.Font objects.
+
+    *masterLocations* and *instanceLocations* are lists of design space
+    locations, ``axis name : value`` dicts. *axes* maps axis names to
+    ``(minimum, default, maximum)`` tuples; by default the axes span the
+    masters and the first master is at the default location.
+    *instanceInfos* is an optional list with a dict of info attributes
+    (names, usually) to set on each instance. Raises ValueError if a glyph
+    of the default master is missing from another master or isn't
+    compatible with it.
+    """
+    if axes is None:
+        axes = _defaultAxes(masterLocations)
+    normalizedMasters = [normalizeLocation(location, axes)
+                         for location in masterLocations]
+    normalizedInstances = [normalizeLocation(location, axes)
+                           for location in instanceLocations]
+    defaultIndex = None
+    for i, location in enumerate(normalizedMasters):
+        if not any(location.values()):
+            defaultIndex = i
+            break
+    if defaultIndex is None:
+        raise ValueError("no master at the default location")
+    # keep the default master first, it provides the non-interpolated data
+    order = [defaultIndex] + [i for i in range(len(masters)) if i != defaultIndex]
+    masters = [masters[i] for i in order]
+    normalizedMasters = [normalizedMasters[i] for i in order]
+
+    model = VariationModel(normalizedMasters)
+    layout = _Layout(masters, masters[0])
+    masterMatrix = np.array(
+        [layout.flatten(master, i) for i, master in enumerate(masters)],
+        dtype=float)
+    deltas = np.array(model.getDeltas([row.copy() for row in masterMatrix]))
+    scalarMatrix = np.array(
+        [model.getScalars(location) for location in normalizedInstances],
+        dtype=float)
+    instanceMatrix = scalarMatrix.dot(deltas)
+
+    instances = []
+    for i, row in enumerate(instanceMatrix):
+        font = layout.unflatten(row.tolist())
+        if instanceInfos is not None:
+            for attr, value in instanceInfos[i].items():
+                setattr(font.info, attr, value)
+        instances.append(font)
+    return instances
+
+
+def compileInstances(masters, masterLocations, instanceLocations,
+                     fontFormat="otf", axes=None, instanceInfos=None,
+                     **compileOptions):
+    """
+    Interpolate instances (see :func:`interpolateInstances`) and compile
+    each of them with compileOTF or compileTTF (by *fontFormat*), passing
+    *compileOptions* on. Returns the list of TTFonts. The instances share
+    their features, which are parsed once for all of them unless another
+    *featureCache* is passed.
+    """
+    compileFunction = dict(otf=compileOTF, ttf=compileTTF)[fontFormat]
+    compileOptions.setdefault("featureCache", FeatureParseCache())
+    instances = interpolateInstances(
+        masters, masterLocations, instanceLocations, axes=axes,
+        instanceInfos=instanceInfos)
+    return [compileFunction(font, **compileOptions) for font in instances]
@@ -5,6 +5,8 @@ import re
 from feaTools import parser
 from feaTools.writers.baseWriter import AbstractFeatureWriter
 
+from ufo2ft.memoryAccounting import NullMemoryAccountant
+
 
 def _getGlyphKern(kerning, glyphName, index):
     hits = []
@@ -23,15 +25,33 @@ class KernFeatureWriter(AbstractFeatureWriter):
 
     Uses class attributes to match UFO glyph group names and feature syntax
     glyph class names as kerning classes, which can be overridden.
+
+    Rules kerning the same glyph pair are resolved according to the
+    conflictStrategy class attribute. With "subtables" (the default),
+    the classes are kept intact and the more specific rules take
+    precedence by coming first: glyph pairs, then enumerated class rules,
+    then class pair rules. Synthetic classes are only made for classes
+    which share glyphs with other classes used in class pair rules. With "inline",
+    conflicting glyphs are removed from the class rules, replacing the
+    class names with lists of the remaining glyphs.
+
+    If the pruneKerning class attribute is True, rules which don't change
+    the kerning of any glyph pair, as the lookup written by the
+    "subtables" strategy applies it, are removed before writing. The
+    removed rules are kept in the prunedKerning attribute.
     """
 
     leftUfoGroupRe = r"^public\.kern1\.(.+)"
     rightUfoGroupRe = r"^public\.kern2\.(.+)"
     leftFeaClassRe = r"@MMK_L_(.+)"
     rightFeaClassRe = r"@MMK_R_(.+)"
+    conflictStrategy = "subtables"
+    pruneKerning = False
 
-    def __init__(self, font):
-        self.kerning = font.kerning
+    def __init__(self, font, memoryAccountant=None):
+        # work on a copy, so that writing the feature leaves the font's
+        # kerning untouched and the same font can be compiled again
+        self.kerning = dict(font.kerning.items())
         self.groups = font.groups
         self.featxt = font.features.text or ""
 
@@ -47,6 +67,16 @@ class KernFeatureWriter(AbstractFeatureWriter):
         self.rightClassKerning = {}
         self.classPairKerning = {}
 
+        # the classes made for the parts of overlapping classes
+        self.syntheticClasses = {}
+
+        # rules removed by pruning, mapping pairs to values
+        self.prunedKerning = {}
+
+        if memoryAccountant is None:
+            memoryAccountant = NullMemoryAccountant()
+        self.memoryAccountant = memoryAccountant
+
     def classDefinition(self, name, contents):
         """Store a class definition as either a left- or right-hand class."""
 
@@ -65,7 +95,17 @@ class KernFeatureWriter(AbstractFeatureWriter):
         self._correctUfoClassNames()
 
         self._collectUfoKerning()
-        self._removeConflictingKerningRules()
+        if self.pruneKerning:
+            with self.memoryAccountant.stage("kern pruning"):
+                self._pruneKerningRules()
+        with self.memoryAccountant.stage("kern conflict resolution"):
+            if self.conflictStrategy == "inline":
+                self._removeConflictingKerningRules()
+            elif self.conflictStrategy == "subtables":
+                self._orderConflictingKerningRules()
+            else:
+                raise ValueError(
+                    "unknown kern conflict strategy: %s" % self.conflictStrategy)
 
         if not any([self.glyphPairKerning, self.leftClassKerning,
                     self.rightClassKerning, self.classPairKerning]):
@@ -80,15 +120,9 @@ class KernFeatureWriter(AbstractFeatureWriter):
         # write the feature
         lines.append("feature kern {")
         self._addKerning(lines, self.glyphPairKerning)
-        if self.leftClassKerning:
-            lines.append("    subtable;")
-            self._addKerning(lines, self.leftClassKerning, enum=True)
-        if self.rightClassKerning:
-            lines.append("    subtable;")
-            self._addKerning(lines, self.rightClassKerning, enum=True)
-        if self.classPairKerning:
-            lines.append("    subtable;")
-            self._addKerning(lines, self.classPairKerning)
+        self._addKerning(lines, self.leftClassKerning, enum=True)
+        self._addKerning(lines, self.rightClassKerning, enum=True)
+        self._addKerning(lines, self.classPairKerning)
         lines.append("} kern;")
 
         return linesep.join(lines)
@@ -112,23 +146,23 @@ class KernFeatureWriter(AbstractFeatureWriter):
             for rightName, rightContents in self.rightFeaClasses.items():
                 rightKey = rightContents[0]
                 pair = leftKey, rightKey
-                kerningVal = self.kerning[pair]
+                kerningVal = self.kerning.get(pair)
                 if kerningVal is None:
                     continue
                 self.classPairKerning[leftName, rightName] = kerningVal
-                self.kerning.remove(pair)
+                del self.kerning[pair]
 
             # collect rules with left class and right glyph
             for pair, kerningVal in _getGlyphKern(self.kerning, leftKey, 0):
                 self.leftClassKerning[leftName, pair[1]] = kerningVal
-                self.kerning.remove(pair)
+                del self.kerning[pair]
 
         # collect rules with left glyph and right class
         for rightName, rightContents in self.rightFeaClasses.items():
             rightKey = rightContents[0]
             for pair, kerningVal in _getGlyphKern(self.kerning, rightKey, 1):
                 self.rightClassKerning[pair[0], rightName] = kerningVal
-                self.kerning.remove(pair)
+                del self.kerning[pair]
 
     def _collectUfoClasses(self):
         """Sort UFO groups into left or right glyph classes."""
@@ -142,7 +176,7 @@ class KernFeatureWriter(AbstractFeatureWriter):
     def _correctUfoClassNames(self):
         """Detect and replace OTF-illegal class names found in UFO kerning."""
 
-        for name, members in self.leftUfoClasses.items():
+        for name, members in list(self.leftUfoClasses.items()):
             newName = self._makeFeaClassName(name)
             if name == newName:
                 continue
@@ -150,12 +184,9 @@ class KernFeatureWriter(AbstractFeatureWriter):
             del self.leftUfoClasses[name]
             for pair, kerningVal in _getGlyphKern(self.kerning, name, 0):
                 self.kerning[newName, pair[1]] = kerningVal
-                try:
-                    self.kerning.remove(pair)
-                except AttributeError:
-                    del self.kerning[pair]
+                del self.kerning[pair]
 
-        for name, members in self.rightUfoClasses.items():
+        for name, members in list(self.rightUfoClasses.items()):
             newName = self._makeFeaClassName(name)
             if name == newName:
                 continue
@@ -163,10 +194,7 @@ class KernFeatureWriter(AbstractFeatureWriter):
             del self.rightUfoClasses[name]
             for pair, kerningVal in _getGlyphKern(self.kerning, name, 1):
                 self.kerning[pair[0], newName] = kerningVal
-                try:
-                    self.kerning.remove(pair)
-                except AttributeError:
-                    del self.kerning[pair]
+                del self.kerning[pair]
 
     def _collectUfoKerning(self):
         """Sort UFO kerning rules into glyph pair or class rules.
@@ -253,11 +281,160 @@ class KernFeatureWriter(AbstractFeatureWriter):
                 self.classPairKerning[nlClass, nrClass] = val
                 del self.classPairKerning[lClass, rClass]
 
+    def _pruneKerningRules(self):
+        """Remove rules which don't change the kerning of any glyph pair.
+
+        The kerning of a glyph pair is worked out the way the lookup
+        written by the "subtables" strategy applies it. The specific pair
+        subtable gives the value of the first glyph pair or enumerated rule
+        kerning the pair, in writing order. Otherwise the pair falls
+        through to the class pair subtable, whose first rule covering the
+        pair wins, with class 0 kerning by zero. A rule is redundant if
+        no glyph pair it covers changes without it. Rules are checked from
+        the last one written back to the first, each against the rules
+        left so far, so that each removal keeps the kerning unchanged.
+        """
+
+        if self.conflictStrategy != "subtables":
+            raise ValueError(
+                "kerning pruning requires the subtables conflict strategy")
+
+        leftClasses = self.leftFeaClasses.copy()
+        leftClasses.update(self.leftUfoClasses)
+        rightClasses = self.rightFeaClasses.copy()
+        rightClasses.update(self.rightUfoClasses)
+        leftNames = self._namesCoveringGlyphs(leftClasses)
+        rightNames = self._namesCoveringGlyphs(rightClasses)
+
+        # in writing order, the specific pair rules before the class pairs
+        kinds = [self.glyphPairKerning, self.leftClassKerning,
+                 self.rightClassKerning, self.classPairKerning]
+
+        def kerningValue(lGlyph, rGlyph, skip):
+            for kerning in kinds:
+                rules = sorted(
+                    (left, right)
+                    for left in leftNames.get(lGlyph, [lGlyph])
+                    for right in rightNames.get(rGlyph, [rGlyph])
+                    if (left, right) in kerning and (left, right) != skip)
+                if rules:
+                    return kerning[rules[0]]
+            return 0
+
+        for kerning in reversed(kinds):
+            for rule, val in sorted(kerning.items(), reverse=True):
+                redundant = True
+                for lGlyph in leftClasses.get(rule[0], [rule[0]]):
+                    for rGlyph in rightClasses.get(rule[1], [rule[1]]):
+                        if (kerningValue(lGlyph, rGlyph, rule) !=
+                                kerningValue(lGlyph, rGlyph, None)):
+                            redundant = False
+                            break
+                    if not redundant:
+                        break
+                if redundant:
+                    del kerning[rule]
+                    self.prunedKerning[rule] = val
+
+    def _namesCoveringGlyphs(self, classes):
+        """Map each glyph in the classes to itself and its classes."""
+
+        names = {}
+        for name, glyphs in sorted(classes.items()):
+            for glyph in glyphs:
+                names.setdefault(glyph, [glyph]).append(name)
+        return names
+
+    def _orderConflictingKerningRules(self):
+        """Resolve conflicting rules by their order, keeping the classes.
+
+        feaLib puts all glyph pairs, including the expanded enumerated
+        class rules, into one specific pair subtable ahead of the class
+        pair subtables, so the feature needs no subtable statements.
+        For a glyph pair kerned twice it keeps the first value, so the
+        writing order alone decides: glyph pairs, then left and right
+        enumerated rules, each in sorted order.
+
+        A lookup uses the first pair adjustment subtable which matches a
+        glyph pair. Class pair subtables match any pair whose left glyph
+        they cover, so all class pair rules go to a single subtable, which
+        requires disjoint classes on each side and no subtable break. Classes sharing glyphs are
+        replaced by synthetic classes for their parts, the first rule
+        kerning a pair of parts winning.
+        """
+
+        leftClasses = self.leftFeaClasses.copy()
+        leftClasses.update(self.leftUfoClasses)
+        rightClasses = self.rightFeaClasses.copy()
+        rightClasses.update(self.rightUfoClasses)
+
+        leftParts = self._splitOverlappingClasses(
+            [pair[0] for pair in self.classPairKerning], leftClasses)
+        rightParts = self._splitOverlappingClasses(
+            [pair[1] for pair in self.classPairKerning], rightClasses)
+        classPairKerning = {}
+        for (lClass, rClass), val in sorted(self.classPairKerning.items()):
+            for lPart in leftParts[lClass]:
+                for rPart in rightParts[rClass]:
+                    if (lPart, rPart) not in classPairKerning:
+                        classPairKerning[lPart, rPart] = val
+        self.classPairKerning = classPairKerning
+
+    def _splitOverlappingClasses(self, classNames, classes):
+        """Map each of the given classes to the classes replacing it.
+
+        Classes sharing no glyphs with the others map to themselves. The
+        others are split into parts of glyphs belonging to the same
+        classes, and each part is written as one synthetic class.
+        """
+
+        classNames = sorted(set(classNames))
+        membership = {}
+        glyphOrder = []
+        for name in classNames:
+            for glyph in classes[name]:
+                if glyph not in membership:
+                    membership[glyph] = []
+                    glyphOrder.append(glyph)
+                if name not in membership[glyph]:
+                    membership[glyph].append(name)
+
+        parts = {}
+        for glyph in glyphOrder:
+            parts.setdefault(tuple(membership[glyph]), []).append(glyph)
+        overlapping = set()
+        for names in parts:
+            if len(names) > 1:
+                overlapping.update(names)
+
+        replacements = dict(
+            (name, [] if name in overlapping else [name])
+            for name in classNames)
+        for names, glyphs in sorted(parts.items()):
+            if names[0] not in overlapping:
+                continue
+            partName = self._makeSyntheticClassName(names[0])
+            self.syntheticClasses[partName] = glyphs
+            for name in names:
+                replacements[name].append(partName)
+        return replacements
+
+    def _makeSyntheticClassName(self, className):
+        """Make a unique name for a part of a class."""
+
+        i = 1
+        while True:
+            name = self._makeFeaClassName("%s_part%d" % (className, i))
+            if name not in self.syntheticClasses:
+                return name
+            i += 1
+
     def _addGlyphClasses(self, lines):
         """Add glyph classes for the input font's groups."""
 
         ufoClasses = self.leftUfoClasses.copy()
         ufoClasses.update(self.rightUfoClasses)
+        ufoClasses.update(self.syntheticClasses)
         for key, members in sorted(ufoClasses.items()):
             lines.append("%s = [%s];" % (key, " ".join(members)))
 
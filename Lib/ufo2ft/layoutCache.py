@@ -0,0 +1,202 @@
+"""
+A disk cache of the layout tables compiled by feaLib.
+
+Compiling the features is often the most expensive part of a build, and
+its result only depends on the feature text, the files it includes and
+the glyph order. A :class:`LayoutTableCache` stores the compiled tables
+under a hash of those (and of the fontTools and ufo2ft versions) and
+attaches them to the outline font when the same features are compiled
+again::
+
+    cache = LayoutTableCache("build/layoutCache", maxEntries=100)
+    otf = compileOTF(ufo, layoutCache=cache)
+
+Only tables which the compiled data round-trips through exactly are
+stored, so a cached build gives the same binary as a cold one. Features
+which modify other tables (``table name { ... }``, feature names and the
+like) are always compiled.
+"""
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import hashlib
+import os
+import re
+import struct
+import tempfile
+import time
+
+from fontTools import version as fontToolsVersion
+from fontTools.misc.py23 import tobytes, tostr
+from fontTools.otlLib.maxContextCalc import maxCtxFont
+from fontTools.ttLib import newTable
+
+from ufo2ft import __version__
+from ufo2ft.makeotfParts import includedFeatureFiles
+
+# feature syntax changing tables other than the ones feaLib adds
+_uncacheableRE = re.compile(
+    r"\btable\s+(?!GDEF\b|BASE\b)\S+|\bfeatureNames\b|\bsizemenuname\b|"
+    r"\bcvParameters\b")
+
+_entrySuffix = ".layout"
+
+
+class LayoutTableCache(object):
+    """
+    Cache the compiled layout tables in *directory*, which is created if
+    needed. The least recently used entries are evicted when there are more
+    than *maxEntries* or they take more than *maxBytes*. Entries unused for
+    more than *maxAge* seconds are evicted too. None means no limit.
+    """
+
+    def __init__(self, directory, maxEntries=None, maxBytes=None, maxAge=None):
+        self.directory = directory
+        self.maxEntries = maxEntries
+        self.maxBytes = maxBytes
+        self.maxAge = maxAge
+        self.hits = 0
+        self.misses = 0
+
+    def makeKey(self, features, glyphOrder, directory=None):
+        """
+        Return the cache key for compiling the feature text *features*
+        (with includes resolved against *directory*) for *glyphOrder*, or
+        None if the features can't be cached.
+        """
+        texts = [features]
+        digest = hashlib.sha256()
+        for value in (fontToolsVersion, __version__, features,
+                      "\n".join(glyphOrder)):
+            _updateDigest(digest, tobytes(value, encoding="utf-8"))
+        for path in includedFeatureFiles(features, directory):
+            _updateDigest(digest, tobytes(path, encoding="utf-8"))
+            if not os.path.isfile(path):
+                _updateDigest(digest, b"missing")
+                continue
+            with open(path, "rb") as f:
+                data = f.read()
+            _updateDigest(digest, data)
+            texts.append(data.decode("utf-8"))
+        if any(_uncacheableRE.search(_stripComments(text)) for text in texts):
+            return None
+        return digest.hexdigest()
+
+    def load(self, key, font):
+        """
+        Add the tables cached under *key* to the TTFont *font*, and set
+        the values feaLib derives from them in other tables. Return False
+        if there is no such entry.
+        """
+        path = self._entryPath(key)
+        try:
+            with open(path, "rb") as f:
+                tables = _unpackTables(f.read())
+        except (IOError, OSError, struct.error):
+            self.misses += 1
+            return False
+        for tag, data in tables:
+            table = newTable(tag)
+            table.decompile(data, font)
+            font[tag] = table
+        if "OS/2" in font:
+            # as set by feaLib after building the layout tables
+            font["OS/2"].usMaxContext = maxCtxFont(font)
+        # mark the entry as recently used
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        self.hits += 1
+        return True
+
+    def store(self, key, font, tags):
+        """
+        Store the tables *tags* of the TTFont *font* under *key*. Nothing
+        is stored if a table doesn't compile to the same data again after
+        being loaded from the cache.
+        """
+        tables = []
+        for tag in sorted(tags):
+            data = font[tag].compile(font)
+            table = newTable(tag)
+            table.decompile(data, font)
+            if table.compile(font) != data:
+                return False
+            tables.append((tag, data))
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        fd, tempPath = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, "wb") as f:
+            f.write(_packTables(tables))
+        path = self._entryPath(key)
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(tempPath, path)
+        self.evict()
+        return True
+
+    def evict(self):
+        """Remove entries beyond the cache's limits, least recently used first."""
+        if not os.path.isdir(self.directory):
+            return
+        entries = []
+        for fileName in os.listdir(self.directory):
+            if not fileName.endswith(_entrySuffix):
+                continue
+            path = os.path.join(self.directory, fileName)
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort(reverse=True)
+        now = time.time()
+        kept = 0
+        size = 0
+        for mtime, entrySize, path in entries:
+            kept += 1
+            size += entrySize
+            if ((self.maxEntries is not None and kept > self.maxEntries) or
+                    (self.maxBytes is not None and size > self.maxBytes) or
+                    (self.maxAge is not None and now - mtime > self.maxAge)):
+                os.remove(path)
+
+    def clear(self):
+        """Remove all entries."""
+        if not os.path.isdir(self.directory):
+            return
+        for fileName in os.listdir(self.directory):
+            if fileName.endswith(_entrySuffix):
+                os.remove(os.path.join(self.directory, fileName))
+
+    def _entryPath(self, key):
+        return os.path.join(self.directory, key + _entrySuffix)
+
+
+def _updateDigest(digest, data):
+    digest.update(struct.pack(">I", len(data)) + data)
+
+
+def _stripComments(text):
+    return re.sub(r"#[^\n]*", "", text)
+
+
+def _packTables(tables):
+    chunks = []
+    for tag, data in tables:
+        chunks.append(tobytes(tag, encoding="latin-1").ljust(4))
+        chunks.append(struct.pack(">I", len(data)))
+        chunks.append(data)
+    return b"".join(chunks)
+
+
+def _unpackTables(data):
+    tables = []
+    offset = 0
+    while offset < len(data):
+        tag = tostr(data[offset:offset + 4], encoding="latin-1")
+        length, = struct.unpack(">I", data[offset + 4:offset + 8])
+        offset += 8
+        if offset + length > len(data):
+            raise struct.error("truncated cache entry")
+        tables.append((tag, data[offset:offset + length]))
+        offset += length
+    return tables
@@ -0,0 +1,63 @@
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+from fontTools.ttLib import TTFont, sortedTagList
+
+
+class LazyTTFont(TTFont):
+    """
+    A TTFont whose tables are built when they are first accessed.
+
+    *builders* is a ``tag : function`` dict; calling the function adds the
+    table to the font. Tags sharing a function (like glyf and loca) are
+    built together. Saving the font builds every table which is still
+    missing.
+    """
+
+    def __init__(self, builders, **kwargs):
+        TTFont.__init__(self, **kwargs)
+        self._builders = dict(builders)
+
+    def _buildTable(self, tag):
+        builder = self._builders.get(tag)
+        if builder is None:
+            return
+        for otherTag, otherBuilder in list(self._builders.items()):
+            if otherBuilder == builder:
+                del self._builders[otherTag]
+        builder()
+
+    def buildAll(self):
+        """Build all tables which have not been accessed yet."""
+        while self._builders:
+            self._buildTable(sorted(self._builders)[0])
+
+    def isPending(self, tag):
+        """Return True if the table *tag* is still to be built."""
+        return tag in self._builders
+
+    def __getitem__(self, tag):
+        if tag not in self.tables:
+            self._buildTable(tag)
+        return TTFont.__getitem__(self, tag)
+
+    def __contains__(self, tag):
+        return tag in self._builders or TTFont.__contains__(self, tag)
+
+    has_key = __contains__
+
+    def keys(self):
+        keys = TTFont.keys(self)
+        pending = [tag for tag in self._builders if tag not in keys]
+        if not pending:
+            return keys
+        keys.remove("GlyphOrder")
+        return ["GlyphOrder"] + sortedTagList(keys + pending)
+
+    def getTableData(self, tag):
+        if tag not in self.tables:
+            self._buildTable(tag)
+        return TTFont.getTableData(self, tag)
+
+    def save(self, *args, **kwargs):
+        self.buildAll()
+        return TTFont.save(self, *args, **kwargs)
@@ -7,6 +7,9 @@ import tempfile
 from fontTools.feaLib.builder import addOpenTypeFeatures
 from fontTools import mtiLib
 
+from ufo2ft.memoryAccounting import NullMemoryAccountant
+from ufo2ft.stageScheduler import Stage, runStages
+
 
 class FeatureOTFCompiler(object):
     """Generates OpenType feature tables for a UFO.
@@ -14,14 +17,34 @@ class FeatureOTFCompiler(object):
     If mtiFeaFiles is passed to the constructor, it should be a dictionary
     mapping feature table tags to source files which should be compiled by
     mtiLib into that respective table.
+
+    If memoryAccountant is passed, the feature writers and the table
+    compilation are accounted as separate stages, and the kern writer is
+    given it as its memoryAccountant argument.
+
+    If layoutCache (a ufo2ft.layoutCache.LayoutTableCache) is passed, the
+    tables compiled by feaLib are taken from it when the same features
+    were compiled before for the same glyph order.
+
+    If featureCache (a ufo2ft.featureParseCache.FeatureParseCache) is
+    passed, the font's feature text is parsed once for all compiles sharing
+    the cache, and only the generated kern, mark and mkmk features are
+    parsed for each font.
     """
 
-    def __init__(self, font, outline, kernWriter, markWriter, mtiFeaFiles=None):
+    def __init__(self, font, outline, kernWriter, markWriter, mtiFeaFiles=None,
+                 memoryAccountant=None, layoutCache=None, featureCache=None):
         self.font = font
         self.outline = outline
         self.kernWriter = kernWriter
         self.markWriter = markWriter
         self.mtiFeaFiles = mtiFeaFiles
+        if memoryAccountant is None:
+            memoryAccountant = NullMemoryAccountant()
+        self.memoryAccountant = memoryAccountant
+        self.layoutCache = layoutCache
+        self.featureCache = featureCache
+        self.featureParts = None
         self.setupAnchorPairs()
         self.setupAliases()
 
@@ -34,8 +57,7 @@ class FeatureOTFCompiler(object):
         """
 
         self.precompile()
-        self.setupFile_features()
-        self.setupFile_featureTables()
+        runStages(self.makeStages())
 
     def precompile(self):
         """Set any attributes needed before compilation.
@@ -46,6 +68,23 @@ class FeatureOTFCompiler(object):
 
         self.overwriteFeatures = False
 
+    def makeStages(self, outlineStages=()):
+        """
+        Make the list of stages (see ufo2ft.stageScheduler) writing and
+        compiling the features. Writing the feature text only needs the
+        UFO; compiling it into tables waits for the *outlineStages*, the
+        names of the stages building the outline font's tables.
+
+        **This should not be called externally.** Subclasses
+        may override this method to add, remove or reorder stages
+        if desired.
+        """
+        return [
+            Stage("setupFile_features", self.setupFile_features),
+            Stage("setupFile_featureTables", self.setupFile_featureTables,
+                  ("setupFile_features",) + tuple(outlineStages)),
+        ]
+
     def setupFile_features(self):
         """
         Make the features source file. If any tables
@@ -80,10 +119,9 @@ class FeatureOTFCompiler(object):
             existing = kernRE.sub("", markRE.sub("", mkmkRE.sub("", existing)))
 
         # write the features
-        features = [existing]
-        for name, text in sorted(autoFeatures.items()):
-            features.append(text)
-        self.features = "\n\n".join(features)
+        generated = [text for name, text in sorted(autoFeatures.items())]
+        self.featureParts = (existing, generated)
+        self.features = "\n\n".join([existing] + generated)
 
     def writeFeatures_kern(self):
         """
@@ -93,8 +131,13 @@ class FeatureOTFCompiler(object):
         may override this method to handle the string creation
         in a different way if desired.
         """
-        writer = self.kernWriter(self.font)
-        return writer.write()
+        with self.memoryAccountant.stage("kern feature"):
+            options = {}
+            if self.memoryAccountant.enabled:
+                # kern writers predating memory accounting still work
+                options["memoryAccountant"] = self.memoryAccountant
+            writer = self.kernWriter(self.font, **options)
+            return writer.write()
 
     def writeFeatures_mark(self):
         """
@@ -104,9 +147,10 @@ class FeatureOTFCompiler(object):
         may override this method to handle the string creation
         in a different way if desired.
         """
-        writer = self.markWriter(self.font, self.anchorPairs,
-                                 aliases=self.aliases)
-        return writer.write()
+        with self.memoryAccountant.stage("mark feature"):
+            writer = self.markWriter(self.font, self.anchorPairs,
+                                     aliases=self.aliases)
+            return writer.write()
 
     def writeFeatures_mkmk(self):
         """
@@ -116,9 +160,10 @@ class FeatureOTFCompiler(object):
         may override this method to handle the string creation
         in a different way if desired.
         """
-        writer = self.markWriter(self.font, self.mkmkAnchorPairs,
-                                 aliases=self.aliases, mkmk=True)
-        return writer.write()
+        with self.memoryAccountant.stage("mkmk feature"):
+            writer = self.markWriter(self.font, self.mkmkAnchorPairs,
+                                     aliases=self.aliases, mkmk=True)
+            return writer.write()
 
     def setupAnchorPairs(self):
         """
@@ -169,18 +214,42 @@ class FeatureOTFCompiler(object):
 
         if self.mtiFeaFiles is not None:
             for tag, feapath in self.mtiFeaFiles.items():
-                with open(feapath) as feafile:
-                    self.outline[tag] = mtiLib.build(feafile, self.outline)
+                with self.memoryAccountant.stage("mtiLib compile %s" % tag):
+                    with open(feapath) as feafile:
+                        self.outline[tag] = mtiLib.build(feafile, self.outline)
 
         elif self.features.strip():
+            featureParts = self.featureParts
             if self.font.path is not None:
                 self.features = forceAbsoluteIncludesInFeatures(self.features, self.font.path)
-            fd, fea_path = tempfile.mkstemp()
-            with open(fea_path, "w") as feafile:
-                feafile.write(self.features)
-            addOpenTypeFeatures(fea_path, self.outline)
-            os.close(fd)
-            os.remove(fea_path)
+                if featureParts is not None:
+                    featureParts = (forceAbsoluteIncludesInFeatures(
+                        featureParts[0], self.font.path), featureParts[1])
+            cacheKey = None
+            if self.layoutCache is not None:
+                cacheKey = self.layoutCache.makeKey(
+                    self.features, self.outline.getGlyphOrder(), self.font.path)
+                if cacheKey is not None and self.layoutCache.load(cacheKey, self.outline):
+                    return
+            tags = set(self.outline.keys())
+            # the parts are only used if no subclass changed the text
+            if (self.featureCache is not None and featureParts is not None and
+                    "\n\n".join([featureParts[0]] + featureParts[1]) == self.features):
+                with self.memoryAccountant.stage("feaLib compile"):
+                    self.featureCache.build(
+                        self.outline, featureParts[0], featureParts[1],
+                        self.font.path)
+            else:
+                fd, fea_path = tempfile.mkstemp()
+                with open(fea_path, "w") as feafile:
+                    feafile.write(self.features)
+                with self.memoryAccountant.stage("feaLib compile"):
+                    addOpenTypeFeatures(self.outline, fea_path)
+                os.close(fd)
+                os.remove(fea_path)
+            if cacheKey is not None:
+                self.layoutCache.store(cacheKey, self.outline, [
+                    tag for tag in self.outline.keys() if tag not in tags])
 
 includeRE = re.compile(
     "(include\s*\(\s*)"
@@ -200,3 +269,29 @@ def forceAbsoluteIncludesInFeatures(text, directory):
        includeText = start + srcPath + close
        text = text[:match.start()] + includeText + text[match.end():]
     return text
+
+
+def includedFeatureFiles(text, directory):
+    """
+    Return the paths of the files included by the feature *text*, and
+    recursively by those files, with relative paths resolved against
+    *directory* for *text* and against the including file's directory
+    for nested includes. Missing files are listed but not followed.
+    """
+    paths = []
+    pending = [(text, directory)]
+    while pending:
+        text, directory = pending.pop()
+        for match in includeRE.finditer(text):
+            includePath = match.group(2).strip()
+            if not os.path.isabs(includePath) and directory is not None:
+                includePath = os.path.join(directory, includePath)
+            includePath = os.path.normpath(includePath)
+            if includePath in paths:
+                continue
+            paths.append(includePath)
+            if os.path.isfile(includePath):
+                with open(includePath, "rb") as f:
+                    includeText = f.read().decode("utf-8")
+                pending.append((includeText, os.path.dirname(includePath)))
+    return paths
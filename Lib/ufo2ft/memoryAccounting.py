@@ -0,0 +1,195 @@
+"""
+Per-stage memory accounting for the compilers.
+
+A :class:`MemoryAccountant` can be passed to ``compileOTF``/``compileTTF``
+(and to the outline and feature compilers directly). Every compile stage is
+then traced with :mod:`tracemalloc`, and a peak-memory profile is available
+from the accountant after the compile. If a *budget* (in bytes) is given,
+the compile fails with :class:`MemoryBudgetExceeded`, naming the stage that
+went over the limit, as soon as the traced memory exceeds it::
+
+    accountant = MemoryAccountant(budget=2 * 1024 ** 3)
+    try:
+        otf = compileOTF(ufo, memoryAccountant=accountant)
+    finally:
+        print(accountant.report())
+"""
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+from contextlib import contextmanager
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+class MemoryBudgetExceeded(Exception):
+    """Raised when the traced memory exceeds the accountant's budget."""
+
+    def __init__(self, stage, used, budget):
+        self.stage = stage
+        self.used = used
+        self.budget = budget
+        super(MemoryBudgetExceeded, self).__init__(
+            "memory budget of %s exceeded during stage '%s' (%s traced)" % (
+                _formatSize(budget), stage, _formatSize(used)))
+
+
+class StageRecord(object):
+    """Memory profile of one compile stage."""
+
+    def __init__(self, name, parent=None):
+        self.name = name
+        self.parent = parent
+        self.startSize = 0
+        self.endSize = 0
+        self.peakSize = 0
+        self.seconds = 0.0
+
+    @property
+    def netSize(self):
+        """Memory still allocated when the stage finished."""
+        return self.endSize - self.startSize
+
+    @property
+    def peakIncrease(self):
+        """Highest traced memory during the stage, relative to its start."""
+        return self.peakSize - self.startSize
+
+    def __repr__(self):
+        return "<StageRecord %s peak=%s net=%s>" % (
+            self.name, _formatSize(self.peakIncrease), _formatSize(self.netSize))
+
+
+class MemoryAccountant(object):
+    """
+    Tracks allocations per compile stage using tracemalloc.
+
+    *budget* is the maximum traced memory in bytes, or None for no limit.
+    Tracing is started on the first stage if it is not already running and
+    stopped again by :meth:`stop`, which ``compileOTF`` and ``compileTTF``
+    call when the compile is done. When using the compilers directly, use
+    the accountant as a context manager to stop tracing at the end.
+    """
+
+    enabled = True
+
+    def __init__(self, budget=None):
+        if tracemalloc is None:
+            raise RuntimeError(
+                "memory accounting requires the tracemalloc module "
+                "(Python 3.4 or later)")
+        self.budget = budget
+        self.profile = []
+        self.peak = 0
+        self._stack = []
+        self._startedTracing = False
+
+    def stop(self):
+        """Stop tracing, if tracing was started by this accountant."""
+        if self._startedTracing:
+            tracemalloc.stop()
+            self._startedTracing = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Context manager accounting the allocations made in its body to
+        the stage *name*. Stages can be nested.
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._startedTracing = True
+        current, peak = tracemalloc.get_traced_memory()
+        self._updateOuterPeaks(peak)
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        parent = self._stack[-1].name if self._stack else None
+        record = StageRecord(name, parent)
+        record.startSize = record.peakSize = current
+        self._stack.append(record)
+        self.profile.append(record)
+        start = time.time()
+        try:
+            yield record
+        finally:
+            record.seconds = time.time() - start
+            current, peak = tracemalloc.get_traced_memory()
+            record.endSize = current
+            record.peakSize = max(record.peakSize, peak)
+            self._stack.pop()
+            self._updateOuterPeaks(record.peakSize)
+            self.peak = max(self.peak, record.peakSize)
+        self._checkBudget(record.name, record.peakSize)
+
+    def check(self):
+        """
+        Compare the traced memory with the budget and fail if it is over.
+        Long-running stages call this periodically so that the compile
+        stops before the stage completes.
+        """
+        if self.budget is None or not self._stack:
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        self._checkBudget(self._stack[-1].name, max(current, peak))
+
+    def report(self):
+        """Return a human readable table of the recorded stages."""
+        lines = ["%-40s %12s %12s %9s" % ("stage", "peak", "net", "time")]
+        depth = {}
+        for record in self.profile:
+            level = depth[record.name] = (
+                depth.get(record.parent, -1) + 1 if record.parent else 0)
+            lines.append("%-40s %12s %12s %8.3fs" % (
+                "  " * level + record.name,
+                _formatSize(record.peakIncrease),
+                _formatSize(record.netSize),
+                record.seconds))
+        lines.append("overall peak: %s" % _formatSize(self.peak))
+        return "\n".join(lines)
+
+    def _updateOuterPeaks(self, peak):
+        for record in self._stack:
+            if peak > record.peakSize:
+                record.peakSize = peak
+
+    def _checkBudget(self, stageName, used):
+        if self.budget is not None and used > self.budget:
+            self.stop()
+            raise MemoryBudgetExceeded(stageName, used, self.budget)
+
+
+class NullMemoryAccountant(object):
+    """Accountant used when memory accounting is off. Does nothing."""
+
+    enabled = False
+    budget = None
+    profile = ()
+    peak = 0
+
+    @contextmanager
+    def stage(self, name):
+        yield None
+
+    def check(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+def _formatSize(size):
+    for unit in ("B", "KiB", "MiB"):
+        if abs(size) < 1024:
+            return "%d %s" % (size, unit) if unit == "B" else "%.1f %s" % (size, unit)
+        size /= 1024
+    return "%.1f GiB" % size
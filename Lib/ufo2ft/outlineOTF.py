@@ -6,14 +6,22 @@ import time
 
 from fontTools.ttLib import TTFont, newTable
 from fontTools.cffLib import TopDictIndex, TopDict, CharStrings, SubrsIndex, GlobalSubrsIndex, PrivateDict, IndexedStrings
-from fontTools.pens.boundsPen import BoundsPen, ControlBoundsPen
+from fontTools.pens.boundsPen import ControlBoundsPen
 from fontTools.pens.t2CharStringPen import T2CharStringPen
 from fontTools.pens.ttGlyphPen import TTGlyphPen
 from fontTools.ttLib.tables.O_S_2f_2 import Panose
 from fontTools.ttLib.tables._h_e_a_d import mac_epoch_diff
 from fontTools.ttLib.tables._n_a_m_e import NameRecord
 
-from ufo2ft.fontInfoData import getFontBounds, getAttrWithFallback, dateStringToTimeValue, dateStringForNow, intListToNum, normalizeStringForPostscript
+from ufo2ft.boundingBoxes import RoundingBoundsPen, RoundingControlBoundsPen, intBounds, unionBounds
+from ufo2ft.curveConversion import convertGlyphs
+from ufo2ft.fontObjects import Glyph
+from ufo2ft.glyphCostReport import NullGlyphCostReport
+from ufo2ft.fontInfoData import getAttrWithFallback, dateStringToTimeValue, dateStringForNow, intListToNum, normalizeStringForPostscript
+from ufo2ft.lazyFont import LazyTTFont
+from ufo2ft.memoryAccounting import NullMemoryAccountant
+from ufo2ft.stageScheduler import Stage, runStages
+from ufo2ft.unicodeRanges import calcCodePageRanges, calcUnicodeRanges
 
 
 def _isNonBMP(s):
@@ -30,48 +38,172 @@ def _roundInt(v):
 class OutlineCompiler(object):
     """Create a feature-less outline binary."""
 
-    def __init__(self, font, glyphOrder=None):
+    # the tables made by setupOtherTables
+    outlineTableTags = ()
+
+    def __init__(self, font, glyphOrder=None, memoryAccountant=None,
+                 costReport=None):
         self.ufo = font
         self.log = []
-        # make any missing glyphs and store them locally
-        missingRequiredGlyphs = self.makeMissingRequiredGlyphs()
-        # make a dict of all glyphs
-        self.allGlyphs = {}
-        for glyph in font:
-            self.allGlyphs[glyph.name] = glyph
-        self.allGlyphs.update(missingRequiredGlyphs)
-        # store the glyph order
-        if glyphOrder is None:
-            glyphOrder = sorted(self.allGlyphs.keys())
-        self.glyphOrder = self.makeOfficialGlyphOrder(glyphOrder)
-        # make a reusable bounding box
-        self.fontBoundingBox = tuple([_roundInt(i) for i in self.makeFontBoundingBox()])
-        # make a reusable character mapping
-        self.unicodeToGlyphNameMapping = self.makeUnicodeToGlyphNameMapping()
-
-    def compile(self):
+        if memoryAccountant is None:
+            memoryAccountant = NullMemoryAccountant()
+        self.memoryAccountant = memoryAccountant
+        if costReport is None:
+            costReport = NullGlyphCostReport()
+        self.costReport = costReport
+        with memoryAccountant.stage("glyph loading"):
+            # make any missing glyphs and store them locally
+            missingRequiredGlyphs = self.makeMissingRequiredGlyphs()
+            # make a dict of all glyphs, converted to compact glyphs
+            # which all tables are built from
+            self.allGlyphs = {}
+            for glyph in font:
+                self.allGlyphs[glyph.name] = Glyph.fromGlyph(
+                    glyph, glyphSet=self.allGlyphs)
+                if not len(self.allGlyphs) % 1000:
+                    memoryAccountant.check()
+            for glyph in missingRequiredGlyphs.values():
+                glyph.glyphSet = self.allGlyphs
+            self.allGlyphs.update(missingRequiredGlyphs)
+            # store the glyph order
+            if glyphOrder is None:
+                glyphOrder = sorted(self.allGlyphs.keys())
+            self.glyphOrder = self.makeOfficialGlyphOrder(glyphOrder)
+            # exact glyph bounds and the font bounding box are made when
+            # compiling, see setupGlyphBounds
+            self.glyphBounds = None
+            self.fontBoundingBox = None
+            # make a reusable character mapping
+            self.unicodeToGlyphNameMapping = self.makeUnicodeToGlyphNameMapping()
+
+    def compile(self, tables=None, lazy=False, workers=1):
         """
         Compile the OpenType binary.
+
+        *tables* optionally restricts the compile to a collection of
+        table tags. If *lazy* is True, a LazyTTFont is returned and each
+        table is built when it is first accessed. Unless the outline
+        tables are built right away, the glyph bounds come from
+        makeMetricsGlyphBounds and the bounding boxes are recalculated
+        when the font is saved. *workers* is the number of threads
+        running independent stages (see makeStages) concurrently.
+        """
+        otf = self.setupFont(tables=tables, lazy=lazy)
+        runStages(self.makeStages(), workers=workers)
+        return otf
+
+    def setupFont(self, tables=None, lazy=False):
+        """
+        Make the empty font the stages of makeStages fill in, with the
+        options of compile, and return it.
         """
         self.precompile()
+        builders = self.makeTableBuilders()
+        if tables is not None:
+            unknown = set(tables) - set(builders)
+            if unknown:
+                raise ValueError(
+                    "Unknown tables: %s" % ", ".join(sorted(unknown)))
+            builders = dict((tag, builder) for tag, builder in builders.items()
+                            if tag in tables)
+        kwargs = {}
         if self.sfnt_version:
-            self.otf = TTFont(sfntVersion=self.sfnt_version)
+            kwargs["sfntVersion"] = self.sfnt_version
+        if lazy:
+            self.otf = LazyTTFont(builders, **kwargs)
         else:
-            self.otf = TTFont()
-
-        # populate basic tables
-        self.setupTable_head()
-        self.setupTable_hhea()
-        self.setupTable_hmtx()
-        self.setupTable_name()
-        self.setupTable_maxp()
-        self.setupTable_cmap()
-        self.setupTable_OS2()
-        self.setupTable_post()
-        self.setupOtherTables()
-
+            self.otf = TTFont(**kwargs)
+        if lazy or tables is not None:
+            # no outline table may be there to set it
+            self.otf.setGlyphOrder(self.glyphOrder)
+
+        # the table setups run by stages, the lazy font runs its own
+        if lazy:
+            self.tableSetups = set()
+        elif tables is None:
+            self.tableSetups = None
+        else:
+            self.tableSetups = set(builders.values())
+        self.buildOutlines = not lazy and all(
+            tag in builders for tag in self.outlineTableTags)
+        # all bounds and the values derived from them are exact already
+        # when the outlines are built from the same glyph bounds
+        self.otf.recalcBBoxes = not self.buildOutlines
         return self.otf
 
+    def makeStages(self):
+        """
+        Make the list of stages (see ufo2ft.stageScheduler) building the
+        glyph bounds and the tables of the font made by setupFont. The
+        name, cmap and post tables don't need the glyph bounds and may be
+        built while they are computed.
+
+        **This should not be called externally.** Subclasses
+        may override this method to add, remove or reorder stages
+        if desired.
+        """
+        stages = [Stage("glyph bounds", self._accounted(
+            "glyph bounds", self.setupGlyphBounds))]
+        bounds = ("glyph bounds",)
+        for setupTable, inputs in ((self.setupTable_head, bounds),
+                                   (self.setupTable_hhea, bounds),
+                                   (self.setupTable_hmtx, bounds),
+                                   (self.setupTable_name, ()),
+                                   (self.setupTable_maxp, bounds),
+                                   (self.setupTable_cmap, ()),
+                                   (self.setupTable_OS2, bounds),
+                                   (self.setupTable_post, ()),
+                                   (self.setupOtherTables, bounds)):
+            if self.tableSetups is not None and setupTable not in self.tableSetups:
+                continue
+            name = setupTable.__name__
+            stages.append(
+                Stage(name, self._accounted(name, setupTable), inputs))
+        return stages
+
+    def _accounted(self, name, function):
+        def stage():
+            with self.memoryAccountant.stage(name):
+                function()
+        return stage
+
+    def setupGlyphBounds(self):
+        """
+        Set ``self.glyphBounds`` and ``self.fontBoundingBox``.
+
+        **This should not be called externally.** Subclasses
+        may override this method to handle the bounds creation
+        in a different way if desired.
+        """
+        if self.buildOutlines:
+            self.glyphBounds = self.makeGlyphBounds()
+        else:
+            self.glyphBounds = self.makeMetricsGlyphBounds()
+        self.fontBoundingBox = self.makeFontBoundingBox()
+
+    def makeTableBuilders(self):
+        """
+        Make a ``table tag : setup method`` dict of the tables the
+        compiler can build. Tags sharing a method are built together.
+
+        **This should not be called externally.** Subclasses
+        may override this method to add tables built by
+        setupOtherTables, see also ``outlineTableTags``.
+        """
+        builders = {
+            "head": self.setupTable_head,
+            "hhea": self.setupTable_hhea,
+            "hmtx": self.setupTable_hmtx,
+            "name": self.setupTable_name,
+            "maxp": self.setupTable_maxp,
+            "cmap": self.setupTable_cmap,
+            "OS/2": self.setupTable_OS2,
+            "post": self.setupTable_post,
+        }
+        for tag in self.outlineTableTags:
+            builders[tag] = self.setupOtherTables
+        return builders
+
     def precompile(self):
         """Set any attributes needed before compilation.
 
@@ -89,7 +221,51 @@ class OutlineCompiler(object):
         may override this method to handle the bounds creation
         in a different way if desired.
         """
-        return getFontBounds(self.ufo)
+        if self.glyphBounds is not None:
+            return unionBounds(self.glyphBounds.values()) or (0, 0, 0, 0)
+        # replay the compact glyphs instead of drawing the UFO's again
+        return unionBounds(
+            glyph.bounds for glyph in self.allGlyphs.values()) or (0, 0, 0, 0)
+
+    def makeMetricsGlyphBounds(self):
+        """
+        Make the glyph bounds for compiles which don't build the outline
+        tables up front. They must be cheap to compute and match the
+        bounds of the compiled outlines. The default implementation
+        returns makeGlyphBounds.
+
+        **This should not be called externally.** Subclasses
+        may override this method to handle the bounds creation
+        in a different way if desired.
+        """
+        return self.makeGlyphBounds()
+
+    def makeGlyphBounds(self):
+        """
+        Make a ``glyph name : bounds`` dict of the exact integer bounds
+        of every glyph's compiled outline, None for empty glyphs.
+
+        **This should not be called externally.** Subclasses
+        may override this method to handle the bounds creation
+        in a different way if desired.
+        """
+        glyphBounds = {}
+        for glyphName in self.glyphOrder:
+            glyphBounds[glyphName] = self.getBoundsForGlyph(self.allGlyphs[glyphName])
+        return glyphBounds
+
+    def getBoundsForGlyph(self, glyph):
+        """
+        Get the integer bounds of the compiled outline of the *glyph*,
+        or None if it is empty.
+
+        **This should not be called externally.** Subclasses
+        may override this method to handle the bounds creation
+        in a different way if desired.
+        """
+        pen = RoundingBoundsPen(self.allGlyphs)
+        glyph.draw(pen)
+        return intBounds(pen.bounds)
 
     def makeUnicodeToGlyphNameMapping(self):
         """
@@ -352,6 +528,26 @@ class OutlineCompiler(object):
             # update tables registry
             cmap.tables = [cmap4_0_3, cmap4_3_1, cmap12_0_4, cmap12_3_10]
 
+    def makeWinMetrics(self):
+        """
+        Make the ``(usWinAscent, usWinDescent)`` values of the OS/2 table.
+        Unless set in the UFO, they come from the font bounding box made
+        with the glyph bounds, rather than from drawing the UFO's glyphs.
+
+        **This should not be called externally.** Subclasses
+        may override this method to handle the metrics creation
+        in a different way if desired.
+        """
+        info = self.ufo.info
+        xMin, yMin, xMax, yMax = self.fontBoundingBox
+        winAscent = getattr(info, "openTypeOS2WinAscent", None)
+        if winAscent is None:
+            winAscent = yMax
+        winDescent = getattr(info, "openTypeOS2WinDescent", None)
+        if winDescent is None:
+            winDescent = abs(yMin)
+        return _roundInt(winAscent), _roundInt(winDescent)
+
     def setupTable_OS2(self):
         """
         Make the OS/2 table.
@@ -432,14 +628,18 @@ class OutlineCompiler(object):
         panose.bMidline = data[8]
         panose.bXHeight = data[9]
         os2.panose = panose
-        # Unicode ranges
-        uniRanges = getAttrWithFallback(font.info, "openTypeOS2UnicodeRanges")
+        # Unicode ranges, computed from the cmap unless set in the UFO
+        uniRanges = getattr(font.info, "openTypeOS2UnicodeRanges", None)
+        if uniRanges is None:
+            uniRanges = sorted(calcUnicodeRanges(self.unicodeToGlyphNameMapping))
         os2.ulUnicodeRange1 = intListToNum(uniRanges, 0, 32)
         os2.ulUnicodeRange2 = intListToNum(uniRanges, 32, 32)
         os2.ulUnicodeRange3 = intListToNum(uniRanges, 64, 32)
         os2.ulUnicodeRange4 = intListToNum(uniRanges, 96, 32)
-        # codepage ranges
-        codepageRanges = getAttrWithFallback(font.info, "openTypeOS2CodePageRanges")
+        # codepage ranges, likewise
+        codepageRanges = getattr(font.info, "openTypeOS2CodePageRanges", None)
+        if codepageRanges is None:
+            codepageRanges = sorted(calcCodePageRanges(self.unicodeToGlyphNameMapping))
         os2.ulCodePageRange1 = intListToNum(codepageRanges, 0, 32)
         os2.ulCodePageRange2 = intListToNum(codepageRanges, 32, 32)
         # vendor id
@@ -452,8 +652,7 @@ class OutlineCompiler(object):
         os2.sTypoAscender = _roundInt(getAttrWithFallback(font.info, "openTypeOS2TypoAscender"))
         os2.sTypoDescender = _roundInt(getAttrWithFallback(font.info, "openTypeOS2TypoDescender"))
         os2.sTypoLineGap = _roundInt(getAttrWithFallback(font.info, "openTypeOS2TypoLineGap"))
-        os2.usWinAscent = _roundInt(getAttrWithFallback(font.info, "openTypeOS2WinAscent"))
-        os2.usWinDescent = _roundInt(getAttrWithFallback(font.info, "openTypeOS2WinDescent"))
+        os2.usWinAscent, os2.usWinDescent = self.makeWinMetrics()
         # style mapping
         selection = list(getAttrWithFallback(font.info, "openTypeOS2Selection"))
         styleMapStyleName = getAttrWithFallback(font.info, "styleMapStyleName")
@@ -500,16 +699,31 @@ class OutlineCompiler(object):
         self.otf["hmtx"] = hmtx = newTable("hmtx")
         hmtx.metrics = {}
         for glyphName, glyph in self.allGlyphs.items():
-            width = glyph.width
-            left = 0
-            if len(glyph) or len(glyph.components):
-                # lsb should be consistent with glyf xMin, which is just
-                # minimum x for coordinate data
-                pen = ControlBoundsPen(self.ufo, ignoreSinglePoints=True)
-                glyph.draw(pen)
-                left = 0 if pen.bounds is None else pen.bounds[0]
-            # take floor of lsb/xMin, as fontTools does with min bounds
-            hmtx[glyphName] = (_roundInt(width), int(math.floor(left)))
+            hmtx[glyphName] = self.getHorizontalMetricsForGlyph(glyph)
+
+    def getHorizontalMetricsForGlyph(self, glyph):
+        """
+        Get the ``(advance width, left side bearing)`` hmtx entry
+        for the *glyph*.
+
+        **This should not be called externally.** Subclasses
+        may override this method to handle the metrics creation
+        in a different way if desired.
+        """
+        width = glyph.width
+        left = 0
+        if self.glyphBounds is not None:
+            bounds = self.glyphBounds.get(glyph.name)
+            if bounds is not None:
+                left = bounds[0]
+        elif len(glyph) or len(glyph.components):
+            # lsb should be consistent with glyf xMin, which is just
+            # minimum x for coordinate data
+            pen = ControlBoundsPen(self.allGlyphs, ignoreSinglePoints=True)
+            glyph.draw(pen)
+            left = 0 if pen.bounds is None else pen.bounds[0]
+        # take floor of lsb/xMin, as fontTools does with min bounds
+        return (_roundInt(width), int(math.floor(left)))
 
     def setupTable_hhea(self):
         """
@@ -531,29 +745,46 @@ class OutlineCompiler(object):
         lefts = []
         rights = []
         extents = []
-        for glyph in self.allGlyphs.values():
-            left = glyph.leftMargin
-            right = glyph.rightMargin
-            if left is None:
-                left = 0
-            if right is None:
-                right = 0
-            widths.append(glyph.width)
-            lefts.append(left)
-            rights.append(right)
-            # robofab
-            if hasattr(glyph, "box"):
-                bounds = glyph.box
-            # others
-            else:
-                bounds = glyph.bounds
-            if bounds is not None:
-                xMin, yMin, xMax, yMax = bounds
-            else:
-                xMin = 0
-                xMax = 0
-            extent = left + (xMax - xMin) # equation from spec for calculating xMaxExtent: Max(lsb + (xMax - xMin))
-            extents.append(extent)
+        if self.glyphBounds is not None:
+            # computed from the compiled outlines, as fontTools does
+            for glyphName in self.glyphOrder:
+                width, left = self.getHorizontalMetricsForGlyph(
+                    self.allGlyphs[glyphName])
+                widths.append(width)
+                bounds = self.glyphBounds[glyphName]
+                if bounds is None:
+                    continue
+                boundsWidth = bounds[2] - bounds[0]
+                lefts.append(left)
+                rights.append(width - left - boundsWidth)
+                extents.append(left + boundsWidth)
+            lefts = lefts or [0]
+            rights = rights or [0]
+            extents = extents or [0]
+        else:
+            for glyph in self.allGlyphs.values():
+                left = glyph.leftMargin
+                right = glyph.rightMargin
+                if left is None:
+                    left = 0
+                if right is None:
+                    right = 0
+                widths.append(glyph.width)
+                lefts.append(left)
+                rights.append(right)
+                # robofab
+                if hasattr(glyph, "box"):
+                    bounds = glyph.box
+                # others
+                else:
+                    bounds = glyph.bounds
+                if bounds is not None:
+                    xMin, yMin, xMax, yMax = bounds
+                else:
+                    xMin = 0
+                    xMax = 0
+                extent = left + (xMax - xMin) # equation from spec for calculating xMaxExtent: Max(lsb + (xMax - xMin))
+                extents.append(extent)
         hhea.advanceWidthMax = _roundInt(max(widths))
         hhea.minLeftSideBearing = _roundInt(min(lefts))
         hhea.minRightSideBearing = _roundInt(min(rights))
@@ -616,6 +847,8 @@ class OutlineCompiler(object):
 class OutlineOTFCompiler(OutlineCompiler):
     """Compile a .otf font with CFF outlines."""
 
+    outlineTableTags = ("CFF ",)
+
     def precompile(self):
         self.sfnt_version = "OTTO"
 
@@ -633,6 +866,7 @@ class OutlineOTFCompiler(OutlineCompiler):
 
         self.otf["CFF "] = cff = newTable("CFF ")
         cff = cff.cff
+        self.costReport.outlineFormat = "CFF"
         # set up the basics
         cff.major = 1
         cff.minor = 0
@@ -745,7 +979,12 @@ class OutlineOTFCompiler(OutlineCompiler):
         for glyphName in self.glyphOrder:
             glyph = self.allGlyphs[glyphName]
             unicodes = glyph.unicodes
-            charString = self.getCharStringForGlyph(glyph, private, globalSubrs)
+            charString = self.costReport.measure(
+                glyph, self.allGlyphs, self.getCharStringForGlyph,
+                glyph, private, globalSubrs)
+            if self.costReport.enabled:
+                charString.compile()
+                self.costReport.recordSize(glyphName, len(charString.bytecode))
             # add to the font
             if glyphName in charStrings:
                 # XXX a glyph already has this name. should we choke?
@@ -756,19 +995,77 @@ class OutlineOTFCompiler(OutlineCompiler):
                 glyphID = len(topDict.charset)
                 charStrings.charStrings[glyphName] = glyphID
                 topDict.charset.append(glyphName)
+            if not glyphID % 1000:
+                self.memoryAccountant.check()
         topDict.FontBBox = self.fontBoundingBox
         # write the glyph order
         self.otf.setGlyphOrder(self.glyphOrder)
 
 
 class OutlineTTFCompiler(OutlineCompiler):
-    """Compile a .ttf font with TrueType outlines."""
+    """
+    Compile a .ttf font with TrueType outlines.
+
+    Cubic curves are converted to quadratic curves before any table is
+    built, staying within *maxConversionError* font units (by default a
+    thousandth of the em). *compatibleMasters* is an optional list of the
+    other masters of the font; conversion then stays interpolation
+    compatible with them, provided they are all compiled with the same
+    list. *conversionWorkers* sets the number of processes converting
+    glyphs. Set *convertCubics* to False for fonts whose outlines are
+    already quadratic.
+    """
+
+    outlineTableTags = ("glyf", "loca")
+
+    def __init__(self, font, glyphOrder=None, memoryAccountant=None,
+                 convertCubics=True, maxConversionError=None,
+                 compatibleMasters=None, conversionWorkers=1, costReport=None):
+        super(OutlineTTFCompiler, self).__init__(
+            font, glyphOrder=glyphOrder, memoryAccountant=memoryAccountant,
+            costReport=costReport)
+        self.maxpProfile = None
+        self.glyfTable = None
+        if convertCubics:
+            if maxConversionError is None:
+                unitsPerEm = getAttrWithFallback(font.info, "unitsPerEm")
+                maxConversionError = unitsPerEm / 1000
+            if compatibleMasters is not None:
+                compatibleMasters = [m for m in compatibleMasters if m is not font]
+            with self.memoryAccountant.stage("curve conversion"):
+                self.convertCurves(maxConversionError, compatibleMasters,
+                                   conversionWorkers)
+
+    def convertCurves(self, maxError, masters, workers):
+        """
+        Replace the glyphs with cubic curves by quadratic versions.
+
+        **This should not be called externally.** Subclasses
+        may override this method to handle the conversion
+        in a different way if desired.
+        """
+        converted = convertGlyphs(self.allGlyphs, maxError, masters=masters,
+                                  workers=workers)
+        for glyphName, operations in converted.items():
+            glyph = self.allGlyphs[glyphName]
+            self.allGlyphs[glyphName] = Glyph(
+                glyphName, width=glyph.width, unicodes=glyph.unicodes,
+                operations=operations, anchors=glyph.anchors,
+                glyphSet=self.allGlyphs)
 
     def setupTable_maxp(self):
-        """Make the maxp table."""
+        """
+        Make the maxp table.
+
+        The glyph statistics are filled in from ``self.maxpProfile``,
+        which is gathered while the glyf table is built, so that they
+        don't need to be recalculated when the font is saved. If the glyf
+        table isn't built yet, its glyphs are made now to gather them.
+        """
 
         self.otf["maxp"] = maxp = newTable("maxp")
         maxp.tableVersion = 0b10000
+        maxp.numGlyphs = len(self.glyphOrder)
         maxp.maxZones = 1
         maxp.maxTwilightPoints = 0
         maxp.maxStorage = 0
@@ -776,7 +1073,10 @@ class OutlineTTFCompiler(OutlineCompiler):
         maxp.maxInstructionDefs = 0
         maxp.maxStackElements = 0
         maxp.maxSizeOfInstructions = 0
-        maxp.maxComponentElements = max(len(g.components) for g in self.ufo)
+        if self.maxpProfile is None:
+            # kept for setupTable_glyf, if the glyf table is wanted too
+            self.glyfTable = self.makeGlyfTable()
+        self.maxpProfile.apply(maxp)
 
     def setupTable_post(self):
         """Make a format 2 post table with the compiler's glyph order."""
@@ -791,21 +1091,222 @@ class OutlineTTFCompiler(OutlineCompiler):
     def setupOtherTables(self):
         self.setupTable_glyf()
 
+    def makeMetricsGlyphBounds(self):
+        """
+        Take the glyph bounds from the rounded control points of the
+        outlines, which are what the glyf table stores, without building
+        the glyf table. Composites get the bounds glyf computes for them
+        from their glyf glyphs and those of the glyphs they use, as
+        transformed components aren't placed exactly like drawn ones.
+
+        **This should not be called externally.** Subclasses
+        may override this method to handle the bounds creation
+        in a different way if desired.
+        """
+        glyphBounds = {}
+        composites = []
+        for glyphName in self.glyphOrder:
+            glyph = self.allGlyphs[glyphName]
+            if len(glyph.components):
+                composites.append(glyphName)
+                continue
+            pen = RoundingControlBoundsPen(self.allGlyphs)
+            glyph.draw(pen)
+            glyphBounds[glyphName] = intBounds(pen.bounds)
+        if not composites:
+            return glyphBounds
+
+        glyf = newTable("glyf")
+        glyf.glyphs = {}
+        glyf.glyphOrder = self.glyphOrder
+        pending = list(composites)
+        while pending:
+            glyphName = pending.pop()
+            if glyphName in glyf.glyphs:
+                continue
+            glyph = self.allGlyphs[glyphName]
+            glyf[glyphName] = self.getTTGlyphForGlyph(glyph)
+            pending.extend(component.baseGlyph for component in glyph.components
+                           if component.baseGlyph in self.allGlyphs)
+        for glyphName in composites:
+            ttGlyph = glyf[glyphName]
+            glyphBounds[glyphName] = None
+            if ttGlyph.numberOfContours:
+                ttGlyph.recalcBounds(glyf)
+                glyphBounds[glyphName] = (
+                    ttGlyph.xMin, ttGlyph.yMin, ttGlyph.xMax, ttGlyph.yMax)
+        return glyphBounds
+
+    def makeGlyphBounds(self):
+        """
+        Build the glyf table glyphs ahead of the other tables and take
+        the glyph bounds from them.
+
+        **This should not be called externally.** Subclasses
+        may override this method to handle the bounds creation
+        in a different way if desired.
+        """
+        self.glyfTable = glyf = self.makeGlyfTable()
+        glyphBounds = {}
+        # simple glyphs first, composites are resolved through them
+        composites = []
+        for glyphName in self.glyphOrder:
+            ttGlyph = glyf[glyphName]
+            if ttGlyph.numberOfContours < 0:
+                composites.append(glyphName)
+                continue
+            glyphBounds[glyphName] = None
+            if ttGlyph.numberOfContours > 0:
+                ttGlyph.recalcBounds(glyf)
+                glyphBounds[glyphName] = (
+                    ttGlyph.xMin, ttGlyph.yMin, ttGlyph.xMax, ttGlyph.yMax)
+        for glyphName in composites:
+            ttGlyph = glyf[glyphName]
+            ttGlyph.recalcBounds(glyf)
+            glyphBounds[glyphName] = (
+                ttGlyph.xMin, ttGlyph.yMin, ttGlyph.xMax, ttGlyph.yMax)
+        return glyphBounds
+
+    def makeGlyfTable(self):
+        """
+        Make a glyf table with a glyph for every glyph in the glyph
+        order, gathering the maxp statistics on the way.
+
+        **This should not be called externally.** Subclasses
+        may override this method to handle the glyph creation
+        in a different way if desired.
+        """
+        glyf = newTable("glyf")
+        glyf.glyphs = {}
+        glyf.glyphOrder = self.glyphOrder
+
+        self.maxpProfile = profile = MaxpProfile()
+        self.costReport.outlineFormat = "glyf"
+        for i, glyphName in enumerate(self.glyphOrder):
+            glyph = self.allGlyphs[glyphName]
+            ttGlyph = self.costReport.measure(
+                glyph, self.allGlyphs, self.getTTGlyphForGlyph, glyph)
+            glyf[glyphName] = ttGlyph
+            profile.addGlyph(glyphName, ttGlyph)
+            if not i % 1000:
+                self.memoryAccountant.check()
+        if self.costReport.enabled:
+            self.recordGlyfSizes(glyf)
+        return glyf
+
+    def recordGlyfSizes(self, glyf):
+        """
+        Record the compiled size of every glyph of the *glyf* table in
+        the cost report.
+
+        **This should not be called externally.** Subclasses
+        may override this method if desired.
+        """
+        for glyphName in self.glyphOrder:
+            ttGlyph = glyf[glyphName]
+            if ttGlyph.numberOfContours:
+                # composites need all glyphs to be there
+                ttGlyph.recalcBounds(glyf)
+            self.costReport.recordSize(
+                glyphName, len(ttGlyph.compile(glyf, recalcBBoxes=False)))
+
     def setupTable_glyf(self):
         """Make the glyf table."""
 
+        glyf = self.glyfTable
+        if glyf is None:
+            glyf = self.makeGlyfTable()
+            # maxp is built before glyf
+            if "maxp" in self.otf:
+                self.maxpProfile.apply(self.otf["maxp"])
         self.otf["loca"] = newTable("loca")
-        self.otf["glyf"] = glyf = newTable("glyf")
-        glyf.glyphs = {}
-        glyf.glyphOrder = self.glyphOrder
+        self.otf["glyf"] = glyf
 
-        for glyph in self.ufo:
-            pen = TTGlyphPen(self.ufo)
-            glyph.draw(pen)
-            glyf[glyph.name] = pen.glyph()
+    def getTTGlyphForGlyph(self, glyph):
+        """
+        Get a glyf table Glyph for the *glyph*.
 
+        **This should not be called externally.** Subclasses
+        may override this method to handle the glyph creation
+        in a different way if desired.
+        """
+        pen = TTGlyphPen(self.allGlyphs)
+        glyph.draw(pen)
+        return pen.glyph()
 
-class StubGlyph(object):
+
+class MaxpProfile(object):
+    """
+    Collects the maxp glyph statistics from glyf table glyphs as they are
+    built. Composite totals and component depths are resolved through the
+    component graph once all glyphs were added, computing each composite
+    only once. The values are the same as those fontTools computes when
+    recalculating maxp.
+    """
+
+    def __init__(self):
+        self.simpleGlyphs = {}
+        self.compositeGlyphs = {}
+
+    def addGlyph(self, glyphName, ttGlyph):
+        if ttGlyph.numberOfContours > 0:
+            self.simpleGlyphs[glyphName] = (
+                len(ttGlyph.coordinates), len(ttGlyph.endPtsOfContours))
+        elif ttGlyph.numberOfContours < 0:
+            self.compositeGlyphs[glyphName] = [
+                component.glyphName for component in ttGlyph.components]
+
+    def _compositeValues(self, glyphName, resolved):
+        values = resolved.get(glyphName)
+        if values is not None:
+            return values
+        # guard against component cycles
+        resolved[glyphName] = (0, 0, 0)
+        points = contours = 0
+        depth = 1
+        for baseGlyph in self.compositeGlyphs[glyphName]:
+            if baseGlyph in self.simpleGlyphs:
+                basePoints, baseContours = self.simpleGlyphs[baseGlyph]
+            elif baseGlyph in self.compositeGlyphs:
+                basePoints, baseContours, baseDepth = self._compositeValues(
+                    baseGlyph, resolved)
+                depth = max(depth, baseDepth + 1)
+            else:
+                # empty or missing base glyph
+                continue
+            points += basePoints
+            contours += baseContours
+        values = resolved[glyphName] = (points, contours, depth)
+        return values
+
+    def values(self):
+        """Return a dict of maxp attribute values."""
+        maxPoints = maxContours = 0
+        for points, contours in self.simpleGlyphs.values():
+            maxPoints = max(maxPoints, points)
+            maxContours = max(maxContours, contours)
+        maxCompositePoints = maxCompositeContours = 0
+        maxComponentDepth = maxComponentElements = 0
+        resolved = {}
+        for glyphName, components in self.compositeGlyphs.items():
+            points, contours, depth = self._compositeValues(glyphName, resolved)
+            maxCompositePoints = max(maxCompositePoints, points)
+            maxCompositeContours = max(maxCompositeContours, contours)
+            maxComponentDepth = max(maxComponentDepth, depth)
+            maxComponentElements = max(maxComponentElements, len(components))
+        return dict(
+            maxPoints=maxPoints, maxContours=maxContours,
+            maxCompositePoints=maxCompositePoints,
+            maxCompositeContours=maxCompositeContours,
+            maxComponentDepth=maxComponentDepth,
+            maxComponentElements=maxComponentElements)
+
+    def apply(self, maxp):
+        for attr, value in self.values().items():
+            setattr(maxp, attr, value)
+
+
+class StubGlyph(Glyph):
 
     """
     This object will be used to create missing glyphs
@@ -813,74 +1314,39 @@ class StubGlyph(object):
     provided UFO.
     """
 
+    __slots__ = ()
+
     def __init__(self, name, width, unitsPerEm, ascender, descender, unicodes=[]):
-        self.name = name
-        self.width = width
-        self.unitsPerEm = unitsPerEm
-        self.ascender = ascender
-        self.descender = descender
-        self.unicodes = unicodes
-        self.components = []
-        if unicodes:
-            self.unicode = unicodes[0]
-        else:
-            self.unicode = None
+        operations = None
         if name == ".notdef":
-            self.draw = self._drawDefaultNotdef
-
-    def __len__(self):
-        if self.name == ".notdef":
-            return 1
-        return 0
-
-    def _get_leftMargin(self):
-        if self.bounds is None:
-            return 0
-        return self.bounds[0]
-
-    leftMargin = property(_get_leftMargin)
-
-    def _get_rightMargin(self):
-        bounds = self.bounds
-        if bounds is None:
-            return 0
-        xMin, yMin, xMax, yMax = bounds
-        return self.width - bounds[2]
-
-    rightMargin = property(_get_rightMargin)
-
-    def draw(self, pen):
-        pass
-
-    def _drawDefaultNotdef(self, pen):
-        width = int(round(self.unitsPerEm * 0.5))
-        stroke = int(round(self.unitsPerEm * 0.05))
-        ascender = self.ascender
-        descender = self.descender
-        xMin = stroke
-        xMax = width - stroke
-        yMax = ascender
-        yMin = descender
-        pen.moveTo((xMin, yMin))
-        pen.lineTo((xMax, yMin))
-        pen.lineTo((xMax, yMax))
-        pen.lineTo((xMin, yMax))
-        pen.lineTo((xMin, yMin))
-        pen.closePath()
-        xMin += stroke
-        xMax -= stroke
-        yMax -= stroke
-        yMin += stroke
-        pen.moveTo((xMin, yMin))
-        pen.lineTo((xMin, yMax))
-        pen.lineTo((xMax, yMax))
-        pen.lineTo((xMax, yMin))
-        pen.lineTo((xMin, yMin))
-        pen.closePath()
-
-    def _get_bounds(self):
-        pen = BoundsPen(None)
-        self.draw(pen)
-        return pen.bounds
-
-    bounds = property(_get_bounds)
+            operations = _defaultNotdefOperations(unitsPerEm, ascender, descender)
+        super(StubGlyph, self).__init__(
+            name, width=width, unicodes=unicodes, operations=operations)
+
+
+def _defaultNotdefOperations(unitsPerEm, ascender, descender):
+    width = int(round(unitsPerEm * 0.5))
+    stroke = int(round(unitsPerEm * 0.05))
+    xMin = stroke
+    xMax = width - stroke
+    yMax = ascender
+    yMin = descender
+    operations = [
+        ("moveTo", ((xMin, yMin),)),
+        ("lineTo", ((xMax, yMin),)),
+        ("lineTo", ((xMax, yMax),)),
+        ("lineTo", ((xMin, yMax),)),
+        ("lineTo", ((xMin, yMin),)),
+        ("closePath", ())]
+    xMin += stroke
+    xMax -= stroke
+    yMax -= stroke
+    yMin += stroke
+    operations += [
+        ("moveTo", ((xMin, yMin),)),
+        ("lineTo", ((xMin, yMax),)),
+        ("lineTo", ((xMax, yMax),)),
+        ("lineTo", ((xMax, yMin),)),
+        ("lineTo", ((xMin, yMin),)),
+        ("closePath", ())]
+    return operations
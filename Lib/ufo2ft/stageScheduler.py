@@ -0,0 +1,124 @@
+"""
+Run compile stages in dependency order, independent stages concurrently.
+
+Each :class:`Stage` names the stages it needs as its *inputs*. The outline
+and feature compilers describe their work as stages (see their
+``makeStages`` methods), and :func:`runStages` runs a stage once all of its
+inputs are complete. With several *workers*, it runs stages that don't
+depend on each other in a pool of threads. For example, the kern feature
+text is written while the CFF table is built.
+
+Stages share the compilers' state, such as the TTFont being built. They
+therefore run in threads, not processes.
+"""
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import threading
+
+
+class Stage(object):
+    """
+    A step of a compile: *function* is called without arguments once the
+    stages named in *inputs* are complete.
+    """
+
+    def __init__(self, name, function, inputs=()):
+        self.name = name
+        self.function = function
+        self.inputs = tuple(inputs)
+
+    def __repr__(self):
+        return "<Stage %s inputs=%r>" % (self.name, self.inputs)
+
+
+def sortStages(stages):
+    """
+    Return *stages* in an order in which every stage comes after its
+    inputs, keeping the given order where possible. Raises ValueError for
+    duplicate names, unknown inputs and cycles.
+    """
+    names = set()
+    for stage in stages:
+        if stage.name in names:
+            raise ValueError("Duplicate stage: %s" % stage.name)
+        names.add(stage.name)
+    for stage in stages:
+        for name in stage.inputs:
+            if name not in names:
+                raise ValueError(
+                    "Stage %s has an unknown input: %s" % (stage.name, name))
+    ordered = []
+    done = set()
+    pending = list(stages)
+    while pending:
+        for stage in pending:
+            if all(name in done for name in stage.inputs):
+                break
+        else:
+            raise ValueError("Stages depend on each other: %s" % ", ".join(
+                stage.name for stage in pending))
+        ordered.append(stage)
+        done.add(stage.name)
+        pending.remove(stage)
+    return ordered
+
+
+def runStages(stages, workers=1, callback=None):
+    """
+    Run *stages*, each once its inputs are complete, in up to *workers*
+    threads. *callback* is called with the name of each stage before it
+    runs. If a stage fails, no further stages are started and its exception
+    is raised once the running ones are done.
+    """
+    ordered = sortStages(stages)
+    if workers is None or workers <= 1 or len(ordered) <= 1:
+        for stage in ordered:
+            if callback is not None:
+                callback(stage.name)
+            stage.function()
+        return
+
+    pending = list(ordered)
+    done = set()
+    errors = []
+    condition = threading.Condition()
+
+    def nextStage():
+        with condition:
+            while True:
+                if errors or not pending:
+                    return None
+                for stage in pending:
+                    if all(name in done for name in stage.inputs):
+                        pending.remove(stage)
+                        return stage
+                condition.wait()
+
+    def work():
+        while True:
+            stage = nextStage()
+            if stage is None:
+                return
+            try:
+                if callback is not None:
+                    callback(stage.name)
+                stage.function()
+            except BaseException as error:
+                with condition:
+                    errors.append(error)
+                    condition.notify_all()
+                return
+            with condition:
+                done.add(stage.name)
+                condition.notify_all()
+
+    threads = [threading.Thread(target=work)
+               for _ in range(min(workers, len(ordered)))]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
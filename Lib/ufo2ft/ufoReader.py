@@ -0,0 +1,254 @@
+"""
+A fast UFO reader building :mod:`ufo2ft.fontObjects` fonts directly from
+the files of a UFO (format 2 or 3), without going through defcon or
+robofab objects.
+
+Only what the compilers use is read: fontinfo.plist, groups.plist,
+kerning.plist, lib.plist, features.fea and the glyphs of the default
+layer. Like ufoLib, the reader gives the kerning groups of a UFO 2 their
+UFO 3 names. The .glif files are parsed with a streaming XML parser, spread
+across a pool of threads or processes; each glyph is stored as a compact
+glyph as soon as it is parsed.
+"""
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import os
+import plistlib
+from xml.etree.ElementTree import iterparse
+
+from ufo2ft.fontObjects import Anchor, Font, Glyph
+
+_transformationAttributes = (
+    ("xScale", 1), ("xyScale", 0), ("yxScale", 0), ("yScale", 1),
+    ("xOffset", 0), ("yOffset", 0))
+
+
+def _readPlist(path, default=None):
+    if not os.path.exists(path):
+        return default
+    with open(path, "rb") as f:
+        if hasattr(plistlib, "load"):
+            return plistlib.load(f)
+        return plistlib.readPlist(f)
+
+
+def _number(value):
+    number = float(value)
+    if number.is_integer():
+        return int(number)
+    return number
+
+
+def _contourOperations(points):
+    """
+    Turn the points of a glif contour, ``(x, y, type)`` tuples with type
+    None for off-curve points, into segment pen calls.
+    """
+    if not points:
+        return []
+    if points[0][2] == "move":
+        # open contour
+        operations = [("moveTo", ((points[0][0], points[0][1]),))]
+        points = points[1:]
+        closed = False
+    else:
+        onCurveIndexes = [i for i, point in enumerate(points) if point[2] is not None]
+        if not onCurveIndexes:
+            # quadratic contour without on-curve points
+            offCurves = tuple((x, y) for x, y, _ in points)
+            return [("qCurveTo", offCurves + (None,)), ("closePath", ())]
+        # start at the first on-curve point, like PointToSegmentPen: the
+        # list is rotated to end with it, so the segments end up in order
+        first = onCurveIndexes[0]
+        points = points[first + 1:] + points[:first + 1]
+        operations = [("moveTo", ((points[-1][0], points[-1][1]),))]
+        closed = True
+    offCurves = []
+    for i, (x, y, segmentType) in enumerate(points):
+        if segmentType is None:
+            offCurves.append((x, y))
+            continue
+        if segmentType == "line":
+            # the closing line back to the start point is implied
+            if not (closed and i == len(points) - 1):
+                operations.append(("lineTo", ((x, y),)))
+        elif segmentType == "curve":
+            operations.append(("curveTo", tuple(offCurves) + ((x, y),)))
+        elif segmentType == "qcurve":
+            operations.append(("qCurveTo", tuple(offCurves) + ((x, y),)))
+        offCurves = []
+    operations.append(("closePath", ()) if closed else ("endPath", ()))
+    return operations
+
+
+def readGlif(path, glyphName=None):
+    """Read a .glif file into a compact glyph."""
+    width = 0
+    unicodes = []
+    anchors = []
+    operations = []
+    components = []
+    contour = None
+    inLib = 0
+    name = glyphName
+    for event, element in iterparse(path, events=("start", "end")):
+        tag = element.tag
+        if tag == "lib":
+            inLib += 1 if event == "start" else -1
+            continue
+        if inLib:
+            if event == "end":
+                element.clear()
+            continue
+        if event == "start":
+            if tag == "glyph":
+                name = element.get("name", glyphName)
+            elif tag == "contour":
+                contour = []
+            continue
+        # end events, when all attributes have been read
+        attrib = element.attrib
+        if tag == "advance":
+            width = _number(attrib.get("width", 0))
+        elif tag == "unicode":
+            unicodes.append(int(attrib["hex"], 16))
+        elif tag == "anchor":
+            anchors.append(Anchor(attrib.get("name"), _number(attrib["x"]),
+                                  _number(attrib["y"])))
+        elif tag == "point" and contour is not None:
+            pointType = attrib.get("type")
+            if pointType == "offcurve":
+                pointType = None
+            contour.append((_number(attrib["x"]), _number(attrib["y"]),
+                            pointType, attrib.get("name")))
+        elif tag == "contour":
+            if (len(contour) == 1 and contour[0][2] == "move" and
+                    contour[0][3] is not None):
+                # a format 1 glif anchor
+                x, y, _, anchorName = contour[0]
+                anchors.append(Anchor(anchorName, x, y))
+            else:
+                operations.extend(_contourOperations(
+                    [point[:3] for point in contour]))
+            contour = None
+        elif tag == "component":
+            transformation = tuple(
+                _number(attrib.get(attr, default))
+                for attr, default in _transformationAttributes)
+            components.append(("addComponent", (attrib["base"], transformation)))
+        element.clear()
+    return Glyph(name, width=width, unicodes=unicodes,
+                 operations=operations + components, anchors=anchors)
+
+
+def _readGlifs(args):
+    glyphsDir, items = args
+    return [readGlif(os.path.join(glyphsDir, fileName), glyphName)
+            for glyphName, fileName in items]
+
+
+def _defaultLayerDirectory(path):
+    layerContents = _readPlist(os.path.join(path, "layercontents.plist"))
+    if layerContents:
+        for layerName, directory in layerContents:
+            if directory == "glyphs":
+                return directory
+        return layerContents[0][1]
+    return "glyphs"
+
+
+def _flattenKerning(kerning):
+    pairs = {}
+    for first, seconds in kerning.items():
+        for second, value in seconds.items():
+            pairs[first, second] = value
+    return pairs
+
+
+def _convertUFO2Kerning(kerning, groups, glyphNames):
+    """
+    Give the groups used as kerning classes in the flattened UFO 2
+    *kerning* the public.kern1. and public.kern2. names of UFO 3, like
+    ufoLib does when reading a UFO 2. The groups are copied to their new
+    names, and the kerning is returned with the new names.
+    """
+    firstGroups = set(name for name in groups if name.startswith("@MMK_L_"))
+    secondGroups = set(name for name in groups if name.startswith("@MMK_R_"))
+    for first, second in kerning:
+        if first in groups and first not in glyphNames:
+            if not first.startswith("public.kern1."):
+                firstGroups.add(first)
+        if second in groups and second not in glyphNames:
+            if not second.startswith("public.kern2."):
+                secondGroups.add(second)
+
+    renamed = [{}, {}]
+    for side, names, oldPrefix in ((0, firstGroups, "@MMK_L_"),
+                                   (1, secondGroups, "@MMK_R_")):
+        prefix = "public.kern%d." % (side + 1)
+        for name in sorted(names):
+            existing = set(groups) | set(renamed[side].values())
+            newName = baseName = prefix + name.replace(oldPrefix, "")
+            counter = 0
+            while newName in existing:
+                counter += 1
+                newName = "%s%d" % (baseName, counter)
+            renamed[side][name] = newName
+    for side in renamed:
+        for name, newName in side.items():
+            groups[newName] = list(groups[name])
+    return dict(
+        ((renamed[0].get(first, first), renamed[1].get(second, second)), value)
+        for (first, second), value in kerning.items())
+
+
+def readFont(path, workers=None, useProcesses=False, chunkSize=256):
+    """
+    Read the UFO at *path* into a fontObjects.Font. The glyphs are parsed
+    in chunks of *chunkSize* by *workers* threads (by default one per
+    CPU), or processes if *useProcesses* is True.
+    """
+    metaInfo = _readPlist(os.path.join(path, "metainfo.plist"), {})
+    formatVersion = metaInfo.get("formatVersion", 1)
+    if formatVersion < 2:
+        raise ValueError("UFO format version 1 is not supported: %s" % path)
+
+    glyphsDir = os.path.join(path, _defaultLayerDirectory(path))
+    contents = _readPlist(os.path.join(glyphsDir, "contents.plist"), {})
+
+    font = Font(path=path)
+    for attr, value in _readPlist(os.path.join(path, "fontinfo.plist"), {}).items():
+        setattr(font.info, attr, value)
+    font.groups = _readPlist(os.path.join(path, "groups.plist"), {})
+    font.kerning = _flattenKerning(
+        _readPlist(os.path.join(path, "kerning.plist"), {}))
+    if formatVersion == 2:
+        font.kerning = _convertUFO2Kerning(
+            font.kerning, font.groups, contents)
+    font.lib = _readPlist(os.path.join(path, "lib.plist"), {})
+    featuresPath = os.path.join(path, "features.fea")
+    if os.path.exists(featuresPath):
+        with open(featuresPath, "rb") as f:
+            font.features.text = f.read().decode("utf-8")
+
+    items = sorted(contents.items())
+    chunks = [(glyphsDir, items[i:i + chunkSize])
+              for i in range(0, len(items), chunkSize)]
+    if len(chunks) > 1 and workers != 1:
+        if useProcesses:
+            from multiprocessing import Pool
+        else:
+            from multiprocessing.pool import ThreadPool as Pool
+        pool = Pool(workers)
+        try:
+            results = pool.map(_readGlifs, chunks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [_readGlifs(chunk) for chunk in chunks]
+    for glyphs in results:
+        for glyph in glyphs:
+            font.addGlyph(glyph)
+    return font
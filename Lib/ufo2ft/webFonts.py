@@ -0,0 +1,150 @@
+"""
+WOFF and WOFF2 output for compiled fonts.
+
+The font is serialized once; the WOFF file is then assembled from the
+table data of that serialization, compressing the tables in parallel
+threads (zlib releases the GIL while compressing). WOFF2 output is
+made by fontTools from the same data and needs the brotli module. Its
+glyf/loca transform is not built from the compiled glyphs: fontTools'
+WOFF2 writer only takes table data, so it parses glyf and loca again
+from the serialized font.
+
+    otf = compileOTF(ufo)
+    data = compileWebFonts(otf, flavors=("sfnt", "woff", "woff2"))
+    with open("MyFont.woff", "wb") as f:
+        f.write(data["woff"])
+"""
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import struct
+import zlib
+from io import BytesIO
+from multiprocessing.pool import ThreadPool
+
+from fontTools.ttLib import TTFont
+
+supportedFlavors = ("sfnt", "woff", "woff2")
+
+_sfntHeaderFormat = ">4sHHHH"
+_sfntHeaderSize = struct.calcsize(_sfntHeaderFormat)
+_sfntEntryFormat = ">4sLLL"
+_sfntEntrySize = struct.calcsize(_sfntEntryFormat)
+
+_woffHeaderFormat = ">4s4sLHHLHHLLLLL"
+_woffHeaderSize = struct.calcsize(_woffHeaderFormat)
+_woffEntryFormat = ">4sLLLL"
+_woffEntrySize = struct.calcsize(_woffEntryFormat)
+
+
+def serializeFont(otf):
+    """Return the binary sfnt data of the TTFont *otf*."""
+    stream = BytesIO()
+    otf.save(stream)
+    return stream.getvalue()
+
+
+def readTables(sfntData):
+    """
+    Return the sfnt version and a list of ``(tag, checksum, data)``
+    tuples, one per table, read from binary sfnt data.
+    """
+    sfntVersion, numTables = struct.unpack(
+        _sfntHeaderFormat, sfntData[:_sfntHeaderSize])[:2]
+    tables = []
+    for i in range(numTables):
+        start = _sfntHeaderSize + i * _sfntEntrySize
+        tag, checksum, offset, length = struct.unpack(
+            _sfntEntryFormat, sfntData[start:start + _sfntEntrySize])
+        tables.append((tag, checksum, sfntData[offset:offset + length]))
+    return sfntVersion, tables
+
+
+def _pad4(length):
+    return (length + 3) & ~3
+
+
+def _compressTable(args):
+    data, compressionLevel = args
+    compressed = zlib.compress(data, compressionLevel)
+    # tables are only stored compressed if that makes them smaller
+    if len(compressed) >= len(data):
+        return data
+    return compressed
+
+
+def makeWOFF(sfntData, workers=None, compressionLevel=6, version=None):
+    """
+    Convert binary sfnt data to WOFF, compressing the tables in
+    *workers* threads (by default one per CPU). *version* is an optional
+    ``(major, minor)`` tuple for the WOFF header.
+    """
+    sfntVersion, tables = readTables(sfntData)
+    tables.sort()
+    jobs = [(data, compressionLevel) for _, _, data in tables]
+    pool = ThreadPool(workers)
+    try:
+        compressedTables = pool.map(_compressTable, jobs)
+    finally:
+        pool.close()
+        pool.join()
+
+    majorVersion, minorVersion = version or (0, 0)
+    offset = _woffHeaderSize + len(tables) * _woffEntrySize
+    directory = []
+    tableData = []
+    for (tag, checksum, data), compressed in zip(tables, compressedTables):
+        directory.append(struct.pack(
+            _woffEntryFormat, tag, offset, len(compressed), len(data), checksum))
+        padding = _pad4(len(compressed)) - len(compressed)
+        tableData.append(compressed + b"\0" * padding)
+        offset += len(compressed) + padding
+    totalSfntSize = _sfntHeaderSize + len(tables) * _sfntEntrySize + sum(
+        _pad4(len(data)) for _, _, data in tables)
+    header = struct.pack(
+        _woffHeaderFormat, b"wOFF", sfntVersion, offset, len(tables), 0,
+        totalSfntSize, majorVersion, minorVersion, 0, 0, 0, 0, 0)
+    return b"".join([header] + directory + tableData)
+
+
+def makeWOFF2(sfntData):
+    """
+    Convert binary sfnt data to WOFF2 with fontTools, which applies the
+    glyf/loca transform. The transform is computed by fontTools from the
+    glyf and loca data, parsed again, rather than from the compiled
+    glyphs. Requires the brotli module.
+    """
+    font = TTFont(BytesIO(sfntData), recalcBBoxes=False, recalcTimestamp=False)
+    font.flavor = "woff2"
+    stream = BytesIO()
+    font.save(stream, reorderTables=False)
+    return stream.getvalue()
+
+
+def _fontVersion(otf):
+    revision = otf["head"].fontRevision
+    major = int(revision)
+    return major, int(round((revision - major) * 1000))
+
+
+def compileWebFonts(otf, flavors=("woff", "woff2"), workers=None,
+                    compressionLevel=6):
+    """
+    Return a ``flavor : binary data`` dict for the TTFont *otf* with an
+    entry for each of *flavors*: ``"sfnt"`` (the plain OpenType font),
+    ``"woff"`` and ``"woff2"``. The font is serialized only once.
+    """
+    for flavor in flavors:
+        if flavor not in supportedFlavors:
+            raise ValueError("unknown font flavor: %s" % flavor)
+    sfntData = serializeFont(otf)
+    result = {}
+    if "sfnt" in flavors:
+        result["sfnt"] = sfntData
+    if "woff" in flavors:
+        result["woff"] = makeWOFF(sfntData, workers=workers,
+                                  compressionLevel=compressionLevel,
+                                  version=_fontVersion(otf))
+    if "woff2" in flavors:
+        result["woff2"] = makeWOFF2(sfntData)
+    return result
@@ -0,0 +1,344 @@
+"""
+Benchmark suite for ufo2ft.
+
+Times ``compileOTF``, ``compileTTF``, ``KernFeatureWriter.write`` and
+``MarkFeatureWriter.write`` separately on the synthetic UFOs made by
+:mod:`ufoGenerator`, and writes the results as JSON so that runs can be
+compared across commits::
+
+    python benchmarks/runBenchmarks.py -o results-before.json
+    (apply change)
+    python benchmarks/runBenchmarks.py -o results-after.json
+    python benchmarks/runBenchmarks.py --compare results-before.json results-after.json
+
+Fonts are reloaded from disk before every timed call (the writers modify
+the font's kerning in place), and loading is not part of the timing.
+Every font is first checked to compile to the same kerning with and
+without kerning pruning; failed checks are printed and recorded.
+"""
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), "Lib"))
+
+import fontTools
+from defcon import Font
+from fontTools.pens.boundsPen import BoundsPen
+
+from ufo2ft import compileOTF, compileTTF
+from ufo2ft.featureParseCache import FeatureParseCache
+from ufo2ft.fontObjects import Glyph
+from ufo2ft.kernFeatureWriter import KernFeatureWriter
+from ufo2ft.makeotfParts import FeatureOTFCompiler
+from ufo2ft.markFeatureWriter import MarkFeatureWriter
+
+import ufoGenerator
+
+_timer = getattr(time, "perf_counter", time.time)
+
+
+def benchCompileOTF(font):
+    return compileOTF(font)
+
+
+def benchCompileTTF(font):
+    return compileTTF(font)
+
+
+def benchKernWriter(font):
+    KernFeatureWriter(font).write()
+
+
+class InlineKernFeatureWriter(KernFeatureWriter):
+    conflictStrategy = "inline"
+
+
+def benchCompileOTFInlineKern(font):
+    return compileOTF(font, kernWriter=InlineKernFeatureWriter)
+
+
+def benchKernWriterInline(font):
+    InlineKernFeatureWriter(font).write()
+
+
+class PruningKernFeatureWriter(KernFeatureWriter):
+    pruneKerning = True
+
+
+def benchCompileOTFPrunedKern(font):
+    return compileOTF(font, kernWriter=PruningKernFeatureWriter)
+
+
+def benchKernWriterPruned(font):
+    PruningKernFeatureWriter(font).write()
+
+
+def compiledKerning(font):
+    """
+    Return the kerning of every glyph pair in the compiled font *font*,
+    as a shaper applies its kern feature lookups: the first subtable whose
+    coverage has the left glyph decides, except that glyph pair subtables
+    fall through for pairs they don't list, and class 0 kerns by zero.
+    """
+    if "GPOS" not in font:
+        return {}
+    table = font["GPOS"].table
+    lookupIndexes = set()
+    for record in table.FeatureList.FeatureRecord:
+        if record.FeatureTag == "kern":
+            lookupIndexes.update(record.Feature.LookupListIndex)
+    kerning = {}
+    for index in sorted(lookupIndexes):
+        subtables = table.LookupList.Lookup[index].SubTable
+        # other glyphs are not kerned, by class 0 or by not being covered
+        lefts, rights = set(), set()
+        for subtable in subtables:
+            lefts.update(subtable.Coverage.glyphs)
+            if subtable.Format == 1:
+                for pairSet in subtable.PairSet:
+                    rights.update(
+                        record.SecondGlyph for record in pairSet.PairValueRecord)
+            else:
+                rights.update(subtable.ClassDef2.classDefs)
+        for left in sorted(lefts):
+            for right in sorted(rights):
+                value = _pairValue(subtables, left, right)
+                if value:
+                    kerning[left, right] = kerning.get((left, right), 0) + value
+    return kerning
+
+
+def _pairValue(subtables, left, right):
+    for subtable in subtables:
+        if left not in subtable.Coverage.glyphs:
+            continue
+        if subtable.Format == 1:
+            pairSet = subtable.PairSet[subtable.Coverage.glyphs.index(left)]
+            for record in pairSet.PairValueRecord:
+                if record.SecondGlyph == right:
+                    return getattr(record.Value1, "XAdvance", 0) or 0
+            continue
+        class1 = subtable.ClassDef1.classDefs.get(left, 0)
+        class2 = subtable.ClassDef2.classDefs.get(right, 0)
+        record = subtable.Class1Record[class1].Class2Record[class2]
+        return getattr(record.Value1, "XAdvance", 0) or 0
+    return 0
+
+
+def checkKernPruning(path):
+    """
+    Raise an error unless compiling the UFO at *path* with pruned kerning
+    gives every glyph pair the same kerning as without pruning.
+    """
+    kerning = compiledKerning(compileOTF(Font(path)))
+    pruned = compiledKerning(
+        compileOTF(Font(path), kernWriter=PruningKernFeatureWriter))
+    changed = sorted(
+        pair for pair in set(kerning) | set(pruned)
+        if kerning.get(pair, 0) != pruned.get(pair, 0))
+    if changed:
+        raise ValueError("pruning changed the kerning of %d pairs, e.g. %s" % (
+            len(changed), " ".join(changed[0])))
+
+
+# checks run once on every font, before the timings
+checks = (
+    ("kern pruning", checkKernPruning),
+)
+
+
+# shared by the repeats like by the masters of a family, so the feature
+# text is only parsed by the first one
+_featureCache = FeatureParseCache()
+
+
+def benchCompileOTFFeatureCache(font):
+    return compileOTF(font, featureCache=_featureCache)
+
+
+# a compile draws every glyph about three times (bounds, metrics, outlines)
+_draws = 3
+
+
+def benchDrawSource(font):
+    for _ in range(_draws):
+        for glyph in font:
+            glyph.draw(BoundsPen(font))
+
+
+def benchDrawReplay(font):
+    glyphs = {}
+    for glyph in font:
+        glyphs[glyph.name] = Glyph.fromGlyph(glyph, glyphSet=glyphs)
+    for _ in range(_draws):
+        for glyph in glyphs.values():
+            glyph.draw(BoundsPen(glyphs))
+
+
+def benchMarkWriter(font):
+    # reuse the feature compiler's anchor pair detection
+    featureCompiler = FeatureOTFCompiler(
+        font, None, KernFeatureWriter, MarkFeatureWriter)
+    MarkFeatureWriter(font, featureCompiler.anchorPairs).write()
+    MarkFeatureWriter(font, featureCompiler.mkmkAnchorPairs, mkmk=True).write()
+
+
+benchmarks = (
+    ("compileOTF", benchCompileOTF),
+    ("compileTTF", benchCompileTTF),
+    ("KernFeatureWriter.write", benchKernWriter),
+    # the previous kern conflict resolution, for comparison
+    ("compileOTF inlineKern", benchCompileOTFInlineKern),
+    ("KernFeatureWriter inline", benchKernWriterInline),
+    # redundant kerning rules removed
+    ("compileOTF prunedKern", benchCompileOTFPrunedKern),
+    ("KernFeatureWriter pruned", benchKernWriterPruned),
+    ("MarkFeatureWriter.write", benchMarkWriter),
+    # the feature text parsed once for all compiles
+    ("compileOTF featureCache", benchCompileOTFFeatureCache),
+    # drawing the UFO glyphs vs recording them once and replaying
+    ("draw source glyphs", benchDrawSource),
+    ("record and replay glyphs", benchDrawReplay),
+)
+
+
+def timeBenchmark(func, path, repeat):
+    """
+    Run *func* on a freshly loaded copy of the UFO at *path* *repeat*
+    times and return a dict of timing statistics in seconds. If *func*
+    returns a compiled font, the sizes of its layout tables are included.
+    """
+    timings = []
+    for _ in range(repeat):
+        font = Font(path)
+        start = _timer()
+        result = func(font)
+        end = _timer()
+        timings.append(end - start)
+    timings.sort()
+    stats = dict(
+        min=timings[0],
+        median=timings[len(timings) // 2],
+        max=timings[-1],
+        repeat=repeat)
+    if result is not None:
+        for tag in ("GPOS", "GSUB"):
+            if tag in result:
+                stats["%s bytes" % tag] = len(result.getTableData(tag))
+    return stats
+
+
+def gitRevision():
+    try:
+        output = subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=HERE,
+            stderr=subprocess.STDOUT)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.decode("ascii").strip()
+
+
+def runBenchmarks(directory, repeat=3, fonts=None, only=None):
+    """
+    Generate the synthetic UFOs into *directory* and time every benchmark
+    on every font. Errors are recorded rather than raised, so a failing
+    benchmark does not hide the others.
+    """
+    paths = {}
+    for name, generator in ufoGenerator.generators:
+        if fonts and name not in fonts:
+            continue
+        path = os.path.join(directory, name + ".ufo")
+        if not os.path.exists(path):
+            print("generating %s" % path)
+            generator(path)
+        paths[name] = path
+
+    results = {}
+    failures = {}
+    for fontName, path in sorted(paths.items()):
+        for checkName, check in checks:
+            try:
+                check(path)
+            except Exception:
+                error = traceback.format_exc().splitlines()[-1]
+                failures.setdefault(fontName, {})[checkName] = error
+                print("%-18s %-24s failed: %s" % (fontName, checkName, error))
+        results[fontName] = fontResults = {}
+        for benchName, func in benchmarks:
+            if only and benchName not in only:
+                continue
+            try:
+                stats = timeBenchmark(func, path, repeat)
+            except Exception:
+                stats = dict(error=traceback.format_exc().splitlines()[-1])
+                print("%-18s %-24s error: %s" % (fontName, benchName, stats["error"]))
+            else:
+                print("%-18s %-24s %8.3fs" % (fontName, benchName, stats["min"]))
+            fontResults[benchName] = stats
+
+    return dict(
+        revision=gitRevision(),
+        python=platform.python_version(),
+        fontTools=getattr(fontTools, "version", None),
+        timestamp=time.strftime("%Y-%m-%dT%H:%M:%S"),
+        failures=failures,
+        results=results)
+
+
+def compareResults(before, after):
+    """Print the relative change of the fastest time of each benchmark."""
+    print("%-18s %-24s %10s %10s %8s" % ("font", "benchmark", "before", "after", "ratio"))
+    for fontName, fontResults in sorted(after["results"].items()):
+        for benchName, stats in sorted(fontResults.items()):
+            old = before["results"].get(fontName, {}).get(benchName, {})
+            if "min" not in stats or "min" not in old:
+                continue
+            print("%-18s %-24s %9.3fs %9.3fs %7.2fx" % (
+                fontName, benchName, old["min"], stats["min"],
+                stats["min"] / old["min"] if old["min"] else float("inf")))
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-o", "--output", help="write JSON results to this file")
+    parser.add_argument("-d", "--directory",
+                        default=os.path.join(tempfile.gettempdir(), "ufo2ft-benchmarks"),
+                        help="where the synthetic UFOs are generated and cached")
+    parser.add_argument("-n", "--repeat", type=int, default=3)
+    parser.add_argument("-f", "--font", action="append", dest="fonts",
+                        help="only run on this synthetic font (repeatable)")
+    parser.add_argument("-b", "--benchmark", action="append", dest="only",
+                        help="only run this benchmark (repeatable)")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"),
+                        help="compare two JSON result files and exit")
+    options = parser.parse_args(args)
+
+    if options.compare:
+        before, after = [json.load(open(path)) for path in options.compare]
+        compareResults(before, after)
+        return
+
+    if not os.path.isdir(options.directory):
+        os.makedirs(options.directory)
+    data = runBenchmarks(options.directory, options.repeat,
+                         options.fonts, options.only)
+    if options.output:
+        with open(options.output, "w") as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    main()
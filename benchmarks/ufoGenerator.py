@@ -0,0 +1,320 @@
+"""
+Generators for synthetic but realistic UFOs used by the benchmark suite.
+
+Each ``make*`` function builds a defcon font in memory, saves it to the
+given path and returns the path. The fonts are deterministic: the same
+arguments always produce the same UFO, so timings are comparable across
+commits.
+
+=====================  ==============================================
+latinKerning           Latin with heavy group (class) kerning
+arabicAnchors          Arabic-like bases and marks with dense anchors
+cjk                    30k simple CJK ideographs
+hangulComposites       Hangul syllables built from jamo components
+largeFeatures          GSUB-heavy feature file spread over includes
+=====================  ==============================================
+"""
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import os
+import random
+import shutil
+
+from defcon import Font
+
+
+def _newFont(familyName, styleName="Regular", unitsPerEm=1000):
+    font = Font()
+    info = font.info
+    info.familyName = familyName
+    info.styleName = styleName
+    info.unitsPerEm = unitsPerEm
+    info.ascender = 750
+    info.descender = -250
+    info.xHeight = 500
+    info.capHeight = 700
+    info.versionMajor = 1
+    info.versionMinor = 0
+    return font
+
+
+def _drawBox(pen, xMin, yMin, xMax, yMax):
+    pen.moveTo((xMin, yMin))
+    pen.lineTo((xMax, yMin))
+    pen.lineTo((xMax, yMax))
+    pen.lineTo((xMin, yMax))
+    pen.closePath()
+
+
+def _drawBowl(pen, xMin, yMin, xMax, yMax):
+    """Draw a closed curve contour, roughly an ellipse."""
+    xMid = (xMin + xMax) // 2
+    yMid = (yMin + yMax) // 2
+    kx = int((xMax - xMin) * 0.276)
+    ky = int((yMax - yMin) * 0.276)
+    pen.moveTo((xMid, yMin))
+    pen.curveTo((xMid + kx, yMin), (xMax, yMid - ky), (xMax, yMid))
+    pen.curveTo((xMax, yMid + ky), (xMid + kx, yMax), (xMid, yMax))
+    pen.curveTo((xMid - kx, yMax), (xMin, yMid + ky), (xMin, yMid))
+    pen.curveTo((xMin, yMid - ky), (xMid - kx, yMin), (xMid, yMin))
+    pen.closePath()
+
+
+def _addAnchor(glyph, name, x, y):
+    glyph.appendAnchor(dict(name=name, x=x, y=y))
+
+
+def _save(font, path):
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    directory = os.path.dirname(os.path.abspath(path))
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    font.save(path)
+    return path
+
+
+# -----
+# Latin
+# -----
+
+_latinBases = ("A B C D E F G H I J K L M N O P Q R S T U V W X Y Z "
+               "a b c d e f g h i j k l m n o p q r s t u v w x y z").split()
+_latinAccents = ("grave acute circumflex tilde dieresis ring caron macron "
+                 "breve dotaccent cedilla ogonek").split()
+
+
+def makeLatinKerningUFO(path, accentedPerBase=12, exceptionRatio=0.1, seed=1):
+    """
+    Latin with heavy group kerning: every base letter gets a family of
+    accented variants which share its kerning groups, all group pairs are
+    kerned and a fraction of glyph pairs are kerned as exceptions.
+    """
+    rnd = random.Random(seed)
+    font = _newFont("Synthetic Latin")
+    uni = 0x0041
+    families = {}
+    for base in _latinBases:
+        names = [base] + ["%s%s" % (base, accent)
+                          for accent in _latinAccents[:accentedPerBase]]
+        families[base] = names
+        for name in names:
+            glyph = font.newGlyph(name)
+            glyph.width = 500 + rnd.randint(0, 200)
+            pen = glyph.getPen()
+            if name[0].islower():
+                _drawBowl(pen, 40, 0, glyph.width - 40, 500)
+            else:
+                _drawBox(pen, 40, 0, glyph.width - 40, 700)
+                _drawBox(pen, 120, 80, glyph.width - 120, 620)
+            if name == base:
+                glyph.unicodes = [ord(base)]
+            else:
+                glyph.unicodes = [0xE000 + uni]
+                uni += 1
+    for base, names in families.items():
+        font.groups["public.kern1.%s" % base] = list(names)
+        font.groups["public.kern2.%s" % base] = list(names)
+    for left in _latinBases:
+        for right in _latinBases:
+            font.kerning[("public.kern1.%s" % left,
+                          "public.kern2.%s" % right)] = rnd.randint(-80, 20)
+    allNames = [name for names in families.values() for name in names]
+    for left in allNames:
+        for right in rnd.sample(allNames, int(len(allNames) * exceptionRatio)):
+            font.kerning[(left, right)] = rnd.randint(-60, 10)
+    return _save(font, path)
+
+
+# ------
+# Arabic
+# ------
+
+_arabicAnchorNames = ("top", "bottom", "top.alt", "bottom.alt", "center")
+
+
+def makeArabicAnchorUFO(path, bases=600, marks=60, seed=2):
+    """
+    Arabic-like font where every base carries several attachment anchors
+    and every mark carries both attaching and mark-to-mark anchors.
+    """
+    rnd = random.Random(seed)
+    font = _newFont("Synthetic Arabic")
+    for i in range(bases):
+        glyph = font.newGlyph("arBase%04d" % i)
+        glyph.width = 300 + rnd.randint(0, 500)
+        glyph.unicodes = [0x0620 + i] if i < 0x2B else []
+        _drawBowl(glyph.getPen(), 20, -100, glyph.width - 20, 400)
+        for name in _arabicAnchorNames:
+            _addAnchor(glyph, name, rnd.randint(0, glyph.width),
+                       rnd.randint(-300, 700))
+    for i in range(marks):
+        glyph = font.newGlyph("arMark%03d" % i)
+        glyph.width = 0
+        glyph.unicodes = [0x064B + i] if i < 0x15 else []
+        _drawBox(glyph.getPen(), -80, 550, 80, 650)
+        name = _arabicAnchorNames[i % len(_arabicAnchorNames)]
+        _addAnchor(glyph, "_" + name, 0, rnd.randint(-200, 600))
+        _addAnchor(glyph, name, 0, rnd.randint(-300, 800))
+    return _save(font, path)
+
+
+# ---
+# CJK
+# ---
+
+def makeCJKUFO(path, glyphCount=30000, seed=3):
+    """
+    CJK font with *glyphCount* ideographs, each made of a handful of
+    rectangular strokes.
+    """
+    rnd = random.Random(seed)
+    font = _newFont("Synthetic CJK")
+    for i in range(glyphCount):
+        glyph = font.newGlyph("uni%04X" % (0x4E00 + i) if i < 0x5200
+                              else "u%05X" % (0x20000 + i))
+        glyph.width = 1000
+        glyph.unicodes = [0x4E00 + i if i < 0x5200 else 0x20000 + i]
+        pen = glyph.getPen()
+        for _ in range(rnd.randint(3, 9)):
+            x = rnd.randint(50, 850)
+            y = rnd.randint(-100, 700)
+            if rnd.random() < 0.5:
+                _drawBox(pen, x, y, x + rnd.randint(60, 150), y + 40)
+            else:
+                _drawBox(pen, x, y, x + 40, y + rnd.randint(60, 150))
+    return _save(font, path)
+
+
+# ------
+# Hangul
+# ------
+
+def makeHangulCompositeUFO(path, leads=19, vowels=21, tails=27):
+    """
+    Hangul font where every precomposed syllable is a composite of two or
+    three jamo glyphs, as produced by most Hangul design workflows. Each
+    lead and vowel pair makes a syllable without a final and one per tail,
+    the 11172 syllables U+AC00 to U+D7A3 by default.
+    """
+    font = _newFont("Synthetic Hangul")
+    jamo = []
+    for prefix, count, box in (("L", leads, (60, 350, 460, 700)),
+                               ("V", vowels, (500, 100, 900, 700)),
+                               ("T", tails, (100, -100, 800, 200))):
+        names = []
+        for i in range(count):
+            name = "jamo%s%02d" % (prefix, i)
+            glyph = font.newGlyph(name)
+            glyph.width = 0
+            _drawBox(glyph.getPen(), *box)
+            names.append(name)
+        jamo.append(names)
+    leadNames, vowelNames, tailNames = jamo
+    for l, lead in enumerate(leadNames):
+        for v, vowel in enumerate(vowelNames):
+            for t in range(tails + 1):
+                code = 0xAC00 + (l * vowels + v) * (tails + 1) + t
+                glyph = font.newGlyph("uni%04X" % code)
+                glyph.width = 1000
+                glyph.unicodes = [code]
+                pen = glyph.getPen()
+                pen.addComponent(lead, (1, 0, 0, 1, 0, 0))
+                pen.addComponent(vowel, (1, 0, 0, 1, 0, 0))
+                if t:
+                    pen.addComponent(tailNames[t - 1], (1, 0, 0, 1, 0, 0))
+    return _save(font, path)
+
+
+# ---------------------------------
+# Large feature file with includes
+# ---------------------------------
+
+def makeLargeFeaturesUFO(path, glyphCount=2000, includeCount=20, seed=4):
+    """
+    Font with *glyphCount* glyphs, each with a small-caps, an alternate and
+    a ligature partner, whose feature code is split over *includeCount*
+    files included from ``features.fea``.
+    """
+    rnd = random.Random(seed)
+    font = _newFont("Synthetic Features")
+    names = []
+    for i in range(glyphCount):
+        name = "g%05d" % i
+        names.append(name)
+        for suffix in ("", ".sc", ".alt"):
+            glyph = font.newGlyph(name + suffix)
+            glyph.width = 600
+            if not suffix:
+                glyph.unicodes = [0xE000 + i]
+            _drawBox(glyph.getPen(), 50, 0, 550, 350 if suffix == ".sc" else 700)
+    ligatures = []
+    for i in range(0, glyphCount - 1, 2):
+        liga = "%s_%s" % (names[i], names[i + 1])
+        glyph = font.newGlyph(liga)
+        glyph.width = 1200
+        _drawBox(glyph.getPen(), 50, 0, 1150, 700)
+        ligatures.append((names[i], names[i + 1], liga))
+
+    chunks = [[] for _ in range(includeCount)]
+    for i, name in enumerate(names):
+        chunks[i % includeCount].append(name)
+    includes = []
+    for i, chunk in enumerate(chunks):
+        lines = ["lookup smcp%02d {" % i]
+        lines += ["    sub %s by %s.sc;" % (name, name) for name in chunk]
+        lines.append("} smcp%02d;" % i)
+        lines.append("lookup salt%02d {" % i)
+        lines += ["    sub %s from [%s.alt %s.sc];" % (name, name, name)
+                  for name in chunk]
+        lines.append("} salt%02d;" % i)
+        fileName = "features/part%02d.fea" % i
+        includes.append((fileName, "\n".join(lines) + "\n"))
+
+    featureLines = ["languagesystem DFLT dflt;",
+                    "languagesystem latn dflt;"]
+    featureLines += ["include(%s);" % fileName for fileName, _ in includes]
+    featureLines.append("feature smcp {")
+    featureLines += ["    lookup smcp%02d;" % i for i in range(includeCount)]
+    featureLines.append("} smcp;")
+    featureLines.append("feature salt {")
+    featureLines += ["    lookup salt%02d;" % i for i in range(includeCount)]
+    featureLines.append("} salt;")
+    featureLines.append("feature liga {")
+    rnd.shuffle(ligatures)
+    featureLines += ["    sub %s %s by %s;" % lig for lig in ligatures]
+    featureLines.append("} liga;")
+    font.features.text = "\n".join(featureLines) + "\n"
+
+    _save(font, path)
+    # the compiler resolves relative includes against the UFO path
+    for fileName, text in includes:
+        includePath = os.path.join(path, fileName)
+        if not os.path.isdir(os.path.dirname(includePath)):
+            os.makedirs(os.path.dirname(includePath))
+        with open(includePath, "w") as f:
+            f.write(text)
+    return path
+
+
+generators = (
+    ("latinKerning", makeLatinKerningUFO),
+    ("arabicAnchors", makeArabicAnchorUFO),
+    ("cjk", makeCJKUFO),
+    ("hangulComposites", makeHangulCompositeUFO),
+    ("largeFeatures", makeLargeFeaturesUFO),
+)
+
+
+def generateAll(directory):
+    """
+    Generate every synthetic UFO into *directory* and return a
+    ``name : path`` dict.
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    paths = {}
+    for name, generator in generators:
+        paths[name] = generator(os.path.join(directory, name + ".ufo"))
+    return paths
@@ -6,8 +6,8 @@ from setuptools import setup
 try:
     import fontTools
 except:
-    print("*** Warning: ufo2ft requires FontTools, see:")
-    print("    fonttools.sf.net")
+    print("*** Warning: ufo2ft requires FontTools 3.44 or later, see:")
+    print("    https://github.com/fonttools/fonttools")
 
 try:
     import robofab
@@ -24,5 +24,13 @@ setup(name="ufo2ft",
     url="http://code.typesupply.com",
     license="MIT",
     packages=["ufo2ft"],
-    package_dir={"":"Lib"}
+    package_dir={"":"Lib"},
+    # feaLib taking the font first and accepting parsed feature files,
+    # and setting OS/2 usMaxContext
+    install_requires=["fonttools>=3.44.0"],
+    entry_points={
+        "console_scripts": [
+            "ufo2ft = ufo2ft.commandLine:main",
+        ],
+    },
 )